@@ -0,0 +1,129 @@
+import numpy as np
+
+from tablebase import POSITIONS, POWERS, PIECE_COUNT
+
+# Per position tables of build_tables, shared by every evaluator of the process
+_tables = None
+
+
+def build_tables():
+    """Return (action_counts, attack_counts, rows_advanced) for every base 3 cell code (see Board.cells_code).
+    action_counts[pl_idx] is Board.count_actions(pl_idx), attack_counts[pl_idx] the number of those
+    actions that are attacks and rows_advanced is Board.rows_advanced."""
+    # Imported here, classes imports this module for BatchEvaluator
+    from classes import MOVE_TABLE, HOME_CELLS, ROWS_ADVANCED
+
+    codes = np.arange(POSITIONS, dtype=np.int64)
+    digits = np.stack([codes // power % 3 for power in POWERS], axis=1).astype(np.int8)
+    action_counts, attack_counts = [], []
+    rows_advanced = np.zeros(POSITIONS, dtype=np.int8)
+    for pl_idx in (0, 1):
+        own, opponent = pl_idx + 1, 2 - pl_idx
+        count = np.zeros(POSITIONS, dtype=np.int16)
+        attacks = np.zeros(POSITIONS, dtype=np.int8)
+        reserve = np.maximum(PIECE_COUNT - (digits == own).sum(axis=1), 0)
+        for cell in HOME_CELLS[pl_idx]:
+            count += reserve * (digits[:, cell] == 0) # every piece in reserve can be inserted
+        for cell in range(len(POWERS)):
+            on_cell = digits[:, cell] == own
+            rows_advanced += on_cell * np.int8(ROWS_ADVANCED[pl_idx][cell])
+            moves = MOVE_TABLE[pl_idx][cell]
+            if moves.scores:
+                count += on_cell
+                continue
+            for target in moves.diag:
+                count += on_cell & (digits[:, target] == 0)
+            attacked = on_cell & (digits[:, moves.forward] == opponent)
+            count += attacked
+            attacks += attacked
+            if moves.jump_scores:
+                count += attacked
+                continue
+            jumping, landed = attacked, np.zeros(POSITIONS, dtype=bool)
+            for landing in moves.jump_ray:
+                landed |= jumping & (digits[:, landing] == 0)
+                jumping = jumping & (digits[:, landing] == opponent)
+            count += landed | jumping # jumping is left with the jumps off the board
+        action_counts.append(count)
+        attack_counts.append(attacks)
+    return action_counts, attack_counts, rows_advanced
+
+
+class BatchEvaluator():
+    """eval_state for whole batches of positions with NumPy.
+
+    Positions are given as arrays of cell codes, players to move and scores, and looked up in
+    tables computed once per process for the 3^12 codes. The search evaluates all the children
+    of a node at the last ply with a single call. Values equal eval_state up to the rounding of
+    the action_score sum, which is added at once instead of action by action.
+    """
+    def __init__(self, params):
+        """
+        :param params: Dict, evaluation parameters of the player (see eval_state)
+        """
+        global _tables
+        if _tables is None:
+            _tables = build_tables()
+        self.action_counts, self.attack_counts, self.rows_advanced = _tables
+        self.row_score = params.get('row_score', 0)
+        self.action_score = params.get('action_score', 0)
+        self.attack_action_score = params.get('attack_action_score', 0)
+        # mobility[n] is the action_score term of a player with n actions
+        rate = params.get('action_score_decrease_rate', 2)
+        dynamic_action_score, total = self.action_score, 0
+        self.mobility = [0]
+        for _ in range(int(max(count.max() for count in self.action_counts))):
+            dynamic_action_score = dynamic_action_score / rate
+            total += dynamic_action_score
+            self.mobility.append(total)
+        self.mobility = np.array(self.mobility)
+
+    @classmethod
+    def from_params(cls, params):
+        """Return an evaluator if the player's parameters enable batch_eval, else None."""
+        params = params or {}
+        if not params.get('batch_eval'):
+            return None
+        return cls(params)
+
+    def evaluate(self, codes, pl_turn, pl1_scores, pl2_scores):
+        """Return eval_state of every position, the arguments are arrays (or scalars) of the same length."""
+        evaluation = np.asarray(pl2_scores - pl1_scores, dtype=float)
+        if self.row_score > 0:
+            evaluation += self.rows_advanced[codes] * self.row_score
+        if self.action_score > 0:
+            evaluation += self.mobility[self.action_counts[1][codes]] - self.mobility[self.action_counts[0][codes]]
+            if self.attack_action_score > 0:
+                # bonus for the attacks of the player to move
+                attacks = np.where(pl_turn == 0, -self.attack_counts[0][codes], self.attack_counts[1][codes])
+                evaluation += attacks * self.attack_action_score
+        return evaluation
+
+    def child_values(self, board, actions, color, win_value):
+        """Return the values of the actions of the player to move, as negamax sees them after searching
+        each child one ply deep: win_value for wins, -win_value for losses and color * eval_state else."""
+        turn = board.pl_turn
+        own, opponent = turn + 1, 2 - turn
+        deltas, scored = [], []
+        for action in actions:
+            delta = 0
+            if action is not None:
+                if action[0] is not None:
+                    delta -= own * POWERS[action[0]]
+                if action[1] is not None:
+                    delta += own * POWERS[action[1]]
+                    if action[2] == 'Attack':
+                        delta -= opponent * POWERS[action[1]]
+            deltas.append(delta)
+            scored.append(action is not None and action[4])
+        codes = board.cells_code() + np.array(deltas)
+        mover_scores = board.pl_scores[turn] + np.array(scored, dtype=np.int64)
+        if turn == 0:
+            pl1_scores, pl2_scores = mover_scores, board.pl_scores[1]
+        else:
+            pl1_scores, pl2_scores = board.pl_scores[0], mover_scores
+        values = color * self.evaluate(codes, 1 - turn, pl1_scores, pl2_scores)
+        # Terminal children, checked in the order of terminal_test
+        values[mover_scores == board.wining_score] = win_value
+        values[(self.action_counts[0][codes] == 0) & (self.action_counts[1][codes] == 0)] = -win_value
+        return values.tolist()
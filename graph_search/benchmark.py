@@ -1,9 +1,21 @@
+import sys
+import io
 import json
+import queue
+import contextlib
 import argparse
+import multiprocessing
 from itertools import product
 from datetime import datetime
 
-from main import run_game
+from main import run_game, ENGINES, ADJUDICATIONS
+from profiling import MoveProfiler
+from ordering import MOVE_ORDERINGS
+from stats import new_totals, add_totals, summarize
+from transposition import DEFAULT_TT_SIZE
+from results_db import ResultsDB
+from records import RecordWriter
+from sprt import SPRT, DuelScheduler, DEFAULT_ELO, DEFAULT_ALPHA, DEFAULT_BETA
 
 
 TEST_SETTINGS = {
@@ -12,6 +24,12 @@ TEST_SETTINGS = {
     'action_score': [],
     # 'action_score_decrease_rate': [2],
     # 'attack_action_score': [0.0],
+    'move_ordering': [],
+    'late_move_reductions': [],
+    'capture_extensions': [],
+    'time_ms': None, # per move budget of every hminimax contender, depth is then the maximum depth
+    'repetition_detection': False, # let the hminimax contenders score repeated positions as draws
+    'mcts_iterations': [],
 }
 
 
@@ -28,17 +46,45 @@ def draw_duels():
             for action_score in TEST_SETTINGS.get('action_score', [0.0]):
                 for action_score_decrease_rate in TEST_SETTINGS.get('action_score_decrease_rate', [2]):
                     for attack_action_score in TEST_SETTINGS.get('attack_action_score', [0.0]):
-                        contenders.append({
-                            'name': f'd{depth}-rs{row_score}+ac{action_score}@{action_score_decrease_rate}+at{attack_action_score}'.replace('0.', '.'),
-                            'type': 'hminimax',
-                            'parameters': {
-                                'depth': depth,
-                                'row_score': row_score,
-                                'action_score': action_score,
-                                'action_score_decrease_rate': action_score_decrease_rate,
-                                'attack_action_score': attack_action_score,
-                            },
-                        })
+                        for move_ordering in TEST_SETTINGS.get('move_ordering') or ['history']:
+                            for late_move_reductions, capture_extensions in product(
+                                    TEST_SETTINGS.get('late_move_reductions') or [0], TEST_SETTINGS.get('capture_extensions') or [0]):
+                                name = f'd{depth}-rs{row_score}+ac{action_score}@{action_score_decrease_rate}+at{attack_action_score}'.replace('0.', '.')
+                                if move_ordering != 'history':
+                                    name += f'+{move_ordering}'
+                                if late_move_reductions:
+                                    name += f'+lmr{late_move_reductions}'
+                                if capture_extensions:
+                                    name += f'+x{capture_extensions}'
+                                if TEST_SETTINGS.get('time_ms'):
+                                    name += f'+t{TEST_SETTINGS["time_ms"]}'
+                                contenders.append({
+                                    'name': name,
+                                    'type': 'hminimax',
+                                    'parameters': {
+                                        'depth': depth,
+                                        'time_ms': TEST_SETTINGS.get('time_ms'),
+                                        'row_score': row_score,
+                                        'action_score': action_score,
+                                        'action_score_decrease_rate': action_score_decrease_rate,
+                                        'attack_action_score': attack_action_score,
+                                        'move_ordering': move_ordering,
+                                        'late_move_reductions': late_move_reductions,
+                                        'capture_extensions': capture_extensions,
+                                        'repetition_detection': TEST_SETTINGS.get('repetition_detection', False),
+                                        'tt_size': DEFAULT_TT_SIZE,
+                                        'search_stats': True,
+                                    },
+                                })
+    for iterations in TEST_SETTINGS.get('mcts_iterations', []):
+        contenders.append({
+            'name': f'mcts{iterations}',
+            'type': 'mcts',
+            'parameters': {
+                'mcts_iterations': iterations,
+                'search_stats': True,
+            },
+        })
 
     contenders = sorted(contenders, key=lambda k: k['name'])
     for pl1 in contenders:
@@ -52,13 +98,13 @@ def draw_duels():
     return duels
 
 
-def run_benchmark(pl1, pl2, iterations, winning_points):
-    print(f'run_benchmark({pl1["name"]}, {pl2["name"]}, {iterations}, {winning_points})')
-    stats = {
+def new_stats(pl1, pl2, iterations, winning_points, engine='board'):
+    return {
         'victories': {
             'pl1': 0,
             'pl2': 0,
         },
+        'draws': 0, # games stopped by repetition and adjudicated as draws
         'points': {
             'pl1': 0,
             'pl2': 0,
@@ -71,35 +117,238 @@ def run_benchmark(pl1, pl2, iterations, winning_points):
         'test_settings': {
             'iterations': iterations,
             'winning_points': winning_points,
+            'engine': engine,
         },
         'total_turns': 0,
+        'search': { # search statistics totals, see stats.new_totals
+            'pl1': new_totals(),
+            'pl2': new_totals(),
+        },
     }
-    for _ in range(iterations):
-        try:
-            encounter = run_game(pl1, pl2, winning_points, interactive=False)
-        except RecursionError as exc:
-            print(f'Game run failed to complete, ignoring results: {exc}')
-        else:
-            if encounter['winner'] == -1:
-                stats['victories']['pl1'] += 1
-            elif encounter['winner'] == 1:
-                stats['victories']['pl2'] += 1
-            else:
-                raise ValueError(f'Unknown player id: {encounter["winner"]}')
-            if 'scores' in encounter:
-                stats['points']['pl1'] += encounter['scores'][0]
-                stats['points']['pl2'] += encounter['scores'][1]
-            if 'runtimes' in encounter:
-                stats['runtimes']['pl1'] += encounter['runtimes'][0]
-                stats['runtimes']['pl2'] += encounter['runtimes'][1]
-            if 'total_turns' in encounter:
-                stats['total_turns'] += encounter['total_turns']
+
+
+def play_benchmark_game(task):
+    """Play one game of a duel and return its record, a JSON serialisable dict.
+    task is a tuple (duel_key, iteration, pl1, pl2, winning_points, engine, repetitions, adjudication,
+    profile_threshold_ms, record_moves), the moves are profiled unless profile_threshold_ms is None and the
+    profile is returned in record['profile'] (a ProfileData), and with record_moves the game record
+    (see records.RecordWriter) is returned in record['game_record'], both to be removed before the
+    record is saved.
+    """
+    duel_key, iteration, pl1, pl2, winning_points, engine, repetitions, adjudication, profile_threshold_ms, record_moves = task
+    profiler = MoveProfiler(profile_threshold_ms) if profile_threshold_ms is not None else None
+    recorder = RecordWriter(io.BytesIO()) if record_moves else None
+    record = {
+        'duel': duel_key,
+        'iteration': iteration,
+        'players': (pl1, pl2),
+        'winning_points': winning_points,
+        'engine': engine,
+        'repetitions': repetitions,
+        'adjudication': adjudication,
+    }
+    try:
+        encounter = run_game(pl1, pl2, winning_points, interactive=False, engine=engine,
+                             repetitions=repetitions, adjudication=adjudication, profiler=profiler,
+                             recorder=recorder)
+    except RecursionError as exc:
+        record['error'] = str(exc)
+    else:
+        record.update(encounter)
+        # Only the totals of the search statistics are kept, the per move records would dwarf the results file
+        record['stats'] = [stats['totals'] if stats is not None else None for stats in encounter['stats']]
+    if profiler is not None:
+        record['profile'] = profiler.data()
+    if recorder is not None:
+        record['game_record'] = recorder.stream.getvalue()
+    return record
+
+
+def accumulate(stats, record):
+    """Add the result of one game record to the stats of its duel."""
+    if 'error' in record:
+        print(f'Game run failed to complete, ignoring results: {record["error"]}')
+        return
+    if record['winner'] == -1:
+        stats['victories']['pl1'] += 1
+    elif record['winner'] == 1:
+        stats['victories']['pl2'] += 1
+    elif record['winner'] == 0:
+        stats['draws'] = stats.get('draws', 0) + 1
+    else:
+        raise ValueError(f'Unknown player id: {record["winner"]}')
+    if 'scores' in record:
+        stats['points']['pl1'] += record['scores'][0]
+        stats['points']['pl2'] += record['scores'][1]
+    if 'runtimes' in record:
+        stats['runtimes']['pl1'] += record['runtimes'][0]
+        stats['runtimes']['pl2'] += record['runtimes'][1]
+    if 'total_turns' in record:
+        stats['total_turns'] += record['total_turns']
+    for idx, pl in enumerate(('pl1', 'pl2')):
+        if record.get('stats') and record['stats'][idx] is not None:
+            add_totals(stats['search'][pl], record['stats'][idx])
+
+
+def run_benchmark(pl1, pl2, iterations, winning_points, engine='board', repetitions=None, adjudication='draw', sprt=None):
+    """Play iterations games of pl1 against pl2 and return their stats, or stop as soon as the
+    SPRT sprt decides which player is stronger, or that they are even, when one is given."""
+    print(f'run_benchmark({pl1["name"]}, {pl2["name"]}, {iterations}, {winning_points})')
+    stats = new_stats(pl1, pl2, iterations, winning_points, engine)
+    duel_key = unique_key(pl1, pl2)
+    for iteration in range(iterations):
+        accumulate(stats, play_benchmark_game((duel_key, iteration, pl1, pl2, winning_points, engine, repetitions, adjudication, None, False)))
+        if sprt is not None and sprt.decision(stats['victories']['pl1'], stats['draws'], stats['victories']['pl2']):
+            stats['test_settings']['iterations'] = iteration + 1
+            break
     return stats
 
 
-def display_results(results):
+def load_records(filename):
+    """Return the game records of a results file, ignoring a last line cut short by a crash."""
+    records = []
+    try:
+        with open(filename) as infile:
+            for line in infile:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f'Ignoring incomplete record in {filename}: {line.strip()[:60]}')
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def results_from_records(records):
+    """Aggregate game records into the per duel stats, see duel_ratios and contender_totals."""
+    results = {}
+    for record in records:
+        if record['duel'] not in results:
+            pl1, pl2 = record['players']
+            results[record['duel']] = new_stats(pl1, pl2, 0, record['winning_points'], record.get('engine', 'board'))
+        stats = results[record['duel']]
+        stats['test_settings']['iterations'] += 1
+        accumulate(stats, record)
+    return results
+
+
+def play_scheduled(scheduler, task, pool=None, workers=1):
+    """Yield the records of the games of a DuelScheduler as they finish, keeping workers games
+    running on the pool. The caller counts every record with scheduler.add_result before asking
+    for the next one, so that the games of a decided matchup are not scheduled any more."""
+    finished = queue.Queue()
+    running = 0
+    while True:
+        while running < workers:
+            game = scheduler.next_game()
+            if game is None:
+                break
+            if pool is not None:
+                pool.apply_async(play_benchmark_game, (task(*game),), callback=finished.put, error_callback=finished.put)
+            else:
+                finished.put(play_benchmark_game(task(*game)))
+            running += 1
+        if not running:
+            return
+        record = finished.get()
+        running -= 1
+        if isinstance(record, BaseException):
+            raise record
+        yield record
+
+
+def run_suite(duels, iterations, winning_points, results_file, engine='board', workers=1, repetitions=None, adjudication='draw',
+              profiler=None, db=None, sweep_id=None, records_file=None, sprt=None, max_iterations=None):
+    """Play every game of the duels not recorded yet in results_file, appending each finished
+    game to the file as one JSON line, or in the sweep sweep_id of the ResultsDB db when one is given.
+    Games are played on a pool of worker processes when workers > 1, and stopped by repetition
+    when repetitions is set (see main.run_game). The profiles of the games are merged into
+    profiler when one is given, and their moves appended to records_file (see records.py).
+    With an SPRT sprt, the games of a matchup stop once it is decided and the games it leaves
+    go to the undecided matchups, up to max_iterations per duel (see sprt.DuelScheduler).
+    """
+    if db is not None:
+        previous = db.game_results(sweep_id, winning_points)
+    else:
+        previous = [record for record in load_records(results_file) if record['winning_points'] == winning_points]
+    done = {(record['duel'], record['iteration']) for record in previous}
+    profile_threshold_ms = profiler.threshold_ms if profiler is not None else None
+
+    def task(duel_key, iteration):
+        pl1, pl2 = duels[duel_key]
+        return (duel_key, iteration, pl1, pl2, winning_points, engine, repetitions, adjudication, profile_threshold_ms,
+                records_file is not None)
+
+    if sprt is None:
+        scheduler = None
+        tasks = [task(duel_key, iteration) for duel_key in duels for iteration in range(iterations)
+                 if (duel_key, iteration) not in done]
+        total = len(tasks)
+    else:
+        scheduler = DuelScheduler(duels, iterations, sprt, max_iterations, previous)
+        total = scheduler.budget - scheduler.scheduled # at most, decided matchups stop early
+    if done:
+        print(f'Resuming from {db.path if db is not None else results_file}: {len(done)} games already recorded, {total} left')
+    pool = multiprocessing.Pool(workers) if workers > 1 and total else None
+    if scheduler is not None:
+        records = play_scheduled(scheduler, task, pool, workers)
+    else:
+        records = pool.imap_unordered(play_benchmark_game, tasks) if pool else map(play_benchmark_game, tasks)
+    recorder = RecordWriter.open(records_file) if records_file is not None else None
+    with open(results_file, 'a+') if db is None else contextlib.nullcontext() as outfile:
+        if outfile is not None:
+            outfile.seek(0, 2)
+        if outfile is not None and outfile.tell() > 0:
+            outfile.seek(outfile.tell() - 1)
+            if outfile.read(1) != '\n':
+                outfile.write('\n') # terminate a record cut short by a crash
+        for count, record in enumerate(records):
+            profile = record.pop('profile', None)
+            if profile is not None:
+                profiler.merge(profile)
+            game_record = record.pop('game_record', None)
+            if game_record is not None:
+                recorder.stream.write(game_record)
+                recorder.stream.flush()
+            if db is not None:
+                db.add_game(sweep_id, record)
+            else:
+                outfile.write(json.dumps(record) + '\n')
+                outfile.flush()
+            print(f'Game {count + 1:>5}/{total}: {record["duel"]} #{record["iteration"]}', end='')
+            if 'error' in record:
+                print(f' failed: {record["error"]}')
+            else:
+                print(f' winner {record["winner"] or "draw"}, scores {record["scores"]}{" (repetition)" if record.get("repetition") else ""}')
+            if scheduler is not None and scheduler.add_result(record):
+                print(f'  Decided {scheduler.describe(scheduler.duels[record["duel"]]["matchup"])}')
+    if pool:
+        pool.close()
+        pool.join()
+    if scheduler is not None:
+        print('\nSPRT of the matchups:')
+        for key in sorted(scheduler.matchups):
+            print(scheduler.describe(key))
+    if recorder is not None:
+        recorder.close()
+
+
+def duel_ratios(results):
+    """Return {duel key: (point%, win%, ms per turn of player 1)} of the per duel stats, NaN when
+    there is nothing to divide. ResultsDB.duel_ratios computes the same in SQL."""
+    def ratio(numerator, denominator):
+        return numerator / denominator if denominator else float('NaN')
+    return {key: (100 * ratio(duel["points"]["pl1"], duel["points"]["pl1"] + duel["points"]["pl2"]),
+                  100 * ratio(duel["victories"]["pl1"], duel["victories"]["pl1"] + duel["victories"]["pl2"]),
+                  1000 * ratio(duel["runtimes"]["pl1"], duel["total_turns"]) / 2)
+            for key, duel in results.items()}
+
+
+def display_results(ratios):
+    """Print the point% and win% of every player (column) against every other (row), averaged over
+    the duels where it plays first and second, and its time per turn when it plays first."""
     rows, columns = set(), set()
-    for key in results:
+    for key in ratios:
         column = key.split('|')[0] # player1
         row = key.split('|')[1] # player2
         rows.add(row)
@@ -118,66 +367,133 @@ def display_results(results):
     for row in rows:
         print(f'{row:<21}', end='\t')
         for column in columns:
-            duel = results.get(f'{column}|{row}', {})
-            if duel:
-                try:
-                    victory_ratio = 100 * duel["victories"]["pl1"] / ( duel["victories"]["pl1"] + duel["victories"]["pl2"])
-                except ZeroDivisionError:
-                    victory_ratio = float('NaN')
-                try:
-                    point_ratio = 100 * duel["points"]["pl1"] / ( duel["points"]["pl1"] + duel["points"]["pl2"])
-                except ZeroDivisionError:
-                    point_ratio = float('NaN')
-                try:
-                    time_per_turn = 1000 * duel["runtimes"]["pl1"] / duel["total_turns"] / 2
-                except ZeroDivisionError:
-                    time_per_turn = float('NaN')
-                # print(f'{point_ratio:>6.1f}{victory_ratio:>7.1f}{time_per_turn:>8.2f}', end='\t')
-            duel2 = results.get(f'{row}|{column}', {})
-            if duel2:
-                try:
-                    victory_ratio += 100 - (100 * duel2["victories"]["pl1"] / ( duel2["victories"]["pl1"] + duel2["victories"]["pl2"]))
-                except ZeroDivisionError:
-                    victory_ratio = float('NaN')
-                try:
-                    point_ratio += 100 - (100 * duel2["points"]["pl1"] / ( duel2["points"]["pl1"] + duel2["points"]["pl2"]))
-                except ZeroDivisionError:
-                    point_ratio = float('NaN')
-                # string = f'{duel2["points"]["pl1"]} / {duel2["points"]["pl2"]}'
-            try:
-                print(f'{point_ratio/2:>6.1f}{victory_ratio/2:>7.1f}{time_per_turn:>8.2f}', end='\t')
-            except:
+            duel, duel2 = ratios.get(f'{column}|{row}'), ratios.get(f'{row}|{column}')
+            if duel and duel2:
+                point_ratio = duel[0] + 100 - duel2[0]
+                victory_ratio = duel[1] + 100 - duel2[1]
+                print(f'{point_ratio/2:>6.1f}{victory_ratio/2:>7.1f}{duel[2]:>8.2f}', end='\t')
+            else:
                 print('--------        ', end="\t")
         print()
 
 
-if __name__ == "__main__":
-    results = {}
-    count = 0
+def contender_totals(results):
+    """Return {contender name: search statistics totals} over all the games of the per duel stats."""
+    totals = {}
+    for duel in results.values():
+        for idx, pl in enumerate(('pl1', 'pl2')):
+            name = duel['players'][idx]['name']
+            add_totals(totals.setdefault(name, new_totals()), duel.get('search', {}).get(pl, {}))
+    return totals
 
+
+def display_search_stats(totals):
+    """Print the search statistics of every contender, see contender_totals."""
+    print(f'\n{"":<21}\t   moves  nodes/move  cutoff%  first%    ebf  depth  max_ply    tt%  ms/move')
+    for name in sorted(totals):
+        summary = summarize(totals[name])
+        print(f'{name:<21}\t{summary["moves"]:>8}{summary["nodes_per_move"]:>12.1f}{100 * summary["cutoff_rate"]:>9.1f}'
+              f'{100 * summary["first_move_cutoff_rate"]:>8.1f}{summary["branching_factor"]:>7.2f}{summary["depth"]:>7.1f}'
+              f'{summary["max_ply"]:>9}{100 * summary["tt_hit_rate"]:>7.1f}{summary["ms_per_move"]:>9.2f}')
+
+
+if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--iterations', default=2, type=int)
+    parser.add_argument('-i', '--iterations', default=2, type=int, help='Games per duel, the average games per duel with --sprt')
     parser.add_argument('-w', '--winning-points', default=15, type=int)
-    parser.add_argument('-d','--depths', type=int, nargs='+', help='<Required> List of depths (e.g. --d 4 5 6)', required=True)
+    parser.add_argument('-d','--depths', type=int, nargs='+', help='<Required> List of depths (e.g. --d 4 5 6)')
     parser.add_argument('-r','--row-scores', type=float, nargs='+', help='List of row_scores (e.g. --a 0.0 0.2)', default=[0.2])
     parser.add_argument('-a','--action-scores', type=float, nargs='+', help='List of action_scores (e.g. --a 0.0 0.1)', default=[0.0, 0.1])
+    parser.add_argument('-m', '--move-orderings', nargs='+', choices=MOVE_ORDERINGS, default=['history'],
+                        help='List of move orderings, "type" is the ordering by action type used before killers and history')
+    parser.add_argument('-l', '--late-move-reductions', type=int, nargs='+', default=[0],
+                        help='List of numbers of actions searched at full depth before late quiet actions are reduced, 0 disables the reductions')
+    parser.add_argument('-x', '--capture-extensions', type=int, nargs='+', default=[0],
+                        help='List of maximum extensions of a line by attacks and jumps, 0 disables the extensions')
+    parser.add_argument('--time-ms', type=int,
+                        help='Time budget per move of the hminimax contenders, their depth becomes the maximum depth of iterative deepening')
+    parser.add_argument('-t', '--mcts-iterations', type=int, nargs='+', default=[],
+                        help='List of iterations per move of Monte Carlo Tree Search contenders (e.g. -t 1000 4000)')
+    parser.add_argument('-b', '--opening-book', help='Opening book file written by opening_book.py, played by every contender')
+    parser.add_argument('-e', '--engine', default='board', choices=list(ENGINES), help='State representation used by the game and the search')
+    parser.add_argument('--repetitions', default=3, type=int,
+                        help='Stop a game the nth time a position occurs (0 disables). This also turns on repetition_detection for '
+                             'every hminimax contender, which scores repeated positions as draws in its search')
+    parser.add_argument('--adjudication', default='draw', choices=ADJUDICATIONS,
+                        help='Result of a game stopped by repetition: a draw (the default, as the search scores repetitions), or a win '
+                             'of the player with more points. Sweeps run before repetitions were detected used score, do not mix them')
+    parser.add_argument('--profile', metavar='PREFIX', help='Profile the moves of the contenders and write <PREFIX>.prof '
+                                                            '(cProfile statistics) and <PREFIX>.folded (collapsed stacks tagged by contender)')
+    parser.add_argument('--profile-threshold-ms', default=0, type=float, help='Only profile the moves that take at least this long')
+    parser.add_argument('--record', metavar='FILE', help='Append the moves of every game with their statistics to a record file, see records.py')
+    parser.add_argument('--sprt', action='store_true', help='Stop the games of a pair of contenders once an SPRT finds one stronger, '
+                                                            'or both within --sprt-elo, and give the games left to the close pairs')
+    parser.add_argument('--sprt-elo', default=DEFAULT_ELO, type=float, help='Strength difference the SPRT tells apart from none')
+    parser.add_argument('--sprt-alpha', default=DEFAULT_ALPHA, type=float, help='Probability to find one of two even contenders stronger, per side')
+    parser.add_argument('--sprt-beta', default=DEFAULT_BETA, type=float, help='Probability to miss a difference of --sprt-elo')
+    parser.add_argument('--max-iterations', type=int, help='Games per duel of the undecided pairs with --sprt (default 4 * --iterations)')
+    parser.add_argument('-n', '--workers', default=1, type=int, help='Number of games played in parallel')
+    parser.add_argument('-f', '--results-file', help='File receiving one JSON line per finished game (default results-<timestamp>.jsonl). '
+                                                     'Games already recorded in an existing file are skipped, which resumes an interrupted sweep')
+    parser.add_argument('--db', help='SQLite database receiving the games instead of a results file, see results_db.py. '
+                                     'Games already recorded in the sweep are skipped, which resumes an interrupted sweep')
+    parser.add_argument('-s', '--sweep', help='Name of the sweep of the games in --db (default benchmark-<timestamp>)')
+    parser.add_argument('--display', metavar='RESULTS_FILE', help='Only display the results recorded in a (possibly partial) results file')
     args = parser.parse_args()
 
-    TEST_SETTINGS['depth'] = args.depths
+    if args.display:
+        results = results_from_records(load_records(args.display))
+        display_results(duel_ratios(results))
+        display_search_stats(contender_totals(results))
+        sys.exit()
+    if not args.depths and not args.mcts_iterations:
+        parser.error('the following arguments are required: -d/--depths or -t/--mcts-iterations')
+
+    TEST_SETTINGS['depth'] = args.depths or []
     TEST_SETTINGS['row_score'] = args.row_scores
     TEST_SETTINGS['action_score'] = args.action_scores
+    TEST_SETTINGS['move_ordering'] = args.move_orderings
+    TEST_SETTINGS['late_move_reductions'] = args.late_move_reductions
+    TEST_SETTINGS['capture_extensions'] = args.capture_extensions
+    TEST_SETTINGS['time_ms'] = args.time_ms
+    TEST_SETTINGS['repetition_detection'] = args.repetitions > 0
+    TEST_SETTINGS['mcts_iterations'] = args.mcts_iterations
 
     duels = draw_duels()
+    if args.opening_book:
+        for pl1, pl2 in duels.values():
+            pl1['parameters']['opening_book'] = pl2['parameters']['opening_book'] = args.opening_book
     print(f"Suite settings {TEST_SETTINGS}")
     print(f"Running benchmark suite of {len(duels.keys())} tests:")
     for key in duels:
         print(key)
-    for duel_key, players in duels.items():
-        count += 1
-        print(f'Test {count:>4}/{len(duels)}: ', end='')
-        results[duel_key] = run_benchmark(players[0], players[1], args.iterations, args.winning_points)
-    display_results(results)
-    filename = f'results-{datetime.now().isoformat()}.json'
-    with open(filename, 'w') as outfile:
-        json.dump(results, outfile)
-    print(f'Results saved in {filename}')
+    timestamp = datetime.now().isoformat()
+    results_file = args.results_file or f'results-{timestamp}.jsonl'
+    db = ResultsDB(args.db) if args.db else None
+    sweep = args.sweep or f'benchmark-{timestamp}'
+    profiler = MoveProfiler(args.profile_threshold_ms) if args.profile else None
+    run_suite(duels, args.iterations, args.winning_points, results_file, engine=args.engine, workers=args.workers,
+              repetitions=args.repetitions or None, adjudication=args.adjudication, profiler=profiler,
+              db=db, sweep_id=db.sweep(sweep) if db is not None else None, records_file=args.record,
+              sprt=SPRT(args.sprt_elo, args.sprt_alpha, args.sprt_beta) if args.sprt else None, max_iterations=args.max_iterations)
+    if db is not None:
+        display_results(db.duel_ratios([sweep]))
+        display_search_stats(db.contender_totals([sweep]))
+        print(f'Games saved in {args.db}, sweep {sweep}')
+        db.close()
+    else:
+        results = results_from_records(load_records(results_file))
+        display_results(duel_ratios(results))
+        display_search_stats(contender_totals(results))
+        print(f'Game records saved in {results_file}')
+    if args.record:
+        print(f'Game moves recorded in {args.record}')
+    if profiler is not None:
+        profiler.print_summary()
+        for path in profiler.write(args.profile):
+            print(f'Profile saved in {path}')
+    if db is None:
+        filename = f'results-{timestamp}.json'
+        with open(filename, 'w') as outfile:
+            json.dump(results, outfile)
+        print(f'Results saved in {filename}')
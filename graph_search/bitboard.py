@@ -0,0 +1,302 @@
+import numpy as np
+
+from classes import Board, Piece, MOVE_TABLE, UNDO_STACK_SIZE, UNDO_OVERFLOW
+from transposition import MAX_SCORE, ZOBRIST_CELLS, ZOBRIST_SCORES, ZOBRIST_TURN, position_hash
+from symmetry import MIRROR_CELL, ZOBRIST_MIRROR_DELTA
+
+# Cell i of the board is bit i of a player's 12-bit mask, cells are numbered like in Board.state
+FULL_MASK = 0xFFF
+ROW_MASKS = [0b111 << (3 * row) for row in range(4)]
+COLUMN_MASKS = [sum(1 << (3 * row + column) for row in range(4)) for column in range(3)]
+HOME_ROW = [ROW_MASKS[0], ROW_MASKS[3]] # where each player inserts its pieces
+END_ROW = [ROW_MASKS[3], ROW_MASKS[0]] # where each player scores from
+STEP = [3, -3] # forward direction of each player
+# (shift, source cells) of the two diagonal directions of each player, pieces on END_ROW score instead
+DIAG_SHIFTS = [
+    [(2, (COLUMN_MASKS[1] | COLUMN_MASKS[2]) & ~END_ROW[0]), (4, (COLUMN_MASKS[0] | COLUMN_MASKS[1]) & ~END_ROW[0])],
+    [(-4, (COLUMN_MASKS[1] | COLUMN_MASKS[2]) & ~END_ROW[1]), (-2, (COLUMN_MASKS[0] | COLUMN_MASKS[1]) & ~END_ROW[1])],
+]
+POPCOUNT = [bin(mask).count('1') for mask in range(FULL_MASK + 1)]
+# Sum of 3**cell over the cells of a mask, for Board.cells_code
+BASE3 = [sum(3 ** cell for cell in range(12) if mask >> cell & 1) for mask in range(FULL_MASK + 1)]
+# Sum of Piece.distance_from_home over all pieces of a mask, per player
+DISTANCE_SUM = [
+    [sum(row + 1 for row in range(4) for column in range(3) if mask >> (3 * row + column) & 1) for mask in range(FULL_MASK + 1)],
+    [sum(4 - row for row in range(4) for column in range(3) if mask >> (3 * row + column) & 1) for mask in range(FULL_MASK + 1)],
+]
+
+
+def shift(mask, n):
+    return (mask << n) & FULL_MASK if n > 0 else mask >> -n
+
+
+def cells(mask):
+    """Yield the cells of a mask in increasing order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitPlayer():
+    """Player view of a BitBoard, exposing the attributes of Player used by main.run_game."""
+    def __init__(self, human_player, pl_id, pl_idx):
+        self.human = human_player
+        self.pl_id = pl_id
+        self.pl_idx = pl_idx
+
+    def get_actions(self, board):
+        """Return the actions of the player grouped per piece, like Player.get_actions."""
+        groups = {}
+        for action in board.get_actions(self.pl_idx):
+            groups.setdefault(action[0], []).append(action)
+        return list(groups.values())
+
+
+class BitBoard(Board):
+    """Compact state engine with the same API as Board.
+
+    The board is stored as one 12-bit mask per player plus the number of pieces each player has in
+    reserve. Move generation, make/unmake and terminal detection are bit operations, while the
+    search (negamax) and the transposition tables are inherited from Board.
+    Pieces are not tracked individually; the piece_id of an action is a label counting the player's
+    pieces on the board from cell 0, and inserts use the next free label.
+    """
+    def __init__(self, pl1, pl2, score, pl1_params=None, pl2_params=None):
+        super().__init__(pl1, pl2, score, pl1_params=pl1_params, pl2_params=pl2_params)
+        self.state = None
+        self.pl = [BitPlayer(pl1, self.pl_id[0], 0), BitPlayer(pl2, self.pl_id[1], 1)]
+        self.bits = [0, 0]
+        self.reserve = [4, 4]
+
+    @classmethod
+    def from_board(cls, board):
+        """Return a BitBoard holding the same position, scores, turn and parameters as board."""
+        bit_board = cls(board.pl[0].human, board.pl[1].human, board.wining_score,
+                        pl1_params=board.pl_params[0], pl2_params=board.pl_params[1])
+        for cell, piece in enumerate(board.state):
+            if isinstance(piece, Piece):
+                bit_board.bits[(piece.pl_id + 1) // 2] |= 1 << cell
+        bit_board.reserve = [board.pl[0].piece_count, board.pl[1].piece_count]
+        bit_board.pl_scores = list(board.pl_scores)
+        bit_board.pl_turn = board.pl_turn
+        bit_board.hash = board.hash
+        bit_board.mirror_delta = board.mirror_delta
+        bit_board.history = dict(board.history)
+        return bit_board
+
+    def load_position(self, cells, pl_scores, pl_turn):
+        self.bits = [0, 0]
+        for cell, pl_id in enumerate(cells):
+            if pl_id != 0:
+                self.bits[(pl_id + 1) // 2] |= 1 << cell
+        self.reserve = [4 - POPCOUNT[self.bits[0]], 4 - POPCOUNT[self.bits[1]]]
+        if min(self.reserve) < 0:
+            raise ValueError(f'A player has more than 4 pieces on the board: {list(cells)}')
+        if max(pl_scores) > MAX_SCORE:
+            raise ValueError(f'Score {max(pl_scores)} exceeds the supported maximum of {MAX_SCORE}')
+        self.pl_scores = list(pl_scores)
+        self.pl_turn = pl_turn
+        self.hash = self.compute_hash()
+        self.mirror_delta = self.hash ^ self.compute_hash(mirrored=True)
+        self.undo_top = 0
+        self.history = {self.hash: 1}
+        self.actions_cache = [None, None]
+
+    def compute_hash(self, mirrored=False):
+        cell_owners = [0 if self.bits[0] >> cell & 1 else 1 if self.bits[1] >> cell & 1 else None for cell in range(12)]
+        if mirrored:
+            cell_owners = [cell_owners[MIRROR_CELL[cell]] for cell in range(12)]
+        return position_hash(cell_owners, self.pl_scores, self.pl_turn)
+
+    def piece_label(self, pl_idx, cell):
+        if cell is None:
+            return POPCOUNT[self.bits[pl_idx]]
+        return POPCOUNT[self.bits[pl_idx] & ((1 << cell) - 1)]
+
+    def display_board(self):
+        display = np.zeros((12))
+        for pl_idx in range(2):
+            for cell in cells(self.bits[pl_idx]):
+                display[cell] = (1 + self.piece_label(pl_idx, cell)) * self.pl_id[pl_idx]
+        print(display.reshape(4,3))
+
+    def generate_actions(self, pl_idx):
+        """Return the flat list of actions available to pl_idx, one insert per empty home cell."""
+        own = self.bits[pl_idx]
+        opp = self.bits[1 - pl_idx]
+        empty = ~(own | opp) & FULL_MASK
+        actions = []
+        for cell in cells(own & END_ROW[pl_idx]):
+            actions.append((cell, None, "Diag", self.piece_label(pl_idx, cell), True))
+        for n, sources in DIAG_SHIFTS[pl_idx]:
+            for target in cells(shift(own & sources, n) & empty):
+                actions.append((target - n, target, "Diag", self.piece_label(pl_idx, target - n), False))
+        step = STEP[pl_idx]
+        for target in cells(shift(own & ~END_ROW[pl_idx], step) & opp):
+            cell = target - step
+            piece_id = self.piece_label(pl_idx, cell)
+            actions.append((cell, target, "Attack", piece_id, False))
+            jump = self.jump_action(pl_idx, cell, target, piece_id)
+            if jump is not None:
+                actions.append(jump)
+        if self.reserve[pl_idx]:
+            piece_id = self.piece_label(pl_idx, None)
+            for target in cells(HOME_ROW[pl_idx] & empty):
+                actions.append((None, target, "Insert", piece_id, False))
+        return actions
+
+    def jump_action(self, pl_idx, cell, target, piece_id):
+        """Return the jump of the piece on cell over the opponent piece on target, or None."""
+        moves = MOVE_TABLE[pl_idx][cell]
+        if moves.jump_scores:
+            return (cell, None, "Jump", piece_id, True) #Score
+        for landing in moves.jump_ray:
+            if self.bits[1 - pl_idx] >> landing & 1:
+                continue
+            if self.bits[pl_idx] >> landing & 1:
+                return None
+            return (cell, landing, "Jump", piece_id, False)
+        return (cell, None, "Jump", piece_id, False) # Jumped off the board over several pieces
+
+    def has_actions(self, pl_idx):
+        own = self.bits[pl_idx]
+        opp = self.bits[1 - pl_idx]
+        empty = ~(own | opp) & FULL_MASK
+        if own & END_ROW[pl_idx] or shift(own & ~END_ROW[pl_idx], STEP[pl_idx]) & opp:
+            return True
+        if self.reserve[pl_idx] and HOME_ROW[pl_idx] & empty:
+            return True
+        return any(shift(own & sources, n) & empty for n, sources in DIAG_SHIFTS[pl_idx])
+
+    def move_counts(self, pl_idx):
+        """Return (actions, attack actions) of pl_idx counted like Player.get_actions,
+        that is with every reserve piece contributing its own inserts."""
+        own = self.bits[pl_idx]
+        opp = self.bits[1 - pl_idx]
+        empty = ~(own | opp) & FULL_MASK
+        count = POPCOUNT[own & END_ROW[pl_idx]]
+        for n, sources in DIAG_SHIFTS[pl_idx]:
+            count += POPCOUNT[shift(own & sources, n) & empty]
+        attacks = 0
+        step = STEP[pl_idx]
+        for target in cells(shift(own & ~END_ROW[pl_idx], step) & opp):
+            attacks += 1
+            if self.jump_action(pl_idx, target - step, target, 0) is not None:
+                count += 1
+        count += attacks + self.reserve[pl_idx] * POPCOUNT[HOME_ROW[pl_idx] & empty]
+        return (count, attacks)
+
+    def update_state(self, action, minimax_depth=-1):
+        pl_idx = self.pl_turn
+        if minimax_depth != -1:
+            if self.undo_top == UNDO_STACK_SIZE:
+                raise RuntimeError(UNDO_OVERFLOW)
+            self.undo_hashes[self.undo_top] = self.hash
+        if action is not None:
+            if action[0] is None:
+                self.reserve[pl_idx] -= 1
+            else:
+                self.bits[pl_idx] ^= 1 << action[0]
+                self.hash ^= ZOBRIST_CELLS[pl_idx][action[0]]
+                self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[pl_idx][action[0]]
+            if action[1] is None:
+                self.reserve[pl_idx] += 1
+            else:
+                if action[2] == 'Attack':
+                    self.bits[1 - pl_idx] ^= 1 << action[1]
+                    self.reserve[1 - pl_idx] += 1
+                    self.hash ^= ZOBRIST_CELLS[1 - pl_idx][action[1]]
+                    self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[1 - pl_idx][action[1]]
+                self.bits[pl_idx] ^= 1 << action[1]
+                self.hash ^= ZOBRIST_CELLS[pl_idx][action[1]]
+                self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[pl_idx][action[1]]
+            if action[4]:
+                self.hash ^= ZOBRIST_SCORES[pl_idx][self.pl_scores[pl_idx]]
+                self.pl_scores[pl_idx] += 1
+                self.hash ^= ZOBRIST_SCORES[pl_idx][self.pl_scores[pl_idx]]
+        if minimax_depth != -1:
+            self.undo_actions[self.undo_top] = action
+            self.undo_top += 1
+        self.pl_turn = 1 - pl_idx
+        self.hash ^= ZOBRIST_TURN
+        self.actions_cache[0] = self.actions_cache[1] = None
+        if minimax_depth == -1:
+            self.history[self.hash] = self.history.get(self.hash, 0) + 1
+
+    def r_update_state(self):
+        self.undo_top -= 1
+        action = self.undo_actions[self.undo_top]
+        pl_idx = 1 - self.pl_turn
+        if action is not None:
+            if action[4]:
+                self.hash ^= ZOBRIST_SCORES[pl_idx][self.pl_scores[pl_idx]]
+                self.pl_scores[pl_idx] -= 1
+                self.hash ^= ZOBRIST_SCORES[pl_idx][self.pl_scores[pl_idx]]
+            if action[1] is None:
+                self.reserve[pl_idx] -= 1
+            else:
+                self.bits[pl_idx] ^= 1 << action[1]
+                self.hash ^= ZOBRIST_CELLS[pl_idx][action[1]]
+                self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[pl_idx][action[1]]
+                if action[2] == 'Attack':
+                    self.bits[1 - pl_idx] ^= 1 << action[1]
+                    self.reserve[1 - pl_idx] -= 1
+                    self.hash ^= ZOBRIST_CELLS[1 - pl_idx][action[1]]
+                    self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[1 - pl_idx][action[1]]
+            if action[0] is None:
+                self.reserve[pl_idx] += 1
+            else:
+                self.bits[pl_idx] ^= 1 << action[0]
+                self.hash ^= ZOBRIST_CELLS[pl_idx][action[0]]
+                self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[pl_idx][action[0]]
+        self.pl_turn = pl_idx
+        self.hash ^= ZOBRIST_TURN
+        self.actions_cache[0] = self.actions_cache[1] = None
+
+    def resolve_action(self, action):
+        if action is None:
+            return None
+        return (action[0], action[1], action[2], self.piece_label(self.pl_turn, action[0]), action[4])
+
+    def eval_state(self, invoking_player=None):
+        evaluation = 0
+        pl_params = self.pl_params[invoking_player] if invoking_player is not None else {}
+
+        # evaluate scores
+        evaluation += self.pl_scores[1] - self.pl_scores[0]
+
+        # evaluate position of pieces
+        if 'row_score' in pl_params and pl_params['row_score'] > 0:
+            rows_advanced = DISTANCE_SUM[1][self.bits[1]] - DISTANCE_SUM[0][self.bits[0]]
+            evaluation += rows_advanced * pl_params['row_score']
+
+        # evaluate available actions
+        if 'action_score' in pl_params and pl_params['action_score'] > 0:
+            attack_action_score = pl_params.get('attack_action_score', 0)
+            for pl_idx, sign in ((0, -1), (1, 1)):
+                count, attacks = self.move_counts(pl_idx)
+                dynamic_action_score = pl_params['action_score']
+                for _ in range(count):
+                    dynamic_action_score = dynamic_action_score / pl_params.get('action_score_decrease_rate', 2)
+                    evaluation += sign * dynamic_action_score
+                # bonus for attack actions
+                if attack_action_score > 0 and self.pl_turn == pl_idx:
+                    evaluation += sign * attacks * attack_action_score
+        return evaluation
+
+    def cells_code(self):
+        return BASE3[self.bits[0]] + 2 * BASE3[self.bits[1]]
+
+    def terminal_test(self):
+        gridlock_win, score_win = None, None
+        if not self.has_actions(0) and not self.has_actions(1):
+            gridlock_win = self.pl_id[self.pl_turn] # Current player wins
+        if self.wining_score in self.pl_scores:
+            if self.pl_scores[self.pl_turn] > self.pl_scores[1 - self.pl_turn]:
+                score_win = self.pl_id[self.pl_turn]
+            elif self.pl_scores[self.pl_turn] < self.pl_scores[1 - self.pl_turn]:
+                score_win = self.pl_id[1 - self.pl_turn]
+            else:
+                raise RuntimeError('Score inconsistency, both players have achieved winning_score')
+        return (gridlock_win, score_win)
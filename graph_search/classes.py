@@ -1,4 +1,30 @@
+from timeit import default_timer as timer
+
 import numpy as np
+
+from transposition import (EXACT, LOWER, UPPER, MAX_SCORE, ZOBRIST_CELLS, ZOBRIST_SCORES, ZOBRIST_TURN,
+                           TranspositionTable, initial_hash, position_hash)
+from ordering import MoveOrderer
+from tablebase import Tablebase, MAX_STORED
+from batch_eval import BatchEvaluator
+from stats import SearchStats
+from symmetry import MIRROR_CELL, ZOBRIST_MIRROR_DELTA, canonical_key, to_canonical, from_canonical
+
+WIN_VALUE = 100000 # value of a won game, less the plies from the root of the search to its end
+SEARCH_BOUND = 1000 # bound of the root search window, evaluations of undecided games stay well within it
+NULL_WINDOW = 1e-9 # width of the windows used to prove that an action is not better than the best one
+ASPIRATION_WINDOW = 0.25 # half width of the window around the value of the previous iteration
+MAX_SEARCH_DEPTH = 64 # depth limit of iterative deepening when only a time budget is given
+DRAW_VALUE = 0 # value of a position repeated in the game or in the searched line, see Board.repeated
+LMR_MIN_DEPTH = 3 # remaining depth from which late quiet actions are searched with a reduced depth
+QUIET_ACTIONS = ('Diag', 'Insert') # actions that neither take nor jump over an opponent piece
+UNDO_STACK_SIZE = 1024 # actions that can be made and not yet unmade, search plies plus the walks around the search
+UNDO_OVERFLOW = (f'Undo stack overflow: more than UNDO_STACK_SIZE ({UNDO_STACK_SIZE}) actions made with minimax_depth '
+                 f'and not taken back, the search, or the MCTS tree and its rollouts, went deeper than the stack')
+# Values beyond it are decided games: no search ply nor tablebase distance takes a won game below it
+DECIDED_VALUE = WIN_VALUE - UNDO_STACK_SIZE - MAX_STORED
+
+
 class Board():
     def __init__(self,pl1,pl2,score, pl1_params=None, pl2_params=None):
         """
@@ -6,7 +32,7 @@ class Board():
         :param pl2: Boolean value, True for human, False for machine
         :param score: Int, amount of points need to win the game
         """
-        self.state = list(np.zeros((12))) #Three possible states [-1,0,1] 0 = vacant, -1 for pl1,1 for pl2
+        self.state = [0] * 12 #Three possible states [-1,0,1] 0 = vacant, -1 for pl1,1 for pl2
         self.pl_id = [-1, 1]
         self.pl = [Player(pl1,self.pl_id[0]),Player(pl2,self.pl_id[1])]
         self.pl_turn = 0 #[0 for player 1, 1 for player 2]
@@ -15,7 +41,41 @@ class Board():
         self.pl_params = [pl1_params, pl2_params]
         self.row_count = 4
         self.column_count = 3
-        self.minimax_dict = {}
+        # Undo stack of the actions made with minimax_depth, preallocated so that make/unmake do not grow lists
+        # (the hash and mirror_delta XORs still create ints), see update_state for its overflow
+        self.undo_actions = [None] * UNDO_STACK_SIZE
+        self.undo_defenders = [0] * UNDO_STACK_SIZE # piece_id of the piece taken by an attack
+        self.undo_hashes = [0] * UNDO_STACK_SIZE # hash of the position the action was played from
+        self.undo_top = 0
+        if score > MAX_SCORE:
+            raise ValueError(f'Winning score {score} exceeds the supported maximum of {MAX_SCORE}')
+        self.hash = initial_hash()
+        self.mirror_delta = 0 # hash ^ mirror_delta is the hash of the mirrored position, see symmetry.py
+        self.history = {self.hash: 1} # times every position occurred in the game, updated by the game's moves
+        self.tt = [TranspositionTable.from_params(params) for params in self.pl_params]
+        # Score positions that occurred before in the game or the searched line as draws
+        self.repetition_detection = [(params or {}).get('repetition_detection', False) for params in self.pl_params]
+        # Store a position and its mirror image in the same entry of the table
+        self.tt_symmetry = [(params or {}).get('tt_symmetry', False) for params in self.pl_params]
+        self.deadline = None # timer() value at which an iterative deepening search stops
+        self.search_aborted = False
+        self.node_count = 0
+        self.actions_cache = [None, None] # actions of each player in the current state, see get_actions
+        self.rows_advanced = 0 # row term of eval_state, kept up to date by update_pos and r_update_pos
+        self.orderers = [MoveOrderer.from_params(params) for params in self.pl_params]
+        self.tablebases = [Tablebase.from_params(params) for params in self.pl_params]
+        self.evaluators = [BatchEvaluator.from_params(params) for params in self.pl_params]
+        self.ply = 0 # distance from the root of the running search
+        # Repetition draws scored by the search so far, a node whose subtree scored one is not stored in
+        # the table: its value depends on the line leading to it, not only on the position
+        self.repetition_draws = 0
+        # Selective search: actions searched at full depth before late quiet actions are reduced by a ply,
+        # and plies Attack and Jump actions may extend a line of the search by (0 disables both)
+        self.late_move_reductions = [(params or {}).get('late_move_reductions', 0) for params in self.pl_params]
+        self.capture_extensions = [(params or {}).get('capture_extensions', 0) for params in self.pl_params]
+        self.extensions = 0 # plies the current line of the search was extended by
+        self.root_bound = None # best root value of a parallel search shared by its workers, see parallel.py
+        self.stats = [SearchStats.from_params(params) for params in self.pl_params] # None unless enabled
         self.action_evaluator = {"Attack": [0, 0], "Diag": [0, 0], "Jump": [0, 0], "Insert": [0, 0]}
 
     def display_board(self):
@@ -27,28 +87,82 @@ class Board():
                 display[idx] = 0
         print(display.reshape(4,3))
 
+    def load_position(self, cells, pl_scores, pl_turn):
+        """Set up an arbitrary position: cells[c] is the pl_id of the piece on cell c, or 0 if it is empty.
+        Pieces are placed in cell order from piece_id 0, the others wait in reserve."""
+        self.state = [0] * 12
+        self.pl = [Player(player.human, player.pl_id) for player in self.pl]
+        for player in self.pl:
+            own_cells = [cell for cell, pl_id in enumerate(cells) if pl_id == player.pl_id]
+            if len(own_cells) > player.piece_count:
+                raise ValueError(f'Player {player.pl_id} has {len(own_cells)} pieces on the board, at most {player.piece_count} exist')
+            for piece, cell in zip(player.pieces, own_cells):
+                piece.on_board = True
+                piece.pos = cell
+                self.state[cell] = piece
+            player.piece_count -= len(own_cells)
+        if max(pl_scores) > MAX_SCORE:
+            raise ValueError(f'Score {max(pl_scores)} exceeds the supported maximum of {MAX_SCORE}')
+        self.pl_scores = list(pl_scores)
+        self.pl_turn = pl_turn
+        self.hash = self.compute_hash()
+        self.mirror_delta = self.hash ^ self.compute_hash(mirrored=True)
+        self.rows_advanced = sum(ROWS_ADVANCED[(pl_id + 1) // 2][cell] for cell, pl_id in enumerate(cells) if pl_id != 0)
+        self.undo_top = 0
+        self.history = {self.hash: 1}
+        self.actions_cache = [None, None]
+
+    def compute_hash(self, mirrored=False):
+        """Return the Zobrist hash of the current position computed from scratch, which self.hash should equal,
+        or with mirrored the one of its mirror image, which self.hash ^ self.mirror_delta should equal."""
+        cells = [None if piece == 0 else (piece.pl_id + 1) // 2 for piece in self.state]
+        if mirrored:
+            cells = [cells[MIRROR_CELL[cell]] for cell in range(len(cells))]
+        return position_hash(cells, self.pl_scores, self.pl_turn)
+
     def update_state(self,action,minimax_depth=-1):
+        """Play action (None passes) for the player to move. With minimax_depth (the ply of the
+        search) the action is pushed on the undo stack, and r_update_state can take it back.
+        Actions without it are moves of the game, and the new position is added to the history."""
+        if minimax_depth != -1:
+            if self.undo_top == UNDO_STACK_SIZE:
+                raise RuntimeError(UNDO_OVERFLOW)
+            self.undo_hashes[self.undo_top] = self.hash
         #(old pos, new pos, move type,score)
         # update piece and score
         if action is not None:
-            if minimax_depth != -1:
-                self.minimax_dict[minimax_depth]["action"] = action
-                self.minimax_dict[minimax_depth]["player"] = self.pl_turn
             self.update_piece_and_player(action,minimax_depth)
             #update board
             self.update_pos(action)
             #update score
             self.update_score(action)
+        if minimax_depth != -1:
+            self.undo_actions[self.undo_top] = action
+            self.undo_top += 1
         #update turn
         self.pl_turn = (self.pl_turn + 1) % 2
+        self.hash ^= ZOBRIST_TURN
+        self.actions_cache[0] = self.actions_cache[1] = None
+        if minimax_depth == -1:
+            self.history[self.hash] = self.history.get(self.hash, 0) + 1
 
 
     def update_pos(self,action):
         pl_idx = self.pl_turn
         if action[0] != None:
             self.state[action[0]] = 0
+            self.hash ^= ZOBRIST_CELLS[pl_idx][action[0]]
+            self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[pl_idx][action[0]]
+            self.rows_advanced -= ROWS_ADVANCED[pl_idx][action[0]]
         if action[1] != None:
+            if action[2] == 'Attack':
+                self.hash ^= ZOBRIST_CELLS[(pl_idx + 1) % 2][action[1]]
+                self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[(pl_idx + 1) % 2][action[1]]
+                self.rows_advanced -= ROWS_ADVANCED[(pl_idx + 1) % 2][action[1]]
             self.state[action[1]] = self.pl[pl_idx].pieces[action[3]]
+            self.hash ^= ZOBRIST_CELLS[pl_idx][action[1]]
+            self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[pl_idx][action[1]]
+            self.rows_advanced += ROWS_ADVANCED[pl_idx][action[1]]
 
     def update_piece_and_player(self,action,minimax_depth=-1):
         pl_idx = self.pl_turn
@@ -57,7 +171,7 @@ class Board():
             self.state[action[1]].pos = None
             self.pl[int(not bool(pl_idx))].piece_count +=1
             if minimax_depth != -1:
-                self.minimax_dict[minimax_depth]["defender"] = (self.state[action[1]].piece_id,int(not bool(pl_idx))) #Save piece_id of piece being attacked, and owner_id
+                self.undo_defenders[self.undo_top] = self.state[action[1]].piece_id #Save piece_id of piece being attacked
 
         if action[0] == None:
             self.pl[pl_idx].pieces[action[3]].on_board = True
@@ -72,42 +186,55 @@ class Board():
 
     def update_score(self,action):
         if action[-1]:
+            self.hash ^= ZOBRIST_SCORES[self.pl_turn][self.pl_scores[self.pl_turn]]
             self.pl_scores[self.pl_turn] +=1
+            self.hash ^= ZOBRIST_SCORES[self.pl_turn][self.pl_scores[self.pl_turn]]
 
-    def r_update_state(self,n_depth=-1):
-        #Reverse update
-        #update score
-        self.r_update_score(n_depth)
-        #update board
-        self.r_update_pos(n_depth)
-        #update piece and score
-        self.r_update_piece_and_player(n_depth)
+    def r_update_state(self):
+        """Take back the last action pushed on the undo stack by update_state."""
+        self.undo_top -= 1
+        action = self.undo_actions[self.undo_top]
         #update turn
         self.pl_turn = (self.pl_turn + 1) % 2
+        self.hash ^= ZOBRIST_TURN
+        self.actions_cache[0] = self.actions_cache[1] = None
+        if action is not None:
+            #update score
+            self.r_update_score(action)
+            #update board
+            self.r_update_pos(action)
+            #update piece and score
+            self.r_update_piece_and_player(action)
 
 
-    def r_update_pos(self,n_depth=-1):
-        action = self.minimax_dict[n_depth]['action']
-        pl_idx = self.minimax_dict[n_depth]["player"]
+    def r_update_pos(self,action):
+        pl_idx = self.pl_turn
         if action[0] != None:
             self.state[action[0]] = self.pl[pl_idx].pieces[action[3]]
+            self.hash ^= ZOBRIST_CELLS[pl_idx][action[0]]
+            self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[pl_idx][action[0]]
+            self.rows_advanced += ROWS_ADVANCED[pl_idx][action[0]]
         if action[1] != None:
+             self.hash ^= ZOBRIST_CELLS[pl_idx][action[1]]
+             self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[pl_idx][action[1]]
+             self.rows_advanced -= ROWS_ADVANCED[pl_idx][action[1]]
              if action[2] == "Attack":
-                 opponent_piece_id,opponent_pl_id = self.minimax_dict[n_depth]["defender"]
-                 self.state[action[1]] = self.pl[opponent_pl_id].pieces[opponent_piece_id]
+                 opponent_pl_id = (pl_idx + 1) % 2
+                 self.state[action[1]] = self.pl[opponent_pl_id].pieces[self.undo_defenders[self.undo_top]]
+                 self.hash ^= ZOBRIST_CELLS[opponent_pl_id][action[1]]
+                 self.mirror_delta ^= ZOBRIST_MIRROR_DELTA[opponent_pl_id][action[1]]
+                 self.rows_advanced += ROWS_ADVANCED[opponent_pl_id][action[1]]
              else:
                 self.state[action[1]] = 0
 
 
 
-    def r_update_piece_and_player(self,n_depth=-1):  #YET TO BE IMPLEMENTED
-        
-        action = self.minimax_dict[n_depth]['action']
-        pl_idx = self.minimax_dict[n_depth]["player"]
+    def r_update_piece_and_player(self,action):
+        pl_idx = self.pl_turn
 
         if action[2] == "Attack":
-            opponent_piece_id, opponent_pl_id = self.minimax_dict[n_depth]["defender"]
-            removed_piece = self.pl[opponent_pl_id].pieces[opponent_piece_id]
+            opponent_pl_id = (pl_idx + 1) % 2
+            removed_piece = self.pl[opponent_pl_id].pieces[self.undo_defenders[self.undo_top]]
             removed_piece.on_board = True
             removed_piece.pos = action[1]
             self.pl[opponent_pl_id].piece_count -= 1
@@ -123,11 +250,12 @@ class Board():
         else:
             self.pl[pl_idx].pieces[action[3]].pos = action[0]
 
-    def r_update_score(self,n_depth=-1):
-        action = self.minimax_dict[n_depth]['action']
-        pl_idx = self.minimax_dict[n_depth]["player"]
+    def r_update_score(self,action):
+        pl_idx = self.pl_turn
         if action[4]:
+            self.hash ^= ZOBRIST_SCORES[pl_idx][self.pl_scores[pl_idx]]
             self.pl_scores[pl_idx] -=1
+            self.hash ^= ZOBRIST_SCORES[pl_idx][self.pl_scores[pl_idx]]
 
 
     def eval_state(self, invoking_player=None):
@@ -141,49 +269,86 @@ class Board():
         score_balance = self.pl_scores[1] - self.pl_scores[0]
         evaluation += score_balance
 
-        # evaluate position of pieces
+        # evaluate position of pieces, rows_advanced is the distance from home of the pieces
+        # of player 2 minus the distance from home of the pieces of player 1
         if 'row_score' in pl_params and pl_params['row_score'] > 0:
-            rows_advanced = 0
-            for _, piece in enumerate(self.state):
-                if piece: # non-empty cell
-                    if piece.pl_id == 1:
-                        rows_advanced += piece.distance_from_home()
-                    elif piece.pl_id == -1:
-                        # substract points for the pieces of the other player
-                        rows_advanced -= piece.distance_from_home()
-                    else:
-                        raise ValueError('Unknown player "{}" in Piece, valid players: [0,1]'.format(piece.pl_id))
-            evaluation += rows_advanced * pl_params['row_score']
+            evaluation += self.rows_advanced * pl_params['row_score']
 
         # evaluate available actions
-        if 'action_score' in pl_params and pl_params['action_score'] > 0:
+        if ('action_score' in pl_params and pl_params['action_score'] > 0 and
+                not pl_params.get('attack_action_score', 0) > 0):
+            # only the number of actions matters, count them without building the action lists
+            rate = pl_params.get('action_score_decrease_rate', 2)
+            dynamic_action_score = pl_params['action_score']
+            for _ in range(self.count_actions(0)):
+                dynamic_action_score = dynamic_action_score / rate
+                evaluation -= dynamic_action_score
             dynamic_action_score = pl_params['action_score']
-            for sublist in self.pl[0].get_actions(self):
-                for action in sublist:
-                    dynamic_action_score = dynamic_action_score / pl_params.get('action_score_decrease_rate', 2)
-                    evaluation -= dynamic_action_score
-                    # bonus for attack actions
-                    if ('attack_action_score' in pl_params and
-                            action[2] == 'Attack' and
-                            pl_params['attack_action_score'] > 0 and
-                            self.pl_turn == 0):
-                        evaluation -= pl_params['attack_action_score']
+            for _ in range(self.count_actions(1)):
+                dynamic_action_score = dynamic_action_score / rate
+                evaluation += dynamic_action_score
+        elif 'action_score' in pl_params and pl_params['action_score'] > 0:
             dynamic_action_score = pl_params['action_score']
-            for sublist in self.pl[1].get_actions(self):
-                for action in sublist:
-                    dynamic_action_score = dynamic_action_score / pl_params.get('action_score_decrease_rate', 2)
-                    evaluation += dynamic_action_score
-                    # bonus for attack actions
-                    if ('attack_action_score' in pl_params and
-                            action[2] == 'Attack' and
-                            pl_params['attack_action_score'] > 0 and
-                            self.pl_turn == 1):
-                        evaluation += pl_params['attack_action_score']
+            for action in self.get_actions(0):
+                dynamic_action_score = dynamic_action_score / pl_params.get('action_score_decrease_rate', 2)
+                evaluation -= dynamic_action_score
+                # bonus for attack actions
+                if ('attack_action_score' in pl_params and
+                        action[2] == 'Attack' and
+                        pl_params['attack_action_score'] > 0 and
+                        self.pl_turn == 0):
+                    evaluation -= pl_params['attack_action_score']
+            dynamic_action_score = pl_params['action_score']
+            for action in self.get_actions(1):
+                dynamic_action_score = dynamic_action_score / pl_params.get('action_score_decrease_rate', 2)
+                evaluation += dynamic_action_score
+                # bonus for attack actions
+                if ('attack_action_score' in pl_params and
+                        action[2] == 'Attack' and
+                        pl_params['attack_action_score'] > 0 and
+                        self.pl_turn == 1):
+                    evaluation += pl_params['attack_action_score']
         return evaluation
 
+    def get_actions(self, pl_idx):
+        """Return the flat list of actions of player pl_idx in the current state.
+        The list is generated once per state and shared by the search, terminal_test and eval_state,
+        so it must not be modified by the caller.
+        """
+        actions = self.actions_cache[pl_idx]
+        if actions is None:
+            actions = self.actions_cache[pl_idx] = self.generate_actions(pl_idx)
+        return actions
+
+    def generate_actions(self, pl_idx):
+        return [action for piece_actions in self.pl[pl_idx].get_actions(self) for action in piece_actions]
+
+    def count_actions(self, pl_idx):
+        """Return the number of actions of player pl_idx, which is what the action_score term needs."""
+        actions = self.actions_cache[pl_idx]
+        if actions is not None:
+            return len(actions)
+        return self.pl[pl_idx].count_actions(self)
+
+    def has_actions(self, pl_idx):
+        """Return True if player pl_idx has a legal action, stopping at the first one found."""
+        actions = self.actions_cache[pl_idx]
+        if actions is not None:
+            return len(actions) > 0
+        return self.pl[pl_idx].has_actions(self)
+
+    def cells_code(self):
+        """Return the base 3 code of the cells used by the tablebase, digit c is 0 if cell c is empty
+        and 1 + pl_idx of the piece on it otherwise."""
+        code = 0
+        for cell in range(len(self.state) - 1, -1, -1):
+            piece = self.state[cell]
+            code = code * 3 + (0 if piece == 0 else (piece.pl_id + 3) // 2)
+        return code
+
     def terminal_test(self):
         gridlock_win, score_win = None, None
-        if self.pl[0].get_actions(self) == [] and self.pl[1].get_actions(self) == []:
+        if not self.has_actions(0) and not self.has_actions(1):
             #If the actions of both pl1 and pl2 is None at the current state
             gridlock_win = self.pl_id[self.pl_turn] # Current player wins
         if self.wining_score in self.pl_scores:
@@ -195,102 +360,323 @@ class Board():
                 raise RuntimeError('Score inconsistency, both players have achieved winning_score')
         return (gridlock_win, score_win)
 
-    def max_alpha_beta(self, alpha, beta, n_depth, invoking_player=None):
-        maxv = -100000 #VERY SMALL
+    def repeated(self):
+        """Return True if the current position occurred before, in the game or in the line of
+        actions pushed on the undo stack. The hash includes the player to move, so only every
+        other position of the line can match."""
+        if self.hash in self.history:
+            return True
+        undo_hashes, key = self.undo_hashes, self.hash
+        for idx in range(self.undo_top - 2, -1, -2):
+            if undo_hashes[idx] == key:
+                return True
+        return False
+
+    def start_search(self, invoking_player):
+        """Prepare the search tables of invoking_player for a new search from the current state."""
+        tt = self.tt[invoking_player]
+        if tt is not None:
+            tt.new_search()
+        self.orderers[invoking_player].new_search()
+        self.ply = 0
+        self.extensions = 0
+
+    def iterative_deepening(self, invoking_player, time_ms, max_depth=MAX_SEARCH_DEPTH):
+        """Search with increasing depth until time_ms milliseconds have passed.
+        Return (value, action, depth) of the deepest iteration that completed. The first
+        iteration always completes, so a move is returned even with a tiny budget.
+        Every iteration after the first searches a narrow (aspiration) window around the value
+        of the previous one, which is widened and searched again when the value falls outside.
+        """
+        self.start_search(invoking_player)
+        color = 1 if invoking_player == 1 else -1
+        tablebase = self.tablebases[invoking_player]
+        in_tablebase = tablebase is not None and tablebase.probe(self) is not None # its move needs no deeper search
+        aspiration_window = (self.pl_params[invoking_player] or {}).get('aspiration_window', ASPIRATION_WINDOW)
+        start = timer()
+        best = None
+        for depth in range(1, max_depth + 1):
+            alpha, beta, delta = -SEARCH_BOUND, SEARCH_BOUND, aspiration_window
+            if best is not None and delta > 0:
+                alpha = max(color * best[0] - delta, -SEARCH_BOUND)
+                beta = min(color * best[0] + delta, SEARCH_BOUND)
+            while True:
+                value, action = self.negamax(alpha, beta, depth, color, invoking_player=invoking_player,
+                                             first_action=best[1] if best else None)
+                if self.search_aborted:
+                    break
+                if value <= alpha and alpha > -SEARCH_BOUND:
+                    delta *= 4
+                    alpha = max(value - delta, -SEARCH_BOUND)
+                elif value >= beta and beta < SEARCH_BOUND:
+                    delta *= 4
+                    beta = min(value + delta, SEARCH_BOUND)
+                else:
+                    break
+            if self.search_aborted:
+                break
+            best = (color * value, action, depth)
+            stats = self.stats[invoking_player]
+            if stats is not None:
+                stats.depth_times.append(timer() - start)
+            if abs(value) >= DECIDED_VALUE or in_tablebase: # the game is decided within the horizon
+                break
+            # Later iterations may be interrupted when the budget runs out
+            self.deadline = start + time_ms / 1000
+            if timer() >= self.deadline:
+                break
+        self.deadline = None
+        self.search_aborted = False
+        return best
+
+    def out_of_time(self):
+        """Return True once the deadline of the running iterative deepening search has passed."""
+        if self.deadline is not None:
+            self.node_count += 1
+            if self.node_count & 127 == 0 and timer() >= self.deadline:
+                self.search_aborted = True
+        return self.search_aborted
+
+    def resolve_action(self, action):
+        """Return action with the piece_id of the piece that would perform it in the current state.
+        Actions stored in the transposition table may come from a transposed position where
+        a different piece occupies the cell, or a different piece is waiting to be inserted."""
+        if action is None:
+            return None
+        if action[0] is not None:
+            piece_id = self.state[action[0]].piece_id
+        else:
+            piece_id = next(piece.piece_id for piece in self.pl[self.pl_turn].pieces if not piece.on_board)
+        return (action[0], action[1], action[2], piece_id, action[4])
+
+    def probe_tt(self, alpha, beta, n_depth, invoking_player):
+        """Look up the current state in the transposition table of invoking_player.
+        Return (cutoff, value, action), where cutoff is True if the stored bound settles the search
+        within the (alpha, beta) window, and action is the best action stored for the state."""
+        tt = self.tt[invoking_player] if invoking_player is not None else None
+        if tt is None or n_depth == 0:
+            return (False, None, None)
+        if self.tt_symmetry[invoking_player]:
+            key, mirrored = canonical_key(self)
+        else:
+            key, mirrored = self.hash, False
+        entry = tt.probe(key)
+        if entry is None:
+            return (False, None, None)
+        move = from_canonical(entry.move, mirrored)
+        if entry.depth >= n_depth:
+            value = self.from_tt_value(entry.value)
+            if (entry.flag == EXACT or
+                    (entry.flag == LOWER and value >= beta) or
+                    (entry.flag == UPPER and value <= alpha)):
+                return (True, value, self.resolve_action(move))
+        return (False, None, move)
+
+    def store_tt(self, alpha, beta, n_depth, invoking_player, value, action):
+        tt = self.tt[invoking_player] if invoking_player is not None else None
+        if tt is None:
+            return
+        if value <= alpha:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        value = self.to_tt_value(value)
+        if self.tt_symmetry[invoking_player]:
+            key, mirrored = canonical_key(self)
+            tt.store(key, n_depth, flag, value, to_canonical(action, mirrored))
+        else:
+            tt.store(self.hash, n_depth, flag, value, action)
+
+    def to_tt_value(self, value):
+        """Return value, counted from the root of the search, as stored in the transposition table:
+        decided games count their plies from the current state, which other searches reach at other plies."""
+        if value >= DECIDED_VALUE:
+            return value + self.ply
+        if value <= -DECIDED_VALUE:
+            return value - self.ply
+        return value
+
+    def from_tt_value(self, value):
+        """Return a value of the transposition table counted from the root of the search (see to_tt_value)."""
+        if value >= DECIDED_VALUE:
+            return value - self.ply
+        if value <= -DECIDED_VALUE:
+            return value + self.ply
+        return value
+
+    def negamax(self, alpha, beta, n_depth, color, invoking_player=None, first_action=None):
+        """Principal variation search of the current state, n_depth plies deep.
+        Values are from the point of view of the player to move, color is 1 if it is MAX (the
+        values of eval_state are used as they are) and -1 if it is MIN (they are negated).
+        The first action is searched with the (alpha, beta) window, the others with a null window
+        proving that they are not better, and only searched again when the proof fails.
+        With the late_move_reductions parameter the late quiet actions are proved one ply shallower
+        first, and with capture_extensions attacks and jumps are searched deeper (see __init__).
+        Return (value, action), value is fail-soft: a bound when it falls outside (alpha, beta).
+        """
+        best_value = -WIN_VALUE
         action = None
+        if self.out_of_time():
+            return (best_value, None)
+        if self.ply and invoking_player is not None and self.repetition_detection[invoking_player] and self.repeated():
+            self.repetition_draws += 1
+            return (DRAW_VALUE, None) # the game would go round in circles
+        stats = self.stats[invoking_player] if invoking_player is not None else None
+        if stats is not None:
+            stats.nodes += 1
+            if self.ply > stats.max_ply:
+                stats.max_ply = self.ply
+
+        cutoff, value, tt_action = self.probe_tt(alpha, beta, n_depth, invoking_player)
+        if cutoff:
+            return (value, tt_action)
 
         terminal = self.terminal_test()
+        # Wins count the plies from the root, the faster wins and slower losses are better
         if terminal[0]:
-            #print("Max terminal:")
-            #print(terminal)
-            #self.display_board()
-            return (-maxv, None) #If game is gridlocked, then Max won
+            return (WIN_VALUE - self.ply, None) #If game is gridlocked, then the player to move won
         if terminal[1]:
-            #print("Max terminal:")
-            #print(terminal)
-            #self.display_board()
-            return (maxv, None) #If game is won by score, then Max lost
+            return (-(WIN_VALUE - self.ply), None) #If game is won by score, then the player to move lost
+        tablebase = self.tablebases[invoking_player] if invoking_player is not None else None
+        if tablebase is not None:
+            stored = tablebase.probe(self)
+            if stored is not None:
+                if stats is not None:
+                    stats.tablebase_hits += 1
+                if self.ply == 0:
+                    action = tablebase.best_action(self, n_depth)
+                if stored == 0:
+                    return (DRAW_VALUE, action)
+                # The player to move wins (stored > 0) or loses in abs(stored) - 1 plies from here
+                return ((WIN_VALUE - (self.ply + abs(stored) - 1)) * (1 if stored > 0 else -1), action)
         if n_depth==0:
-            return (self.eval_state(invoking_player=invoking_player),None)
-        
-        actions = self.pl[self.pl_turn].get_actions(self)
-        actions = self.moveOrdering([action for sublist in actions for action in sublist]) #Flatten the list of lists
-        if actions == []:
-            actions = [None]
-        for act in actions: #For all available actions at this point
-            self.minimax_dict[n_depth] = {}
-            self.update_state(act,minimax_depth=n_depth) #Update the state.
-            #print(n_depth)
-            #self.display_board()
-            m,min_action = self.min_alpha_beta(alpha,beta,n_depth=n_depth-1, invoking_player=invoking_player)
-
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return (color * self.eval_state(invoking_player=invoking_player), None)
 
-            if m > maxv: #Best action so far
-                maxv = m 
-                action = act
-            
-            if act is None:
-                self.pl_turn = (self.pl_turn + 1) % 2
-            else:
-                self.r_update_state(n_depth)
-
-
-            if maxv >= beta:
-                return (maxv, action)
-            
-            if maxv > alpha:
-                alpha = maxv
-        return (maxv, action)
-
-    def min_alpha_beta(self, alpha, beta, n_depth, invoking_player=None):
-        minv = 100000 #VERY LARGE
-        action = None
-
-        terminal = self.terminal_test()
-        if terminal[0]:
-            #print("Min terminal:")
-            #print(terminal)
-            #self.display_board()
-            return (-minv, None) #If game is gridlocked, then Min won
-        if terminal[1]:
-            #print("Min terminal:")
-            #print(terminal)
-            #self.display_board()
-            return (minv, None) #If game is won by score, then Min lost
-        if n_depth==0:
-            return (self.eval_state(invoking_player=invoking_player),None)
-        
-        actions = self.pl[self.pl_turn].get_actions(self)
-        actions = self.moveOrdering([action for sublist in actions for action in sublist]) #Flatten and order the list of lists
+        actions = self.order_actions(self.get_actions(self.pl_turn), invoking_player, tt_action or first_action)
         if actions == []:
             actions = [None]
-        for act in actions: #For all available actions at this point
-            self.minimax_dict[n_depth] = {}
+        if stats is not None:
+            stats.interior_nodes += 1
+        alpha_orig = alpha
+        repetition_draws = self.repetition_draws
+        evaluator = self.evaluators[invoking_player] if invoking_player is not None else None
+        late_move_reductions = self.late_move_reductions[invoking_player] if invoking_player is not None else 0
+        capture_extensions = self.capture_extensions[invoking_player] if invoking_player is not None else 0
+        if (n_depth == 1 and evaluator is not None and tablebase is None
+                and not (capture_extensions and self.extensions < capture_extensions)):
+            # Evaluate all the children at once, then pick the action like the loop below would
+            # (not when attacks and jumps may still be extended, the loop searches them deeper)
+            if stats is not None:
+                stats.nodes += len(actions)
+                stats.leaf_evaluations += len(actions)
+                stats.max_ply = max(stats.max_ply, self.ply + 1)
+            repeated = [False] * len(actions)
+            if self.repetition_detection[invoking_player]:
+                # The children negamax would score as repetition draws, before anything else
+                for idx, act in enumerate(actions):
+                    self.update_state(act, minimax_depth=n_depth)
+                    repeated[idx] = self.repeated()
+                    self.r_update_state()
+            for idx, value in enumerate(evaluator.child_values(self, actions, color, WIN_VALUE - (self.ply + 1))):
+                if self.out_of_time(): # counts the child like its negamax call would
+                    break
+                if repeated[idx]:
+                    value = DRAW_VALUE
+                    self.repetition_draws += 1
+                if value > best_value:
+                    best_value = value
+                    action = actions[idx]
+                if best_value >= beta:
+                    self.record_cutoff(actions[idx], idx, n_depth, invoking_player)
+                    break
+            if not self.search_aborted and self.repetition_draws == repetition_draws:
+                self.store_tt(alpha_orig, beta, n_depth, invoking_player, best_value, action)
+            return (best_value, action)
+        for idx, act in enumerate(actions): #For all available actions at this point
+            if self.ply == 1 and self.root_bound is not None:
+                # The root bound other workers found since this root action started narrows its window
+                beta = min(beta, color * self.root_bound.value)
+                if best_value >= beta:
+                    break
             self.update_state(act,minimax_depth=n_depth) #Update the state.
-            #print(n_depth)
-            #self.display_board()
-            m,max_action = self.max_alpha_beta(alpha,beta,n_depth=n_depth-1, invoking_player=invoking_player)
-
-            if m < minv: #Best action so far
-                minv = m 
-                action = act
-            
-            if act is None:
-                self.pl_turn = (self.pl_turn + 1) % 2
+            self.ply += 1
+            child_depth = n_depth - 1
+            extended = capture_extensions and act is not None and act[2] not in QUIET_ACTIONS and self.extensions < capture_extensions
+            if extended:
+                # Search exchanges one ply deeper so that the horizon does not fall in the middle of them
+                child_depth += 1
+                self.extensions += 1
+            if idx == 0:
+                value = -self.negamax(-beta, -alpha, child_depth, -color, invoking_player)[0]
             else:
-                self.r_update_state(n_depth)
-
-
-            if minv <= alpha:
-                return (minv, action)
-            
-            if minv < beta:
-                beta = minv
-        return (minv, action)
+                reduced = (late_move_reductions and idx >= late_move_reductions and n_depth >= LMR_MIN_DEPTH
+                           and act is not None and act[2] in QUIET_ACTIONS)
+                value = -self.negamax(-alpha - NULL_WINDOW, -alpha, child_depth - reduced, -color, invoking_player)[0]
+                if reduced and value > alpha and not self.search_aborted:
+                    # The reduced search found act better than the best action so far, check at full depth
+                    value = -self.negamax(-alpha - NULL_WINDOW, -alpha, child_depth, -color, invoking_player)[0]
+                if alpha < value < beta and not self.search_aborted:
+                    # act may be better than the best action so far, get its exact value
+                    value = -self.negamax(-beta, -alpha, child_depth, -color, invoking_player)[0]
+            if extended:
+                self.extensions -= 1
+            self.ply -= 1
+            self.r_update_state()
+
+            if value > best_value: #Best action so far
+                best_value = value
+                action = act
 
-    def moveOrdering(self,actions):
+            if best_value >= beta:
+                self.record_cutoff(act, idx, n_depth, invoking_player)
+                break
+
+            if best_value > alpha:
+                alpha = best_value
+        if not self.search_aborted and self.repetition_draws == repetition_draws:
+            self.store_tt(alpha_orig, beta, n_depth, invoking_player, best_value, action)
+        return (best_value, action)
+
+    def max_alpha_beta(self, alpha, beta, n_depth, invoking_player=None, first_action=None):
+        """Search the current state for MAX, the player that maximizes eval_state."""
+        return self.negamax(alpha, beta, n_depth, 1, invoking_player, first_action)
+
+    def min_alpha_beta(self, alpha, beta, n_depth, invoking_player=None, first_action=None):
+        """Search the current state for MIN, the player that minimizes eval_state."""
+        value, action = self.negamax(-beta, -alpha, n_depth, -1, invoking_player, first_action)
+        return (-value, action)
+
+    def order_actions(self, actions, invoking_player, first_action=None):
+        """Return actions in the order the search of invoking_player should try them."""
+        if invoking_player is None:
+            return self.moveOrdering(actions, first_action)
+        return self.orderers[invoking_player].order(actions, self.pl_turn, self.ply, first_action)
+
+    def record_cutoff(self, action, idx, n_depth, invoking_player):
+        """Update the move ordering and the statistics after action, the idx-th action searched, caused a beta cutoff."""
+        if invoking_player is None:
+            return
+        stats = self.stats[invoking_player]
+        if stats is not None:
+            stats.beta_cutoffs += 1
+            if idx == 0:
+                stats.first_move_cutoffs += 1
+        self.orderers[invoking_player].cutoff(action, self.pl_turn, self.ply, n_depth)
+
+    def moveOrdering(self,actions,first_action=None):
         temp_action_list = sorted(list(zip([action[2] for action in actions],actions)))
-        return [action[1] for action in temp_action_list]
+        actions = [action[1] for action in temp_action_list]
+        if first_action is not None:
+            # Search the best action from the transposition table first
+            for idx, action in enumerate(actions):
+                if action[:3] == first_action[:3]:
+                    actions.insert(0, actions.pop(idx))
+                    break
+        return actions
 
 
 
@@ -305,19 +691,67 @@ class Player():
 
     def get_actions(self,board):
         possible_actions = []
-        for piece_idx,piece in enumerate(self.pieces):
+        for piece in self.pieces:
             actions = piece.get_actions(board)
-            if actions != []:
-                possible_actions.append(piece.get_actions(board))
+            if actions:
+                possible_actions.append(actions)
         return possible_actions
 
+    def has_actions(self,board):
+        return any(piece.has_action(board) for piece in self.pieces)
+
+    def count_actions(self,board):
+        return sum(piece.count_actions(board) for piece in self.pieces)
+
     def initialize_pieces(self,pl_id):
         return [Piece(pl_id,i) for i in range(4)]
-    
 
 
 
 
+
+class CellMoves():
+    """Geometry of the moves of a piece of one player standing on one cell."""
+    __slots__ = ('scores', 'diag', 'forward', 'jump_scores', 'jump_ray')
+
+    def __init__(self, scores, diag, forward, jump_scores, jump_ray):
+        self.scores = scores # the cell is on the opponent's starting row, the piece scores with a Diag
+        self.diag = diag # cells reachable with a Diag, in generation order
+        self.forward = forward # cell in front of the piece, which it can attack and jump over
+        self.jump_scores = jump_scores # jumping over the forward cell leaves the board and scores
+        self.jump_ray = jump_ray # cells beyond the forward cell, in the order a Jump visits them
+
+
+def build_move_table(row_count=4, column_count=3):
+    """Return MOVE_TABLE[pl_idx][cell] and HOME_CELLS[pl_idx] for players with ids [-1, 1]."""
+    cell_count = row_count * column_count
+    move_table, home_cells = [], []
+    for pl_id in (-1, 1):
+        step = column_count * (-pl_id) # player -1 moves down the board, player 1 moves up
+        end_row = range(cell_count - column_count, cell_count) if pl_id == -1 else range(column_count)
+        home_row = range(column_count) if pl_id == -1 else range(cell_count - column_count, cell_count)
+        table = []
+        for cell in range(cell_count):
+            if cell in end_row:
+                table.append(CellMoves(True, (), None, False, ()))
+                continue
+            column = cell % column_count
+            forward = cell + step
+            diag = tuple(forward + shift for shift in (-1, 1) if 0 <= column + shift < column_count)
+            jump_scores = forward in end_row
+            jump_ray = () if jump_scores else tuple(range(forward + step, -1 if step < 0 else cell_count, step))
+            table.append(CellMoves(False, diag, forward, jump_scores, jump_ray))
+        move_table.append(table)
+        home_cells.append(tuple(home_row))
+    return move_table, home_cells
+
+
+MOVE_TABLE, HOME_CELLS = build_move_table()
+# Contribution of a piece of each player on each cell to Board.rows_advanced, that is
+# Piece.distance_from_home, counted negatively for player 1
+ROWS_ADVANCED = [[-(cell // 3 + 1) for cell in range(12)], [4 - cell // 3 for cell in range(12)]]
+
+
 class Piece():
     def __init__(self,pl_id,piece_id):
         self.pl_id = pl_id
@@ -338,84 +772,64 @@ class Piece():
 
     def get_actions(self, board):
         # Every move is a tuple containing (current pos, new pos, type of move, piece_id,score) #None means piece is not on board
-        all_actions = []
-        if self.pl_id ==-1:
-            bool = 0 #bool will be used to determine whether we look forward or backward in our list, an expression like this will be used: (1-bool)*(#_1) + (bool*(#_2))
-        else:
-            bool= 1
-        if self.on_board:
-            actions = self.action_diag(board,bool)
-            if actions != []:
-                all_actions+= actions
-            if not ( (self.pl_id == -1 and self.pos in [9, 10, 11]) or (self.pl_id == 1 and self.pos in [0, 1, 2]) ): #Piece is not at the opponents starting row
-                fw_idx = 3*(-self.pl_id)
-                if isinstance(board.state[self.pos+fw_idx], Piece):
-                    if board.state[self.pos+fw_idx].pl_id != self.pl_id:
-                        actions = self.action_attack(board, fw_idx)
-                        if actions != []:
-                            all_actions += actions
-                        actions = self.action_jump(board, fw_idx)
-                        if actions != []:
-                            all_actions += actions
-        else:
-            actions = self.action_insert(board, bool)
-            if actions != []:
-                all_actions+= actions
-
-        return all_actions
-
-    def action_diag(self, board, bool):
-        if (self.pl_id == -1 and self.pos in [9, 10, 11]) or (self.pl_id == 1 and self.pos in [0, 1, 2]):  # end row of opponent
+        pl_idx = (self.pl_id + 1) // 2
+        if not self.on_board:
+            return self.action_insert(board, HOME_CELLS[pl_idx])
+        moves = MOVE_TABLE[pl_idx][self.pos]
+        if moves.scores: # end row of opponent
             return [(self.pos,None,"Diag",self.piece_id,True)] #Score
-        actions =[]
-
-        if self.pos % 3 == 0:  # right column for p1 point of view, left column for p2
-            list_change = ((1 - bool) * 4 + bool * 2) * (-self.pl_id)
-            if board.state[self.pos + list_change] == 0:
-                actions.append(( self.pos, self.pos + list_change, "Diag",self.piece_id,False))
-
-        elif self.pos % 3 == 1:  # middle column
-            list_change0 = ((1 - bool) * 2 + 4 * bool) * (-self.pl_id)
-            if board.state[self.pos + list_change0] == 0:
-                actions.append( (self.pos, self.pos + list_change0, "Diag",self.piece_id,False) )
-
-            list_change1 =((1 - bool) * 4 + 2 * bool)* (-self.pl_id)
-            if board.state[self.pos + list_change1 ] == 0:
-                actions.append( (self.pos, self.pos + list_change1, "Diag",self.piece_id,False) )
-        else:  # left column for p1 point of view, right column for p2
-            list_change = ((1 - bool) * 2 + 4 * bool)* (-self.pl_id)
-            if board.state[self.pos + list_change] == 0:
-                actions.append( (self.pos, self.pos + list_change, "Diag",self.piece_id,False) )
-        return actions
-
-
-
-    def action_jump(self, board, fw_idx):
-        if self.pos + fw_idx in [0,1,2,9,10,11]:
-            return [(self.pos,None,"Jump",self.piece_id,True)] #Score
-
-        fw_idx_2 = self.pos + fw_idx*2
-
-        while (fw_idx_2 < 12 and self.pl_id ==-1) or (fw_idx_2>-1 and self.pl_id==1):
-            if isinstance(board.state[fw_idx_2], Piece) and board.state[fw_idx_2].pl_id != self.pl_id:
-                fw_idx_2 += fw_idx
-                if (fw_idx_2 > 11 and self.pl_id ==-1) or (fw_idx_2<0 and self.pl_id==1):
-                    return [(self.pos, None, "Jump",self.piece_id,False)] #Score
-            elif isinstance(board.state[fw_idx_2], Piece) and board.state[fw_idx_2].pl_id == self.pl_id:
-                    return []
-            elif board.state[fw_idx_2] == 0:
-                return [(self.pos,fw_idx_2,"Jump",self.piece_id,False)]
-
-
-
-
-
-
-    def action_attack(self, board, fw_idx):
-        return [(self.pos,self.pos+fw_idx,'Attack',self.piece_id,False)]
+        all_actions = self.action_diag(board, moves)
+        target = board.state[moves.forward]
+        if target != 0 and target.pl_id != self.pl_id:
+            all_actions.append(self.action_attack(board, moves))
+            jump = self.action_jump(board, moves)
+            if jump is not None:
+                all_actions.append(jump)
+        return all_actions
 
-    def action_insert(self, board, bool):
-        if bool ==0:
-            return [(None,i,"Insert",self.piece_id,False) for i in range(3) if board.state[i] == 0]
-        else:
-            return [(None,i,"Insert",self.piece_id,False) for i in range(9,12) if board.state[i] == 0]
+    def has_action(self, board):
+        """Return True if the piece has at least one action, without building the action list."""
+        pl_idx = (self.pl_id + 1) // 2
+        if not self.on_board:
+            return any(board.state[cell] == 0 for cell in HOME_CELLS[pl_idx])
+        moves = MOVE_TABLE[pl_idx][self.pos]
+        if moves.scores:
+            return True
+        target = board.state[moves.forward]
+        if target != 0 and target.pl_id != self.pl_id: # an attack is always possible
+            return True
+        return any(board.state[cell] == 0 for cell in moves.diag)
+
+    def count_actions(self, board):
+        """Return len(self.get_actions(board)) without building the action list."""
+        pl_idx = (self.pl_id + 1) // 2
+        if not self.on_board:
+            return sum(1 for cell in HOME_CELLS[pl_idx] if board.state[cell] == 0)
+        moves = MOVE_TABLE[pl_idx][self.pos]
+        if moves.scores:
+            return 1
+        count = sum(1 for cell in moves.diag if board.state[cell] == 0)
+        target = board.state[moves.forward]
+        if target != 0 and target.pl_id != self.pl_id:
+            count += 1 if self.action_jump(board, moves) is None else 2
+        return count
+
+    def action_diag(self, board, moves):
+        return [(self.pos, target, "Diag", self.piece_id, False) for target in moves.diag if board.state[target] == 0]
+
+    def action_jump(self, board, moves):
+        if moves.jump_scores:
+            return (self.pos,None,"Jump",self.piece_id,True) #Score
+        for landing in moves.jump_ray:
+            piece = board.state[landing]
+            if piece == 0:
+                return (self.pos,landing,"Jump",self.piece_id,False)
+            if piece.pl_id == self.pl_id:
+                return None
+        return (self.pos, None, "Jump",self.piece_id,False) # Jumped off the board over several pieces
+
+    def action_attack(self, board, moves):
+        return (self.pos,moves.forward,'Attack',self.piece_id,False)
+
+    def action_insert(self, board, home_cells):
+        return [(None,cell,"Insert",self.piece_id,False) for cell in home_cells if board.state[cell] == 0]
@@ -0,0 +1,2 @@
+# The modules of the game import each other as top level modules, like the scripts run from this
+# directory do: pytest puts the directory of this file on sys.path for the tests in tests/
@@ -3,38 +3,170 @@ import sys
 import argparse
 from timeit import default_timer as timer
 
-from classes import Board
+from classes import Board, MAX_SEARCH_DEPTH, SEARCH_BOUND
+from bitboard import BitBoard
+from mcts import MonteCarloTreeSearch
+from opening_book import OpeningBook
+from ordering import MOVE_ORDERINGS
+from parallel import RootParallelSearch
+from ponder import Ponderer
+from profiling import MoveProfiler
+from records import RecordWriter
+from stats import summarize
+from transposition import DEFAULT_TT_SIZE, REPLACEMENT_POLICIES
 
+ENGINES = {
+    'board': Board,
+    'bitboard': BitBoard,
+}
+ADJUDICATIONS = ('draw', 'score')
 
-def initialize_game(pl1, pl2, winning_points):
+
+def search_params(pl):
+    """Return the parameters of a player for the board, without a transposition table unless it searches with hminimax."""
+    params = pl.get('parameters')
+    if pl['type'] != 'hminimax' and params:
+        return dict(params, tt_size=0)
+    return params
+
+
+def initialize_game(pl1, pl2, winning_points, engine='board'):
     pl1_human = pl1['type'] == 'human'
     pl2_human = pl2['type'] == 'human'
-    board = Board(
+    board = ENGINES[engine](
         pl1_human,
         pl2_human,
         winning_points,
-        pl1_params=pl1.get('parameters'),
-        pl2_params=pl2.get('parameters')
+        pl1_params=search_params(pl1),
+        pl2_params=search_params(pl2)
     )
     return board
 
 
-def run_game(pl1, pl2, winning_points, interactive=True):
+def create_searchers(pl1, pl2):
+    """Return a RootParallelSearch for each player configured with more than one worker, else None."""
+    searchers = []
+    for pl in (pl1, pl2):
+        workers = (pl.get('parameters') or {}).get('workers', 1)
+        searchers.append(RootParallelSearch(workers) if pl['type'] == 'hminimax' and workers > 1 else None)
+    return searchers
+
+
+def close_searchers(searchers):
+    for searcher in searchers:
+        if searcher is not None:
+            searcher.close()
+
+
+def search_action(board, invoking_player, depth, time_ms=None, searcher=None, book=None, pondered=None):
+    """Return (value, action) chosen by the alpha-beta search for invoking_player.
+    Positions of the opening book, when one is given, are not searched, and neither are the
+    positions a Ponderer already searched to depth (pondered are its results).
+    With a time budget the search deepens iteratively until time_ms runs out, depth
+    then only caps the iterations. Fixed depth searches run on the searcher's process
+    pool when one is given. The move is recorded in the player's search statistics.
+    """
+    stats = board.stats[invoking_player]
+    tt = board.tt[invoking_player]
+    if stats is not None:
+        stats.start_move(tt)
+    if book is not None:
+        book_move = book.lookup(board)
+        if book_move is not None:
+            if stats is not None:
+                stats.end_move(0, tt, book=True)
+            return book_move
+    if pondered is not None and not time_ms:
+        result = pondered.get(board.hash)
+        if result is not None and result[2] >= depth:
+            if stats is not None:
+                stats.end_move(depth, tt)
+            return result[0], board.resolve_action(result[1])
+    if time_ms:
+        value, action, depth = board.iterative_deepening(invoking_player, time_ms, max_depth=depth or MAX_SEARCH_DEPTH)
+    elif searcher is not None:
+        value, action = searcher.search(board, depth, invoking_player)
+    else:
+        board.start_search(invoking_player)
+        if invoking_player == 0:
+            value, action = board.min_alpha_beta(-SEARCH_BOUND, SEARCH_BOUND, depth, invoking_player=0)
+        else:
+            value, action = board.max_alpha_beta(-SEARCH_BOUND, SEARCH_BOUND, depth, invoking_player=1)
+    if stats is not None:
+        stats.end_move(depth, tt)
+    return value, action
+
+
+def mcts_action(board, invoking_player, player):
+    """Return (value, action) chosen by the Monte Carlo Tree Search player for invoking_player,
+    recording the move in the player's search statistics."""
+    stats = board.stats[invoking_player]
+    if stats is not None:
+        stats.start_move()
+    value, action = player.search(board)
+    if stats is not None:
+        stats.nodes = len(player.visits)
+        stats.leaf_evaluations = player.iterations_done # one rollout per iteration
+        stats.max_ply = player.max_ply
+        stats.end_move(player.max_ply)
+    return value, action
+
+
+def adjudicate(board, adjudication):
+    """Return the winner of a game stopped by repetition: 0 for a draw, or with the 'score' rule
+    the pl_id of the player with more points (a draw if they are level)."""
+    if adjudication == 'draw' or board.pl_scores[0] == board.pl_scores[1]:
+        return 0
+    return board.pl_id[0] if board.pl_scores[0] > board.pl_scores[1] else board.pl_id[1]
+
+
+def profile_tag(pl):
+    """Return the tag of the profiled moves of a player: its name and its search depth or budget."""
+    params = pl.get('parameters') or {}
+    if pl['type'] == 'mcts':
+        return f'{pl["name"]} mcts{params.get("mcts_iterations")}'
+    if params.get('time_ms'):
+        return f'{pl["name"]} {params["time_ms"]}ms'
+    return f'{pl["name"]} depth {params.get("depth", 6)}'
+
+
+def run_game(pl1, pl2, winning_points, interactive=True, engine='board', repetitions=None, adjudication='draw', profiler=None,
+             recorder=None):
+    """Play a game and return its result. With repetitions, the game stops the repetitions-th
+    time a position occurs and is adjudicated (see adjudicate), winner is then 0 for a draw.
+    The moves of the computer players are profiled by profiler (a MoveProfiler) when one is given,
+    and every move is written by recorder (a records.RecordWriter) when one is given."""
+    if adjudication not in ADJUDICATIONS:
+        raise ValueError(f'Unknown adjudication "{adjudication}", valid rules: {list(ADJUDICATIONS)}')
     pl1_depth = pl1.get('parameters', {}).get('depth', 6)
     pl2_depth = pl2.get('parameters', {}).get('depth', 6)
+    pl1_time_ms = pl1.get('parameters', {}).get('time_ms')
+    pl2_time_ms = pl2.get('parameters', {}).get('time_ms')
 
     iteration_count = 0
     max_iterations = winning_points * 30
     value=0
     pl1_time = 0
     pl2_time = 0
-    board = initialize_game(pl1, pl2, winning_points)
+    board = initialize_game(pl1, pl2, winning_points, engine=engine)
+    searchers = create_searchers(pl1, pl2)
+    books = [OpeningBook.from_params(pl.get('parameters')) for pl in (pl1, pl2)]
+    mcts_players = [MonteCarloTreeSearch.from_params(pl.get('parameters')) if pl['type'] == 'mcts' else None
+                    for pl in (pl1, pl2)]
+    ponder = [pl['type'] == 'hminimax' and pl.get('parameters', {}).get('ponder', False) for pl in (pl1, pl2)]
+    pondered = None # results of the search of the computer player's replies during the human's turn
+    repeated = False
+    if recorder is not None:
+        recorder.start_game(pl1, pl2, winning_points, engine)
 
     while True:
         iteration_count += 1
         gridlock_winner, score_winner = board.terminal_test()
         if any((gridlock_winner, score_winner)):
             break
+        repeated = bool(repetitions) and board.history[board.hash] >= repetitions
+        if repeated:
+            break
         if iteration_count > max_iterations:
             print(f'  pl1 actions={board.pl[0].get_actions(board)}')
             print(f'  pl2 actions={board.pl[1].get_actions(board)}')
@@ -42,7 +174,11 @@ def run_game(pl1, pl2, winning_points, interactive=True):
             print("  Value of last move: ", value)
             print(f'  gridlock_winner={gridlock_winner}, score_winner={score_winner}')
             board.display_board()
-            raise RecursionError(f'MAX_ITERATIONS ({max_iterations}) reached')
+            close_searchers(searchers)
+            if recorder is not None:
+                recorder.abort_game()
+            raise RecursionError(f'MAX_ITERATIONS ({max_iterations}) reached, perfect play (e.g. with a tablebase) '
+                                 f'draws some games, --repetitions ends them')
         if interactive:
             board.display_board()
             print("Value of last move: ",value)
@@ -50,58 +186,94 @@ def run_game(pl1, pl2, winning_points, interactive=True):
 
         cur_pl = board.pl[board.pl_turn]
         actions = cur_pl.get_actions(board)
+        elapsed = 0.0
         if len(actions) != 0:
             if not cur_pl.human:
                 if cur_pl.pl_id == -1: 
                     start = timer()
+                    if profiler is not None:
+                        profiler.start()
                     if pl1['type'] == 'random':
                         value, chosen_action = None, random.choice(random.choice(actions))
+                    elif pl1['type'] == 'mcts':
+                        value, chosen_action = mcts_action(board, 0, mcts_players[0])
                     else:
-                        value, chosen_action = board.min_alpha_beta(-1000, 1000, pl1_depth, invoking_player=0)
+                        value, chosen_action = search_action(board, 0, pl1_depth, pl1_time_ms, searchers[0], books[0], pondered)
                     end = timer()
-                    pl1_time += end - start
+                    elapsed = end - start
+                    if profiler is not None:
+                        profiler.stop(profile_tag(pl1), elapsed)
+                    pl1_time += elapsed
                 else:
                     start = timer()
+                    if profiler is not None:
+                        profiler.start()
                     if pl2['type'] == 'random':
                         value, chosen_action = None, random.choice(random.choice(actions))
+                    elif pl2['type'] == 'mcts':
+                        value, chosen_action = mcts_action(board, 1, mcts_players[1])
                     else:
-                        value, chosen_action = board.max_alpha_beta(-1000, 1000, pl2_depth, invoking_player=1)
+                        value, chosen_action = search_action(board, 1, pl2_depth, pl2_time_ms, searchers[1], books[1], pondered)
                     end = timer()
-                    pl2_time += end - start
+                    elapsed = end - start
+                    if profiler is not None:
+                        profiler.stop(profile_tag(pl2), elapsed)
+                    pl2_time += elapsed
+                pondered = None
             else:
                 action_choices = [action for piece_actions in actions for action in piece_actions]
                 [print("[{}] Piece {}: {} from {} to {}".format(
                         idx+1, action[3]+1, action[2], action[0],action[1]
                     )) for idx, action in enumerate(action_choices)]
-                while True:
-                    try:
-                        human_input = input("Choose action number from the list: ")
-                        chosen_action_id = int(human_input)-1
-                        if chosen_action_id >= 0:
-                            chosen_action = action_choices[chosen_action_id]
-                            break
-                    except KeyboardInterrupt:
-                        sys.exit("Keyboard interrupt")
-                    except:
-                        pass
+                # The computer opponent searches its replies while the human thinks
+                opponent = 1 - board.pl_turn
+                ponderer = Ponderer(board, opponent, (pl1_depth, pl2_depth)[opponent]).start() if ponder[opponent] else None
+                try:
+                    while True:
+                        try:
+                            human_input = input("Choose action number from the list: ")
+                            chosen_action_id = int(human_input)-1
+                            if chosen_action_id >= 0:
+                                chosen_action = action_choices[chosen_action_id]
+                                break
+                        except KeyboardInterrupt:
+                            sys.exit("Keyboard interrupt")
+                        except:
+                            pass
+                finally:
+                    if ponderer is not None:
+                        pondered = ponderer.stop()
         else:
             chosen_action = None
             value = "NA"
+        if recorder is not None:
+            pl_type = (pl1, pl2)[board.pl_turn]['type']
+            searched = len(actions) != 0 and not cur_pl.human and pl_type in ('hminimax', 'mcts')
+            stats = board.stats[board.pl_turn]
+            recorder.add_move(chosen_action, value, elapsed, stats.per_move[-1] if searched and stats is not None else None,
+                              searched=searched and pl_type == 'hminimax')
         board.update_state(chosen_action)
 
         if interactive:
             print("\nScore: {}".format(board.pl_scores))
+    close_searchers(searchers)
     if score_winner:
         winner = score_winner
     elif gridlock_winner:
         winner = gridlock_winner
+    elif repeated:
+        winner = adjudicate(board, adjudication)
     else:
         raise RuntimeError('Cannot determine winner after game has finished')
+    if recorder is not None:
+        recorder.end_game(winner, board.pl_scores, repeated)
     return {
         'winner': winner,
         'scores': (board.pl_scores[0], board.pl_scores[1]),
         'runtimes': (pl1_time, pl2_time),
         'total_turns': iteration_count,
+        'repetition': repeated,
+        'stats': tuple(stats.to_dict() if stats is not None else None for stats in board.stats),
     }
 
 
@@ -111,34 +283,124 @@ if __name__ == "__main__":
         'type': 'human',
         'parameters': {
             'depth': None,
+            'time_ms': None, # per move budget, enables iterative deepening
+            'workers': 1, # processes searching the root actions in parallel
+            'move_ordering': 'history', # history | type
+            'late_move_reductions': 0, # actions searched at full depth before late quiet ones are reduced, 0 disables
+            'capture_extensions': 0, # plies attacks and jumps may extend a line by, 0 disables
+            'batch_eval': False, # evaluate the last ply of the search with NumPy
+            'search_stats': False, # collect per move search statistics, returned by run_game
             'row_score': 0.2, # enable=0.20 / disable=0.0
             'action_score': 0.1, # enable=0.1 / disable=0.0
             'action_score_decrease_rate': 2, # recommended=2
             'attack_action_score': 0.0, # recommended=0
+            'tt_size': DEFAULT_TT_SIZE, # transposition table slots of hminimax players, 0 disables the table
+            'tt_replacement': 'depth', # depth | always
+            'tt_symmetry': False, # store a position and its mirror image in the same table entry
+            'repetition_detection': False, # score positions repeated in the game or the searched line as draws
+            'tablebase': None, # endgame tablebase file written by tablebase.py
+            'opening_book': None, # opening book file written by opening_book.py
+            'ponder': False, # search the replies while a human opponent chooses its move
+            'mcts_iterations': 2000, # mcts iterations per move, the maximum when time_ms is set
+            'mcts_exploration': 1.4, # mcts UCT exploration constant
         }
     }
     pl2 = {
         'name': 'player2', # any string
-        'type': 'hminimax', # human | hminimax | random
+        'type': 'hminimax', # human | hminimax | random | mcts
         'parameters': {
-            'depth': 5, # hminimax depth
+            'depth': 5, # hminimax depth, or the maximum depth when time_ms is set
+            'time_ms': None, # per move budget, enables iterative deepening
+            'workers': 1, # processes searching the root actions in parallel
+            'move_ordering': 'history', # history | type
+            'late_move_reductions': 0, # actions searched at full depth before late quiet ones are reduced, 0 disables
+            'capture_extensions': 0, # plies attacks and jumps may extend a line by, 0 disables
+            'batch_eval': False, # evaluate the last ply of the search with NumPy
+            'search_stats': False, # collect per move search statistics, returned by run_game
             'row_score': 0.2, # enable=0.20 / disable=0.0
             'action_score': 0.1, # enable=0.1 / disable=0.0
             'action_score_decrease_rate': 2, # recommended=2
             'attack_action_score': 0.0, # recommended=0
+            'tt_size': DEFAULT_TT_SIZE, # transposition table slots of hminimax players, 0 disables the table
+            'tt_replacement': 'depth', # depth | always
+            'tt_symmetry': False, # store a position and its mirror image in the same table entry
+            'repetition_detection': False, # score positions repeated in the game or the searched line as draws
+            'tablebase': None, # endgame tablebase file written by tablebase.py
+            'opening_book': None, # opening book file written by opening_book.py
+            'ponder': False, # search the replies while a human opponent chooses its move
+            'mcts_iterations': 2000, # mcts iterations per move, the maximum when time_ms is set
+            'mcts_exploration': 1.4, # mcts UCT exploration constant
         }
     }
     parser = argparse.ArgumentParser()
-    parser.add_argument('--player1-type', default='human', choices=['human', 'hminimax', 'random'])
-    parser.add_argument('--player1-depth', default=5, type=int)
-    parser.add_argument('--player2-type', default='hminimax', choices=['human', 'hminimax', 'random'])
-    parser.add_argument('--player2-depth', default=5, type=int)
+    parser.add_argument('--player1-type', default='human', choices=['human', 'hminimax', 'random', 'mcts'])
+    parser.add_argument('--player1-depth', type=int, help='Search depth (default 5), or the maximum depth with --player1-time-ms')
+    parser.add_argument('--player1-time-ms', type=int, help='Time budget per move in milliseconds, enables iterative deepening')
+    parser.add_argument('--player2-type', default='hminimax', choices=['human', 'hminimax', 'random', 'mcts'])
+    parser.add_argument('--player2-depth', type=int, help='Search depth (default 5), or the maximum depth with --player2-time-ms')
+    parser.add_argument('--player2-time-ms', type=int, help='Time budget per move in milliseconds, enables iterative deepening')
     parser.add_argument('-w', '--winning-points', default=10, type=int)
+    parser.add_argument('--repetitions', type=int, help='Stop the game the nth time a position occurs, and let the search avoid repetitions')
+    parser.add_argument('--adjudication', default='draw', choices=ADJUDICATIONS,
+                        help='Result of a game stopped by repetition: a draw, or a win of the player with more points')
+    parser.add_argument('--move-ordering', default='history', choices=MOVE_ORDERINGS, help='Killer and history move ordering, or the ordering by action type')
+    parser.add_argument('--late-move-reductions', default=0, type=int, help='Search late quiet actions a ply shallower after this many actions, 0 disables')
+    parser.add_argument('--capture-extensions', default=0, type=int, help='Plies attacks and jumps may extend a line of the search by, 0 disables')
+    parser.add_argument('--batch-eval', action='store_true', help='Evaluate the last ply of the search in NumPy batches')
+    parser.add_argument('--stats', action='store_true', help='Collect search statistics and print them after the game')
+    parser.add_argument('--workers', default=1, type=int, help='Processes searching the root actions of hminimax players in parallel')
+    parser.add_argument('--engine', default='board', choices=list(ENGINES), help='State representation used by the game and the search')
+    parser.add_argument('--tt-size', default=DEFAULT_TT_SIZE, type=int, help='Transposition table slots of each hminimax player, 0 disables the table')
+    parser.add_argument('--tt-replacement', default='depth', choices=REPLACEMENT_POLICIES)
+    parser.add_argument('--tt-symmetry', action='store_true', help='Share the table entries of positions and their mirror images')
+    parser.add_argument('--opening-book', help='Opening book file written by opening_book.py, played by hminimax players')
+    parser.add_argument('--ponder', action='store_true', help='Let hminimax players search their replies while a human chooses a move')
+    parser.add_argument('--mcts-iterations', default=2000, type=int, help='Iterations per move of mcts players, the maximum with a time budget')
+    parser.add_argument('--mcts-exploration', default=1.4, type=float, help='UCT exploration constant of mcts players')
+    parser.add_argument('--profile', metavar='PREFIX', help='Profile the moves of the computer players and write <PREFIX>.prof '
+                                                            '(cProfile statistics) and <PREFIX>.folded (collapsed stacks for flamegraphs)')
+    parser.add_argument('--profile-threshold-ms', default=0, type=float, help='Only profile the moves that take at least this long')
+    parser.add_argument('--record', metavar='FILE', help='Append the game with the statistics of every move to a record file, see records.py')
+    parser.add_argument('--tablebase', help='Endgame tablebase file written by tablebase.py, probed by hminimax players')
     args = parser.parse_args()
 
     pl1['type'] = args.player1_type
-    pl1['parameters']['depth'] = args.player1_depth
+    pl1['parameters']['depth'] = args.player1_depth if args.player1_depth or args.player1_time_ms else 5
+    pl1['parameters']['time_ms'] = args.player1_time_ms
     pl2['type'] = args.player2_type
-    pl2['parameters']['depth'] = args.player2_depth
-    result = run_game(pl1, pl2, args.winning_points)
-    print(f'Winner: {result["winner"]}, Scores: {result.get("scores")}')
+    pl2['parameters']['depth'] = args.player2_depth if args.player2_depth or args.player2_time_ms else 5
+    pl2['parameters']['time_ms'] = args.player2_time_ms
+    for pl in (pl1, pl2):
+        pl['parameters']['tt_size'] = args.tt_size
+        pl['parameters']['tt_replacement'] = args.tt_replacement
+        pl['parameters']['tt_symmetry'] = args.tt_symmetry
+        pl['parameters']['repetition_detection'] = bool(args.repetitions)
+        pl['parameters']['workers'] = args.workers
+        pl['parameters']['move_ordering'] = args.move_ordering
+        pl['parameters']['late_move_reductions'] = args.late_move_reductions
+        pl['parameters']['capture_extensions'] = args.capture_extensions
+        pl['parameters']['batch_eval'] = args.batch_eval
+        pl['parameters']['search_stats'] = args.stats or bool(args.record) # the records hold the per move statistics
+        pl['parameters']['tablebase'] = args.tablebase
+        pl['parameters']['opening_book'] = args.opening_book
+        pl['parameters']['ponder'] = args.ponder
+        pl['parameters']['mcts_iterations'] = args.mcts_iterations
+        pl['parameters']['mcts_exploration'] = args.mcts_exploration
+    profiler = MoveProfiler(args.profile_threshold_ms) if args.profile else None
+    recorder = RecordWriter.open(args.record) if args.record else None
+    result = run_game(pl1, pl2, args.winning_points, engine=args.engine, repetitions=args.repetitions, adjudication=args.adjudication,
+                      profiler=profiler, recorder=recorder)
+    if recorder is not None:
+        recorder.close()
+        print(f'Game record appended to {args.record}')
+    if result['repetition']:
+        print('Game stopped by repetition')
+    print(f'Winner: {result["winner"] or "draw"}, Scores: {result.get("scores")}')
+    for pl, stats in zip((pl1, pl2), result['stats']):
+        if stats is not None and stats['totals']['moves']:
+            summary = summarize(stats['totals'])
+            print(f'{pl["name"]}: ' + ', '.join(f'{key} {value:.3g}' for key, value in summary.items()))
+    if profiler is not None:
+        profiler.print_summary()
+        for path in profiler.write(args.profile):
+            print(f'Profile saved in {path}')
@@ -0,0 +1,192 @@
+import math
+import random
+from timeit import default_timer as timer
+
+from bitboard import BitBoard
+from classes import UNDO_STACK_SIZE
+from tablebase import POWERS
+
+DEFAULT_ITERATIONS = 2000
+DEFAULT_EXPLORATION = 1.4 # UCT exploration constant, about sqrt(2) for rewards in [0, 1]
+DEFAULT_ROLLOUT_PLIES = 200 # rollouts still running after this many plies are scored on the points
+UNEXPANDED = -1
+PL_IDS = (0, -1, 1) # pl_id of the piece of each digit of a cell code, 0 for an empty cell
+
+
+class MonteCarloTreeSearch():
+    """Monte Carlo Tree Search player with UCT selection.
+
+    Every iteration descends the tree from the root choosing the child with the best upper
+    confidence bound, expands the leaf it reaches with all its actions, plays random actions
+    from one new child until the game ends and credits the result to the nodes on the way.
+    The tree is held in flat lists indexed by node, the children of a node being the contiguous
+    range children_start[node]..children_start[node] + children_count[node], and the game is
+    played out on a BitBoard made and unmade in place. rewards[node] sums the results from the
+    point of view of the player who played the action leading to node: 1 for a win, 0.5 for a
+    rollout cut at DEFAULT_ROLLOUT_PLIES with equal points.
+    """
+    def __init__(self, iterations=DEFAULT_ITERATIONS, time_ms=None, exploration=DEFAULT_EXPLORATION,
+                 rollout_plies=DEFAULT_ROLLOUT_PLIES, seed=None):
+        """
+        :param iterations: Int, iterations per move, the maximum when time_ms is set
+        :param time_ms: Int, time budget per move in milliseconds, or None
+        :param exploration: Float, UCT exploration constant
+        :param rollout_plies: Int, length limit of the random playouts
+        :param seed: Seed of the random playouts, for reproducible games
+        """
+        self.iterations = iterations
+        self.time_ms = time_ms
+        self.exploration = exploration
+        self.rollout_plies = rollout_plies
+        self.rng = random.Random(seed)
+        self.board = None
+
+    @classmethod
+    def from_params(cls, params):
+        params = params or {}
+        return cls(iterations=params.get('mcts_iterations') or DEFAULT_ITERATIONS,
+                   time_ms=params.get('time_ms'),
+                   exploration=params.get('mcts_exploration', DEFAULT_EXPLORATION),
+                   rollout_plies=params.get('mcts_rollout_plies', DEFAULT_ROLLOUT_PLIES),
+                   seed=params.get('mcts_seed'))
+
+    def new_tree(self):
+        self.parents = [-1]
+        self.actions = [None]
+        self.children_start = [0]
+        self.children_count = [UNEXPANDED]
+        self.visits = [0]
+        self.rewards = [0.0]
+        self.winners = [None] # pl_idx winning the game at the node, None while it goes on
+
+    def load(self, board):
+        """Copy the position of board (Board or BitBoard) to the board the iterations are played on."""
+        if self.board is None or self.board.wining_score != board.wining_score:
+            self.board = BitBoard(False, False, board.wining_score, pl1_params={'tt_size': 0}, pl2_params={'tt_size': 0})
+        code = board.cells_code()
+        cells = [PL_IDS[code // power % 3] for power in POWERS]
+        self.board.load_position(cells, board.pl_scores, board.pl_turn)
+
+    def search(self, board):
+        """Return (value, action) for the player to move on board, value being the win rate of the
+        action from the point of view of player 2 (MAX) mapped to [-1, 1] like eval_state's sign.
+        The action is the most visited one, or one that wins the game at once."""
+        self.load(board)
+        self.new_tree()
+        self.max_ply = 0
+        deadline = timer() + self.time_ms / 1000 if self.time_ms else None
+        iterations = 0
+        while iterations < self.iterations:
+            self.iterate()
+            iterations += 1
+            if deadline is not None and iterations & 15 == 0 and timer() >= deadline:
+                break
+        self.iterations_done = iterations
+        start, count = self.children_start[0], self.children_count[0]
+        if count <= 0:
+            return (0, None)
+        children = range(start, start + count)
+        # An action ending the game with a win is played at once, the most visited action else
+        wins = [child for child in children if self.winners[child] == board.pl_turn]
+        best = wins[0] if wins else max(children, key=lambda child: self.visits[child])
+        win_rate = self.rewards[best] / self.visits[best] if self.visits[best] else 0.5
+        value = (2 * win_rate - 1) * (1 if board.pl_turn == 1 else -1)
+        return (value, board.resolve_action(self.actions[best]))
+
+    def iterate(self):
+        board = self.board
+        node, ply = 0, 0
+        # Selection, keeping room on the undo stack of the board for the expansion and the rollout
+        while self.children_count[node] > 0 and self.winners[node] is None and board.undo_top < UNDO_STACK_SIZE - 1:
+            node = self.select_child(node)
+            ply += 1
+            board.update_state(self.actions[node], minimax_depth=ply)
+        # Expansion
+        if self.winners[node] is None and self.children_count[node] == UNEXPANDED:
+            if self.expand(node):
+                node = self.children_start[node]
+                ply += 1
+                board.update_state(self.actions[node], minimax_depth=ply)
+        self.max_ply = max(self.max_ply, ply)
+        # Simulation
+        winner = self.winners[node]
+        if winner is None:
+            winner = self.rollout()
+        # Backpropagation, the player to move at the parent played the action leading to node
+        for _ in range(ply):
+            board.r_update_state()
+            mover = board.pl_turn
+            self.visits[node] += 1
+            self.rewards[node] += 0.5 if winner == 0.5 else winner == mover
+            node = self.parents[node]
+        self.visits[node] += 1
+
+    def select_child(self, node):
+        start = self.children_start[node]
+        visits, rewards = self.visits, self.rewards
+        log_visits = math.log(visits[node])
+        exploration = self.exploration
+        best, best_bound = start, -1.0
+        for child in range(start, start + self.children_count[node]):
+            child_visits = visits[child]
+            if child_visits == 0:
+                return child
+            bound = rewards[child] / child_visits + exploration * math.sqrt(log_visits / child_visits)
+            if bound > best_bound:
+                best, best_bound = child, bound
+        return best
+
+    def expand(self, node):
+        """Add the children of node in random order, a player without actions passes.
+        Return False if the game ended at node, which is then marked with its winner."""
+        board = self.board
+        if board.wining_score in board.pl_scores:
+            self.winners[node] = board.pl_scores.index(board.wining_score)
+            return False
+        actions = list(board.generate_actions(board.pl_turn))
+        if not actions:
+            if not board.has_actions(1 - board.pl_turn):
+                self.winners[node] = board.pl_turn # gridlock, the player to move wins
+                return False
+            actions = [None]
+        self.rng.shuffle(actions)
+        start = len(self.actions)
+        self.children_start[node] = start
+        self.children_count[node] = len(actions)
+        self.parents.extend([node] * len(actions))
+        self.actions.extend(actions)
+        self.children_start.extend([0] * len(actions))
+        self.children_count.extend([UNEXPANDED] * len(actions))
+        self.visits.extend([0] * len(actions))
+        self.rewards.extend([0.0] * len(actions))
+        self.winners.extend([None] * len(actions))
+        return True
+
+    def rollout(self):
+        """Play random actions until the game ends, undo them and return the winner's pl_idx,
+        or 0.5 when the rollout is cut short with equal points."""
+        board, choice = self.board, self.rng.choice
+        winner, plies = None, 0
+        max_plies = min(self.rollout_plies, UNDO_STACK_SIZE - board.undo_top) # the tree's actions share the undo stack
+        while True:
+            if board.wining_score in board.pl_scores:
+                winner = board.pl_scores.index(board.wining_score)
+                break
+            if plies == max_plies:
+                scores = board.pl_scores
+                winner = 0 if scores[0] > scores[1] else 1 if scores[1] > scores[0] else 0.5
+                break
+            turn = board.pl_turn
+            actions = board.generate_actions(turn)
+            if actions:
+                action = choice(actions)
+            elif board.has_actions(1 - turn):
+                action = None
+            else:
+                winner = turn # gridlock
+                break
+            plies += 1
+            board.update_state(action, minimax_depth=plies)
+        for _ in range(plies):
+            board.r_update_state()
+        return winner
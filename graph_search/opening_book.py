@@ -0,0 +1,127 @@
+import json
+import argparse
+from timeit import default_timer as timer
+
+from classes import Board, SEARCH_BOUND
+from bitboard import BitBoard
+from symmetry import canonical_key, to_canonical, from_canonical
+from transposition import DEFAULT_TT_SIZE
+
+BOOK_VERSION = 2 # version 2 keys a position and its mirror image by the same canonical hash
+# Books already read by this process, games of a benchmark share them
+_loaded_books = {}
+
+
+class OpeningBook():
+    """Best actions of the early positions of the game, searched once by build and keyed by Zobrist hash.
+
+    Every entry holds the action as (from, to, type, scores) and the value the search found, which
+    is positive when MAX (player 2) is winning. A position and its mirror image share one entry,
+    keyed by symmetry.canonical_key and holding the action of the canonical orientation. Entries only apply to games played to the winning
+    points the book was built for, since the search of a position depends on them.
+    """
+    def __init__(self, path):
+        """
+        :param path: String, book file written by build
+        """
+        with open(path) as f:
+            book = json.load(f)
+        if book.get('version') not in (1, BOOK_VERSION):
+            raise ValueError(f'{path} is not a version 1 or {BOOK_VERSION} opening book')
+        self.path = path
+        self.symmetric = book['version'] >= 2 # version 1 books are keyed by the plain hash
+        self.depth = book['depth']
+        self.plies = book['plies']
+        self.winning_points = book['winning_points']
+        self.parameters = book['parameters']
+        self.positions = {int(key): entry for key, entry in book['positions'].items()}
+
+    @classmethod
+    def from_params(cls, params):
+        """Return the opening book of a player's parameters, or None if the player has none."""
+        path = (params or {}).get('opening_book')
+        if not path:
+            return None
+        if path not in _loaded_books:
+            _loaded_books[path] = cls(path)
+        return _loaded_books[path]
+
+    def lookup(self, board):
+        """Return (value, action) stored for the current state of the board, or None."""
+        if board.wining_score != self.winning_points:
+            return None
+        key, mirrored = canonical_key(board) if self.symmetric else (board.hash, False)
+        entry = self.positions.get(key)
+        if entry is None:
+            return None
+        origin, target, action_type, scores, value = entry
+        origin, target, _, _, _ = from_canonical((origin, target, action_type, None, scores), mirrored)
+        for action in board.get_actions(board.pl_turn):
+            # The piece_id of the action is the one of the piece on the board, or waiting to be inserted
+            if action[0] == origin and action[1] == target and action[2] == action_type and action[4] == scores:
+                return (value, action)
+        return None # a hash collision with a position of the book
+
+
+def build(path, plies, depth, winning_points, parameters, engine=Board, log=print):
+    """Search every position reachable in fewer than plies plies from the start at the given depth,
+    and write the best actions to path."""
+    board = engine(False, False, winning_points, pl1_params=parameters, pl2_params=parameters)
+    positions = {}
+    start = timer()
+
+    def visit(ply):
+        if any(board.terminal_test()):
+            return
+        actions = list(board.get_actions(board.pl_turn))
+        key, mirrored = canonical_key(board)
+        if actions and key not in positions: # the mirror image of a searched position is not searched again
+            invoking_player = board.pl_turn
+            board.start_search(invoking_player)
+            if invoking_player == 1:
+                value, action = board.max_alpha_beta(-SEARCH_BOUND, SEARCH_BOUND, depth, invoking_player=invoking_player)
+            else:
+                value, action = board.min_alpha_beta(-SEARCH_BOUND, SEARCH_BOUND, depth, invoking_player=invoking_player)
+            action = to_canonical(action, mirrored)
+            positions[key] = (action[0], action[1], action[2], action[4], value)
+            if len(positions) % 100 == 0:
+                log(f'{len(positions)} positions searched ({timer() - start:.1f}s)')
+        if ply + 1 >= plies:
+            return
+        for action in actions or [None]:
+            board.update_state(action, minimax_depth=depth + 1 + ply)
+            visit(ply + 1)
+            board.r_update_state()
+
+    visit(0)
+    with open(path, 'w') as f:
+        json.dump({
+            'version': BOOK_VERSION,
+            'depth': depth,
+            'plies': plies,
+            'winning_points': winning_points,
+            'parameters': parameters,
+            'positions': {str(key): entry for key, entry in positions.items()},
+        }, f)
+    log(f'{len(positions)} positions searched at depth {depth} in {timer() - start:.1f}s, book saved in {path}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build an opening book by searching the first plies of the game')
+    parser.add_argument('-o', '--output', default='opening-book.json', help='Book file to write')
+    parser.add_argument('-p', '--plies', default=8, type=int, help='Number of plies from the start covered by the book')
+    parser.add_argument('-d', '--depth', default=8, type=int, help='Search depth of the book positions')
+    parser.add_argument('-w', '--winning-points', default=15, type=int, help='Winning points of the games the book is used in')
+    parser.add_argument('-r', '--row-score', default=0.2, type=float)
+    parser.add_argument('-a', '--action-score', default=0.1, type=float)
+    parser.add_argument('--action-score-decrease-rate', default=2, type=float)
+    parser.add_argument('--attack-action-score', default=0.0, type=float)
+    parser.add_argument('-e', '--engine', default='board', choices=['board', 'bitboard'])
+    args = parser.parse_args()
+    build(args.output, args.plies, args.depth, args.winning_points, {
+        'row_score': args.row_score,
+        'action_score': args.action_score,
+        'action_score_decrease_rate': args.action_score_decrease_rate,
+        'attack_action_score': args.attack_action_score,
+        'tt_size': DEFAULT_TT_SIZE,
+    }, engine=Board if args.engine == 'board' else BitBoard)
@@ -0,0 +1,92 @@
+MOVE_ORDERINGS = ('history', 'type')
+# Static order of the action types, attacks first and jumps last, the same as the alphabetical order of
+# Board.moveOrdering and of the 'type' mode. In 'history' mode the first action (TT_BONUS) goes before
+# every type, and killers and history scores, which stay below 1 << TYPE_SHIFT, only reorder a type
+TYPE_PRIORITY = {'Attack': 3, 'Diag': 2, 'Insert': 1, 'Jump': 0}
+TYPE_INDEX = {'Attack': 0, 'Diag': 1, 'Insert': 2, 'Jump': 3}
+TT_BONUS = 1 << 40
+TYPE_SHIFT = 32
+KILLER_BONUS = [1 << 31, 1 << 30]
+HISTORY_LIMIT = (1 << 30) - 1
+KILLERS_PER_PLY = 2
+TYPE_BASE = {action_type: priority << TYPE_SHIFT for action_type, priority in TYPE_PRIORITY.items()}
+
+
+def history_index(pl_idx, action):
+    """Index of an action in the history table, 12 stands for off the board (None)."""
+    origin = 12 if action[0] is None else action[0]
+    target = 12 if action[1] is None else action[1]
+    return ((pl_idx * 13 + origin) * 13 + target) * 4 + TYPE_INDEX[action[2]]
+
+
+def same_action(action, other):
+    """Return True if both actions move from and to the same cells, whatever piece moves."""
+    return other is not None and action[0] == other[0] and action[1] == other[1] and action[2] == other[2]
+
+
+class MoveOrderer():
+    """Move ordering of one searching player.
+
+    The best action from the transposition table (or the previous iteration) is searched first,
+    then the actions by type (see TYPE_PRIORITY). Within a type the killer actions of the ply
+    (actions that caused a beta cutoff in a sibling node) come first, then the actions with
+    the best history score: the sum of depth^2 over the beta cutoffs the action caused, indexed
+    by (player, from, to, type). Remaining ties keep the order of Board.moveOrdering.
+    """
+    def __init__(self, mode='history'):
+        """
+        :param mode: String, 'history' for killer and history ordering, 'type' for the
+            alphabetical order of the action type used by Board.moveOrdering
+        """
+        if mode not in MOVE_ORDERINGS:
+            raise ValueError(f'Unknown move ordering "{mode}", valid orderings: {list(MOVE_ORDERINGS)}')
+        self.mode = mode
+        self.killers = []
+        self.history = [0] * (2 * 13 * 13 * 4)
+
+    @classmethod
+    def from_params(cls, params):
+        return cls((params or {}).get('move_ordering', 'history'))
+
+    def new_search(self):
+        """Forget the killers and age the history of the previous search."""
+        self.killers = []
+        self.history = [score >> 1 for score in self.history]
+
+    def order(self, actions, pl_idx, ply, first_action=None):
+        if self.mode == 'type':
+            actions = [action[1] for action in sorted(zip([action[2] for action in actions], actions))]
+            if first_action is not None:
+                for idx, action in enumerate(actions):
+                    if same_action(action, first_action):
+                        actions.insert(0, actions.pop(idx))
+                        break
+            return actions
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+        pl_offset = pl_idx * 13
+
+        def key(action):
+            origin = 12 if action[0] is None else action[0]
+            target = 12 if action[1] is None else action[1]
+            value = TYPE_BASE[action[2]] + min(history[((pl_offset + origin) * 13 + target) * 4 + TYPE_INDEX[action[2]]], HISTORY_LIMIT)
+            if first_action is not None and same_action(action, first_action):
+                value += TT_BONUS
+            for killer_idx, killer in enumerate(killers):
+                if same_action(action, killer):
+                    value += KILLER_BONUS[killer_idx]
+            return (-value, origin, target)
+        return sorted(actions, key=key)
+
+    def cutoff(self, action, pl_idx, ply, depth):
+        """Record that action caused a beta cutoff at ply with depth plies left to search."""
+        if action is None or self.mode == 'type':
+            return
+        self.history[history_index(pl_idx, action)] += depth * depth
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if killers and same_action(action, killers[0]):
+            return
+        killers.insert(0, action)
+        del killers[KILLERS_PER_PLY:]
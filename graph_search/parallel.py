@@ -0,0 +1,207 @@
+import copy
+import random
+import argparse
+import multiprocessing
+from timeit import default_timer as timer
+
+from classes import Board, WIN_VALUE, SEARCH_BOUND
+from bitboard import BitBoard
+from transposition import DEFAULT_TT_SIZE
+
+# Best root value found so far by any worker, set by the pool initializer in every worker process
+_shared_bound = None
+# Transposition tables of the worker process, kept between tasks (one per invoking player)
+_worker_tables = {}
+
+
+def _init_worker(shared_bound):
+    global _shared_bound
+    _shared_bound = shared_bound
+
+
+def _search_root_action(task):
+    """Search one root action in a worker process.
+    Return (value, alpha, beta) where (alpha, beta) is a window the action's value is a result of:
+    the window is narrowed by the best value other workers published when the task started, and
+    again by negamax between the actions of the root child (see Board.root_bound). The bound read
+    once the search is over is at least as narrow as any the search used, and an exact value is
+    also an upper bound, so the window returned is the narrowest one.
+    """
+    board, action, n_depth, invoking_player, alpha, beta = task
+    tables = _worker_tables.setdefault(invoking_player, board.tt)
+    board.tt = tables
+    board.start_search(invoking_player)
+    board.root_bound = _shared_bound
+    alpha, beta = narrow(invoking_player, alpha, beta, _shared_bound.value)
+    value = _search_child(board, action, n_depth, invoking_player, alpha, beta)
+    with _shared_bound.get_lock():
+        alpha, beta = narrow(invoking_player, alpha, beta, _shared_bound.value)
+        if invoking_player == 1 and value > _shared_bound.value:
+            _shared_bound.value = value
+        elif invoking_player == 0 and value < _shared_bound.value:
+            _shared_bound.value = value
+    return (value, alpha, beta)
+
+
+def narrow(invoking_player, alpha, beta, bound):
+    """Return the root window (alpha, beta) of invoking_player narrowed by the best root value found so far."""
+    if invoking_player == 1:
+        return (max(alpha, bound), beta)
+    return (alpha, min(beta, bound))
+
+
+def _search_child(board, action, n_depth, invoking_player, alpha, beta):
+    board.update_state(action, minimax_depth=n_depth)
+    board.ply += 1 # the child is one ply from the root, like in the loop of negamax
+    if invoking_player == 1:
+        value, _ = board.min_alpha_beta(alpha, beta, n_depth - 1, invoking_player=invoking_player)
+    else:
+        value, _ = board.max_alpha_beta(alpha, beta, n_depth - 1, invoking_player=invoking_player)
+    board.ply -= 1
+    board.r_update_state()
+    return value
+
+
+class RootParallelSearch():
+    """Alpha-beta search with the root actions spread across a process pool.
+
+    The first root action is searched in the calling process to get a bound (young brothers
+    wait), then every worker searches the remaining actions on its own copy of the board,
+    using the best value published by the other workers through shared memory to narrow
+    its window, at the start of the task and between the actions of the root child. The results
+    are then replayed in the serial order, and the few actions whose result is ambiguous under
+    the window the serial search would have used are searched again, so the value and action
+    returned are the ones of max_alpha_beta / min_alpha_beta with the same table contents. The
+    workers keep their own tables, so with warm tables they can differ, see compare.
+    """
+    def __init__(self, workers):
+        """
+        :param workers: Int, number of worker processes
+        """
+        if workers < 1:
+            raise ValueError(f'At least one worker is required, got {workers}')
+        self.workers = workers
+        self.shared_bound = multiprocessing.Value('d', 0.0)
+        self.pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(self.shared_bound,))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, board, n_depth, invoking_player, alpha=-SEARCH_BOUND, beta=SEARCH_BOUND, first_action=None):
+        """Return (value, action) for invoking_player, like the serial search from the same window.
+        The root actions are ordered like the serial search orders them, the action of the
+        transposition table, else first_action, first. The root result is stored in the table."""
+        board.start_search(invoking_player)
+        color = 1 if invoking_player == 1 else -1
+        window = (alpha, beta) if color == 1 else (-beta, -alpha) # the root window of negamax
+        cutoff, _, tt_action = board.probe_tt(*window, n_depth, invoking_player)
+        tablebase = board.tablebases[invoking_player]
+        if (n_depth == 0 or cutoff or any(board.terminal_test()) or
+                (tablebase is not None and tablebase.probe(board) is not None)):
+            # Nothing to share out, the serial search answers from the table or the tablebase
+            if invoking_player == 1:
+                return board.max_alpha_beta(alpha, beta, n_depth, invoking_player=invoking_player, first_action=first_action)
+            return board.min_alpha_beta(alpha, beta, n_depth, invoking_player=invoking_player, first_action=first_action)
+        actions = board.order_actions(board.get_actions(board.pl_turn), invoking_player, tt_action or first_action)
+        if not actions:
+            actions = [None]
+
+        # Eldest brother, searched with the full window
+        first = _search_child(board, actions[0], n_depth, invoking_player, alpha, beta)
+        results = [(first, alpha, beta)]
+        if len(actions) > 1 and not self.cutoff(invoking_player, first, alpha, beta):
+            self.shared_bound.value = max(alpha, first) if invoking_player == 1 else min(beta, first)
+            tasks = [(board, action, n_depth, invoking_player, alpha, beta) for action in actions[1:]]
+            results += self.pool.map(_search_root_action, tasks, chunksize=1)
+        value, action = self.replay(board, actions, results, n_depth, invoking_player, alpha, beta)
+        if not board.repetition_detection[invoking_player]: # the workers' repetition draws are not known here
+            board.store_tt(*window, n_depth, invoking_player, color * value, action)
+        return (value, action)
+
+    @staticmethod
+    def cutoff(invoking_player, value, alpha, beta):
+        return value >= beta if invoking_player == 1 else value <= alpha
+
+    def replay(self, board, actions, results, n_depth, invoking_player, alpha, beta):
+        """Pick the action the serial search would pick from the parallel results.
+        Values are negated for player 1 (MIN) so that the replay is written for MAX only.
+        """
+        sign = 1 if invoking_player == 1 else -1
+        serial_alpha, serial_beta = (alpha, beta) if sign == 1 else (-beta, -alpha)
+        best_value, best_action = -WIN_VALUE, None
+        for action, (value, task_alpha, task_beta) in zip(actions, results):
+            value = sign * value
+            task_alpha, task_beta = (task_alpha, task_beta) if sign == 1 else (-task_beta, -task_alpha)
+            if task_alpha != serial_alpha or task_beta != serial_beta:
+                exact = task_alpha < value < task_beta
+                upper_bound = exact or value <= task_alpha
+                if not (best_value == serial_alpha and upper_bound and value <= serial_alpha) and \
+                        not (exact and serial_alpha < value < serial_beta):
+                    # The serial search would have seen a different result, search it with its window
+                    window = (serial_alpha, serial_beta) if sign == 1 else (-serial_beta, -serial_alpha)
+                    value = sign * _search_child(board, action, n_depth, invoking_player, *window)
+            if value > best_value:
+                best_value, best_action = value, action
+            if best_value >= serial_beta:
+                break
+            if best_value > serial_alpha:
+                serial_alpha = best_value
+        return (sign * best_value, best_action)
+
+
+def compare(positions, n_depth, workers, engine, seed, warm=False):
+    """Time the serial and the parallel search on random positions and check that they agree.
+    With warm, the positions follow each other in games played by the serial search, and both
+    searches keep their transposition tables from one move to the next. The workers then probe
+    tables filled by other searches than the serial one, so a few results may differ."""
+    random.seed(seed)
+    params = {'row_score': 0.2, 'action_score': 0.1, 'action_score_decrease_rate': 2, 'attack_action_score': 0.0,
+              'tt_size': DEFAULT_TT_SIZE}
+    serial_time, parallel_time, matches = 0, 0, 0
+    board = None
+    with RootParallelSearch(workers) as searcher:
+        for idx in range(positions):
+            if not warm or board is None or any(board.terminal_test()):
+                board = engine(False, False, 10, pl1_params=params, pl2_params=params)
+                for _ in range(random.randint(2, 12)):
+                    actions = board.get_actions(board.pl_turn)
+                    board.update_state(random.choice(actions) if actions else None)
+                parallel_board = copy.deepcopy(board) # same move ordering state as the serial search, empty tables
+            invoking_player = board.pl_turn
+            start = timer()
+            board.start_search(invoking_player)
+            if invoking_player == 1:
+                serial = board.max_alpha_beta(-SEARCH_BOUND, SEARCH_BOUND, n_depth, invoking_player=invoking_player)
+            else:
+                serial = board.min_alpha_beta(-SEARCH_BOUND, SEARCH_BOUND, n_depth, invoking_player=invoking_player)
+            serial_time += timer() - start
+            start = timer()
+            parallel = searcher.search(parallel_board, n_depth, invoking_player)
+            parallel_time += timer() - start
+            match = serial[0] == parallel[0] and serial[1] == parallel[1]
+            matches += match
+            print(f'Position {idx + 1:>3}: serial {serial[0]:>10.4f} {serial[1]}  parallel {parallel[0]:>10.4f} {parallel[1]}  {"ok" if match else "MISMATCH"}')
+            if warm:
+                board.update_state(serial[1])
+                parallel_board.update_state(serial[1])
+    print(f'{matches}/{positions} positions agree')
+    print(f'Serial {serial_time:.2f}s, parallel ({workers} workers) {parallel_time:.2f}s, speedup {serial_time / parallel_time:.2f}x')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the serial and the root-parallel search')
+    parser.add_argument('-d', '--depth', default=6, type=int)
+    parser.add_argument('-n', '--workers', default=multiprocessing.cpu_count(), type=int)
+    parser.add_argument('-p', '--positions', default=10, type=int)
+    parser.add_argument('-e', '--engine', default='board', choices=['board', 'bitboard'])
+    parser.add_argument('-s', '--seed', default=0, type=int)
+    parser.add_argument('--warm', action='store_true', help='Search consecutive positions of games, keeping the transposition tables between them')
+    args = parser.parse_args()
+    compare(args.positions, args.depth, args.workers, Board if args.engine == 'board' else BitBoard, args.seed, args.warm)
@@ -0,0 +1,152 @@
+import sys
+import argparse
+from timeit import default_timer as timer
+
+from classes import Board
+from bitboard import BitBoard
+
+ENGINES = {
+    'board': Board,
+    'bitboard': BitBoard,
+}
+PIECE_SYMBOLS = {'.': 0, '1': -1, '2': 1}
+# (name, position, {depth: leaf nodes}), both engines and the original Board agree on these counts
+REFERENCE_POSITIONS = [
+    ('start', '.../.../.../... 1 0 0', {1: 3, 2: 9, 3: 30, 4: 100, 5: 404, 6: 1648, 7: 7332}),
+    ('opening', '1../.2./.../..2 1 0 0', {1: 2, 2: 9, 3: 27, 4: 122, 5: 446, 6: 2050, 7: 8036}),
+    ('crossing', '.1./2.1/.2./... 2 1 1', {1: 3, 2: 6, 3: 22, 4: 67, 5: 256, 6: 1107, 7: 4898}),
+    ('jumps', '.2./.1./.1./.2. 2 2 3', {1: 6, 2: 39, 3: 181, 4: 889, 5: 3753, 6: 16584}),
+    ('full', '12./1.1/2.2/.21 1 0 0', {1: 7, 2: 41, 3: 202, 4: 922, 5: 4249, 6: 19001}),
+    ('endgame', '..1/2../.1./..2 1 8 9', {1: 4, 2: 13, 3: 57, 4: 235, 5: 1039, 6: 4846}),
+]
+
+
+def parse_position(position):
+    """Return (cells, pl_scores, pl_turn) of a position written as
+    '<row 0>/<row 1>/<row 2>/<row 3> <player to move> <score 1> <score 2>', where rows list the cells
+    from left to right with '.' for an empty cell and the player number (1 or 2) for a piece.
+    Player 1 inserts on row 0, player 2 on row 3."""
+    try:
+        rows, to_move, score1, score2 = position.split()
+        cells = [PIECE_SYMBOLS[symbol] for symbol in rows.replace('/', '')]
+        if len(cells) != 12 or to_move not in ('1', '2'):
+            raise ValueError
+        return cells, (int(score1), int(score2)), int(to_move) - 1
+    except (KeyError, ValueError):
+        raise ValueError(f'Invalid position "{position}", expected e.g. "1../.2./.../..2 1 0 0"')
+
+
+def distinct_actions(board):
+    """Return the actions of the player to move, one per (from, to, type). Board lists an insert
+    for every piece in reserve, while the moves they lead to are the same."""
+    actions, seen = [], set()
+    for action in board.get_actions(board.pl_turn):
+        if action[:3] not in seen:
+            seen.add(action[:3])
+            actions.append(action)
+    return actions
+
+
+def snapshot(board):
+    """Return everything make/unmake must restore, and the hash computed from scratch."""
+    if board.state is None: # BitBoard
+        pieces = (tuple(board.bits), tuple(board.reserve), board.undo_top)
+    else:
+        pieces = (tuple((piece.pl_id, piece.piece_id) if piece != 0 else None for piece in board.state),
+                  tuple((piece.on_board, piece.pos) for player in board.pl for piece in player.pieces),
+                  tuple(player.piece_count for player in board.pl), board.rows_advanced, board.undo_top)
+    return (pieces, tuple(board.pl_scores), board.pl_turn, board.hash, board.compute_hash(), board.mirror_delta)
+
+
+def perft(board, depth, verify=True):
+    """Return the number of move sequences of length depth from the board, finished games end a
+    sequence early and are not counted, a player without actions passes. With verify, check that
+    the hash and the mirror hash follow every move and that unmaking it restores the board exactly."""
+    if depth == 0:
+        return 1
+    if any(board.terminal_test()):
+        return 0
+    actions = distinct_actions(board) or [None]
+    if depth == 1 and not verify:
+        return len(actions)
+    nodes = 0
+    before = snapshot(board) if verify else None
+    for action in actions:
+        board.update_state(action, minimax_depth=depth)
+        if verify and board.hash != board.compute_hash():
+            raise AssertionError(f'Hash out of date after {action}')
+        if verify and board.hash ^ board.mirror_delta != board.compute_hash(mirrored=True):
+            raise AssertionError(f'Mirror hash out of date after {action}')
+        nodes += perft(board, depth - 1, verify)
+        board.r_update_state()
+        if verify and snapshot(board) != before:
+            raise AssertionError(f'Board not restored after unmaking {action}: {before} != {snapshot(board)}')
+    return nodes
+
+
+def divide(board, depth, verify=True):
+    """Return the perft count below every action of the player to move, to locate a wrong count."""
+    counts = {}
+    for action in distinct_actions(board) or [None]:
+        board.update_state(action, minimax_depth=depth)
+        counts[action if action is None else action[:3]] = perft(board, depth - 1, verify)
+        board.r_update_state()
+    return counts
+
+
+def new_board(engine, position, winning_points=10):
+    board = ENGINES[engine](False, False, winning_points)
+    board.load_position(*parse_position(position))
+    return board
+
+
+def run(engine, positions, max_depth=None, verify=True):
+    """Run perft on (name, position, expected counts) and print the counts and speed.
+    Return the number of counts that differ from the expected ones."""
+    failures = 0
+    print(f'{"position":<10}{"depth":>6}{"nodes":>10}{"expected":>10}{"seconds":>9}{"nodes/s":>10}')
+    for name, position, expected in positions:
+        for depth in sorted(expected):
+            if max_depth is not None and depth > max_depth:
+                continue
+            board = new_board(engine, position)
+            start = timer()
+            nodes = perft(board, depth, verify)
+            elapsed = timer() - start
+            status = ''
+            if expected[depth] is not None and nodes != expected[depth]:
+                status = 'FAIL'
+                failures += 1
+            print(f'{name:<10}{depth:>6}{nodes:>10}{expected[depth] if expected[depth] is not None else "":>10}'
+                  f'{elapsed:>9.3f}{nodes / elapsed if elapsed else float("NaN"):>10.0f} {status}')
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Count the move sequences from reference positions to check and time the move generator')
+    parser.add_argument('-e', '--engine', default='board', choices=list(ENGINES) + ['both'])
+    parser.add_argument('-p', '--position', help='Position to count from instead of the reference positions, e.g. "1../.2./.../..2 1 0 0"')
+    parser.add_argument('-d', '--depth', type=int, help='Depth of --position, or the maximum depth of the reference positions')
+    parser.add_argument('--divide', action='store_true', help='Print the count below every action of --position')
+    parser.add_argument('--no-verify', action='store_true', help='Skip the make/unmake checks to measure the raw speed')
+    args = parser.parse_args()
+
+    engines = list(ENGINES) if args.engine == 'both' else [args.engine]
+    verify = not args.no_verify
+    if args.position:
+        if args.depth is None:
+            parser.error('--position requires --depth')
+        for engine in engines:
+            print(f'Engine {engine}')
+            if args.divide:
+                for action, count in divide(new_board(engine, args.position), args.depth, verify).items():
+                    print(f'{str(action):<24}{count:>10}')
+            else:
+                run(engine, [('custom', args.position, {args.depth: None})], verify=verify)
+        sys.exit(0)
+    failures = 0
+    for engine in engines:
+        print(f'Engine {engine}')
+        failures += run(engine, REFERENCE_POSITIONS, args.depth, verify)
+    if failures:
+        sys.exit(f'{failures} counts differ from the reference')
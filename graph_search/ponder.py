@@ -0,0 +1,66 @@
+import copy
+import threading
+
+from classes import SEARCH_BOUND, MAX_SEARCH_DEPTH
+
+
+class Ponderer():
+    """Search of the replies of a computer player, run in a background thread while its
+    opponent (a human) chooses a move.
+
+    The thread searches the position after every action the opponent may play, one depth at a
+    time for all of them, and the actions the previous depth found best for the opponent first.
+    It plays on a copy of the board sharing the player's transposition table and move ordering
+    tables, so the real search after the opponent's move starts warm. Completed searches are kept
+    in results, keyed by the hash of the position after the opponent's action, and a fixed depth
+    search that was completed to its depth is not searched again.
+    """
+    def __init__(self, board, invoking_player, depth=None):
+        """
+        :param board: Board, or BitBoard, with the opponent of invoking_player to move
+        :param invoking_player: Int, pl_idx of the computer player
+        :param depth: Int, search depth of the player, or the maximum depth when it has a time budget
+        """
+        # Only the state is copied, the tables are shared with the player and the statistics left out
+        memo = {id(obj): obj for obj in board.tt + board.orderers + board.tablebases + board.evaluators if obj is not None}
+        memo[id(board.stats)] = [None, None]
+        self.board = copy.deepcopy(board, memo)
+        self.invoking_player = invoking_player
+        self.depth = depth or MAX_SEARCH_DEPTH
+        self.results = {} # hash after the opponent's action -> (value, action, depth)
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Abort the running search, wait for the thread and return the results."""
+        self.stopped = True
+        self.board.search_aborted = True # checked by negamax through out_of_time
+        self.thread.join()
+        return self.results
+
+    def run(self):
+        board, invoking_player = self.board, self.invoking_player
+        color = 1 if invoking_player == 1 else -1
+        replies = list(board.get_actions(board.pl_turn)) or [None]
+        board.start_search(invoking_player)
+        for depth in range(1, self.depth + 1):
+            values = {}
+            for idx, reply in enumerate(replies):
+                board.update_state(reply, minimax_depth=depth + 1)
+                board.ply = 0
+                previous = self.results.get(board.hash)
+                value, action = board.negamax(-SEARCH_BOUND, SEARCH_BOUND, depth, color, invoking_player=invoking_player,
+                                              first_action=previous[1] if previous else None)
+                if not board.search_aborted:
+                    self.results[board.hash] = (color * value, action, depth)
+                    values[idx] = value
+                board.r_update_state()
+                if self.stopped:
+                    return
+            # The opponent's most dangerous actions first, they are the ones it is the most likely to play
+            order = sorted(range(len(replies)), key=lambda idx: values.get(idx, 0))
+            replies = [replies[idx] for idx in order]
@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+DEFAULT_SAMPLE_INTERVAL_MS = 1
+
+
+class ProfileData():
+    """Picklable profile of some moves, sent from the benchmark's worker processes to the main one.
+    pstats.Stats accepts it like a cProfile.Profile, through create_stats and stats."""
+    def __init__(self, stats, stacks, moves):
+        self.stats = stats
+        self.stacks = stacks
+        self.moves = moves
+
+    def create_stats(self):
+        pass
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler():
+    """Thread recording the stack of another thread every interval_ms milliseconds, as collapsed
+    stacks: the frames from the outermost to the innermost joined by ';'."""
+    def __init__(self, thread_id, interval_ms=DEFAULT_SAMPLE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.running = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        return self.stacks
+
+    def run(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+            time.sleep(self.interval)
+
+
+class MoveProfiler():
+    """Profile of the moves of computer players, aggregated over one or more games.
+
+    Every move is profiled with cProfile and sampled by a StackSampler, and kept if it took at least
+    threshold_ms milliseconds. Kept moves add to the cProfile statistics, and their stacks to the
+    collapsed stacks under a first frame tagging the player (its name, which encodes the benchmark
+    configuration, and its depth), so that flamegraph tools show every configuration apart.
+    """
+    def __init__(self, threshold_ms=0, interval_ms=DEFAULT_SAMPLE_INTERVAL_MS):
+        """
+        :param threshold_ms: Float, moves faster than this are not kept
+        :param interval_ms: Float, time between two samples of the stack
+        """
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.stats = None # pstats.Stats of the kept moves
+        self.stacks = Counter()
+        self.moves = 0 # kept moves
+        self.profile = None
+        self.sampler = None
+
+    def start(self):
+        """Start profiling a move, in the thread that searches it."""
+        self.sampler = StackSampler(threading.get_ident(), self.interval_ms)
+        self.sampler.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self, tag, elapsed):
+        """Stop profiling the move, which took elapsed seconds, and keep it under tag if it was slow enough."""
+        self.profile.disable()
+        stacks = self.sampler.stop()
+        profile, self.profile, self.sampler = self.profile, None, None
+        if elapsed * 1000 < self.threshold_ms:
+            return
+        self.moves += 1
+        if self.stats is None:
+            self.stats = pstats.Stats(profile)
+        else:
+            self.stats.add(profile)
+        tag = tag.replace(';', ',')
+        for stack, count in stacks.items():
+            self.stacks[f'{tag};{stack}'] += count
+
+    def data(self):
+        """Return the profile as a picklable ProfileData, see merge."""
+        return ProfileData(self.stats.stats if self.stats is not None else {}, dict(self.stacks), self.moves)
+
+    def merge(self, data):
+        """Add the ProfileData of another profiler, from another game or process."""
+        if not data.moves:
+            return
+        self.moves += data.moves
+        if self.stats is None:
+            self.stats = pstats.Stats(data)
+        else:
+            self.stats.add(data)
+        self.stacks.update(data.stacks)
+
+    def write(self, prefix):
+        """Write the cProfile statistics to <prefix>.prof and the collapsed stacks to <prefix>.folded,
+        the input of flamegraph.pl, speedscope or inferno. Return the paths written."""
+        if not self.moves:
+            return []
+        stats_path, stacks_path = f'{prefix}.prof', f'{prefix}.folded'
+        self.stats.dump_stats(stats_path)
+        with open(stacks_path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
+        return [stats_path, stacks_path]
+
+    def print_summary(self, limit=15):
+        """Print the functions taking the most time in the kept moves."""
+        if not self.moves:
+            print(f'No move took {self.threshold_ms}ms or more, nothing was profiled')
+            return
+        print(f'\nProfile of {self.moves} moves:')
+        self.stats.sort_stats('tottime').print_stats(limit)
@@ -0,0 +1,239 @@
+import sys
+import json
+import math
+import struct
+import argparse
+from timeit import default_timer as timer
+
+from classes import Board
+from bitboard import BitBoard
+
+RECORD_MAGIC = b'KREC'
+RECORD_VERSION = 1
+FILE_HEADER = struct.Struct('<4sB') # magic, version
+GAME_HEADER = struct.Struct('<BBH') # winning points, flags, length of the JSON metadata that follows
+MOVE = struct.Struct('<H') # action code
+MOVE_STATS = struct.Struct('<HIfIBB') # action code, microseconds, value, nodes, depth, move flags
+GAME_END = struct.Struct('<bBBB') # winner pl_id (0 for a draw), score of player 1, score of player 2, repetition
+# Game flags
+GAME_STATS = 1 # every move is a MOVE_STATS, else a MOVE
+# Move flags
+MOVE_SEARCHED = 1 # chosen by the alpha-beta search, with the player's parameters in the metadata
+MOVE_BOOK = 2 # played from the opening book
+# Action codes above the ones of encode_action
+PASS = 0xFFFF # the player has no action
+END = 0xFFFE # followed by GAME_END
+ABORTED = 0xFFFD # the game was stopped before its end, nothing follows
+ACTION_TYPES = ('Insert', 'Diag', 'Attack', 'Jump')
+OFF_BOARD = 15 # cell code of None, a piece entering or leaving the board
+ENGINES = {
+    'board': Board,
+    'bitboard': BitBoard,
+}
+
+
+def encode_action(action):
+    """Return the 16 bits code of an action: its from and to cells (4 bits each, OFF_BOARD for None),
+    its type (2 bits) and its scores flag. The piece_id is left out, resolve_action finds it again."""
+    if action is None:
+        return PASS
+    origin = OFF_BOARD if action[0] is None else action[0]
+    target = OFF_BOARD if action[1] is None else action[1]
+    return origin << 7 | target << 3 | ACTION_TYPES.index(action[2]) << 1 | bool(action[4])
+
+
+def decode_action(code):
+    """Return the action of a code of encode_action, with piece_id None, or None for PASS."""
+    if code == PASS:
+        return None
+    origin, target = code >> 7 & 15, code >> 3 & 15
+    return (None if origin == OFF_BOARD else origin, None if target == OFF_BOARD else target,
+            ACTION_TYPES[code >> 1 & 3], None, bool(code & 1))
+
+
+class RecordWriter():
+    """Streaming writer of game records, run_game hands it every move as it is played.
+
+    A game is a GAME_HEADER, its metadata as JSON (players, engine), a MOVE or MOVE_STATS per ply
+    and END with the result, or ABORTED. A move costs 2 bytes, or 16 with its statistics: time,
+    search value, nodes and depth. Any binary stream will do: the benchmark's worker processes
+    write their games to memory and send the bytes to the process appending them to the file.
+    """
+    def __init__(self, stream, stats=True):
+        """
+        :param stream: binary stream, the games are appended at its position
+        :param stats: Bool, record the statistics of every move
+        """
+        self.stream = stream
+        self.stats = stats
+
+    @classmethod
+    def open(cls, path, stats=True):
+        """Return a writer appending to the record file path, created with its header if it does not exist."""
+        stream = open(path, 'ab')
+        if stream.tell() == 0:
+            stream.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION))
+        return cls(stream, stats)
+
+    def close(self):
+        self.stream.close()
+
+    def start_game(self, pl1, pl2, winning_points, engine='board'):
+        metadata = json.dumps({'players': (pl1, pl2), 'engine': engine}).encode()
+        self.stream.write(GAME_HEADER.pack(winning_points, GAME_STATS if self.stats else 0, len(metadata)))
+        self.stream.write(metadata)
+
+    def add_move(self, action, value=None, elapsed=0.0, move_stats=None, searched=False):
+        """Record the action of a ply.
+        :param value: Float, the value the player found, None if it has none
+        :param elapsed: Float, seconds the player took
+        :param move_stats: Dict, the move of the player's SearchStats.per_move, or None
+        :param searched: Bool, the action was chosen by the alpha-beta search
+        """
+        code = encode_action(action)
+        if not self.stats:
+            self.stream.write(MOVE.pack(code))
+            return
+        flags = (MOVE_SEARCHED if searched else 0) | (MOVE_BOOK if move_stats and move_stats['book'] else 0)
+        self.stream.write(MOVE_STATS.pack(
+            code, min(int(elapsed * 1e6), 0xFFFFFFFF), value if isinstance(value, (int, float)) else math.nan,
+            min(move_stats['nodes'], 0xFFFFFFFF) if move_stats else 0, min(move_stats['depth'], 255) if move_stats else 0, flags))
+
+    def end_game(self, winner, scores, repetition=False):
+        self.stream.write(MOVE.pack(END) + GAME_END.pack(winner, scores[0], scores[1], repetition))
+        self.stream.flush()
+
+    def abort_game(self):
+        self.stream.write(MOVE.pack(ABORTED))
+        self.stream.flush()
+
+
+def read_games(path):
+    """Yield the finished games of a record file as dicts: winning_points, players, engine, result
+    (winner, scores, repetition) and moves, a list of (action, seconds, value, nodes, depth, flags),
+    only (action,) when the game was recorded without statistics. A last game cut short is ignored."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version = FILE_HEADER.unpack_from(data)
+    if magic != RECORD_MAGIC or version != RECORD_VERSION:
+        raise ValueError(f'{path} is not a version {RECORD_VERSION} game record file')
+    offset = FILE_HEADER.size
+    try:
+        while offset < len(data):
+            winning_points, flags, length = GAME_HEADER.unpack_from(data, offset)
+            offset += GAME_HEADER.size
+            metadata = json.loads(data[offset:offset + length])
+            offset += length
+            move = MOVE_STATS if flags & GAME_STATS else MOVE
+            moves = []
+            while True:
+                code, = MOVE.unpack_from(data, offset)
+                if code == END:
+                    result = GAME_END.unpack_from(data, offset + MOVE.size)
+                    offset += MOVE.size + GAME_END.size
+                    break
+                if code == ABORTED:
+                    result = None
+                    offset += MOVE.size
+                    break
+                fields = move.unpack_from(data, offset)
+                offset += move.size
+                moves.append((decode_action(code),) + ((fields[1] / 1e6,) + fields[2:] if len(fields) > 1 else ()))
+            if result is not None:
+                yield {
+                    'winning_points': winning_points,
+                    'players': metadata['players'],
+                    'engine': metadata['engine'],
+                    'winner': result[0],
+                    'scores': result[1:3],
+                    'repetition': bool(result[3]),
+                    'moves': moves,
+                }
+    except (struct.error, ValueError): # a game cut short by a crash, its metadata may be too
+        print(f'Ignoring the incomplete last game of {path}')
+
+
+def replay(game, engine=None):
+    """Yield (board, move) for every move of a game read by read_games, board being in the position
+    the move was played in, then check the final scores. board is the same object along the game,
+    set up with the players' parameters, and the action of move is the one resolved on it."""
+    pl1, pl2 = game['players']
+    board = ENGINES[engine or game['engine']](False, False, game['winning_points'],
+                                              pl1_params=pl1.get('parameters'), pl2_params=pl2.get('parameters'))
+    for move in game['moves']:
+        action = board.resolve_action(move[0])
+        yield board, (action,) + move[1:]
+        board.update_state(action)
+    if tuple(board.pl_scores) != tuple(game['scores']):
+        raise ValueError(f'Replay ends with scores {board.pl_scores} instead of the recorded {game["scores"]}')
+
+
+def check_move(board, action):
+    """Raise ValueError if action is not legal on board. Passing is, the search returns no action
+    when every action loses beyond its bounds and run_game then passes."""
+    if action is not None and action not in board.get_actions(board.pl_turn):
+        legal = board.get_actions(board.pl_turn)
+        raise ValueError(f'Illegal action {action}, the legal ones are {legal}')
+
+
+def research_move(board, game, action, move):
+    """Search the position of a recorded move again with the parameters of its player, and return
+    (same action, same value). Fixed depth searches replayed in order from the start of the game
+    fill the transposition table like in the recorded game and find the same results, unless the
+    engine changed."""
+    from main import search_action
+    invoking_player = board.pl_turn
+    params = game['players'][invoking_player].get('parameters') or {}
+    value, found = search_action(board, invoking_player, params.get('depth', 6))
+    same_value = math.isclose(value, move[2], rel_tol=1e-5, abs_tol=1e-5) # the record holds a float32
+    if found is None or action is None:
+        return found is action, same_value
+    return found[:3] == action[:3] and found[4] == action[4], same_value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay the games of record files written by main.py or benchmark.py --record')
+    parser.add_argument('files', nargs='+', help='Game record files')
+    parser.add_argument('-e', '--engine', choices=list(ENGINES), help='Engine replaying the games (default the recorded one)')
+    parser.add_argument('--check', action='store_true', help='Check that every recorded action is legal')
+    parser.add_argument('--research', action='store_true',
+                        help='Search the positions of the fixed depth alpha-beta moves again and report the ones whose action or value changed')
+    parser.add_argument('--export', metavar='JSONL', help='Write every position with its recorded move and the game result as JSON lines')
+    args = parser.parse_args()
+
+    export = open(args.export, 'w') if args.export else None
+    games = positions = searched = changed = 0
+    start = timer()
+    for path in args.files:
+        for game in read_games(path):
+            games += 1
+            fixed_depth = [pl['type'] == 'hminimax' and not (pl.get('parameters') or {}).get('time_ms') for pl in game['players']]
+            for ply, (board, move) in enumerate(replay(game, args.engine)):
+                positions += 1
+                action = move[0]
+                if args.check:
+                    check_move(board, action)
+                if args.research and len(move) > 1 and move[5] & MOVE_SEARCHED and not move[5] & MOVE_BOOK and fixed_depth[board.pl_turn]:
+                    searched += 1
+                    same_action, same_value = research_move(board, game, action, move)
+                    if not (same_action and same_value):
+                        changed += 1
+                        print(f'{path} game {games} ply {ply}: recorded {action} {move[2]:.3f}, '
+                              f'{"same action" if same_action else "other action"}, {"same value" if same_value else "other value"}')
+                if export is not None:
+                    export.write(json.dumps({
+                        'cells': int(board.cells_code()),
+                        'scores': list(board.pl_scores),
+                        'turn': board.pl_turn,
+                        'action': action if action is None else [action[0], action[1], action[2], action[4]],
+                        'value': move[2] if len(move) > 1 and not math.isnan(move[2]) else None,
+                        'winner': game['winner'],
+                    }) + '\n')
+    elapsed = timer() - start
+    if export is not None:
+        export.close()
+    print(f'{games} games, {positions} positions replayed in {elapsed:.2f}s ({positions / elapsed if elapsed else 0:.0f} positions/s)')
+    if args.research:
+        print(f'{searched} searches repeated, {changed} changed')
+        if changed:
+            sys.exit(1)
@@ -0,0 +1,263 @@
+import os
+import json
+import sqlite3
+import argparse
+from datetime import datetime
+
+from stats import new_totals
+
+# Columns of the search table, one per search statistics total (see stats.new_totals)
+SEARCH_COLUMNS = tuple(new_totals())
+REAL_SEARCH_COLUMNS = ('time', 'branching_factor_sum')
+QUOTED_SEARCH_COLUMNS = ', '.join(f'"{column}"' for column in SEARCH_COLUMNS) # quoted, 'time' is an SQL keyword
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    type TEXT,
+    config TEXT NOT NULL UNIQUE -- the player dict as sorted JSON
+);
+CREATE INDEX IF NOT EXISTS players_name ON players (name);
+CREATE TABLE IF NOT EXISTS sweeps (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    sweep_id INTEGER NOT NULL REFERENCES sweeps (id),
+    duel TEXT NOT NULL,
+    iteration INTEGER, -- NULL for the duels imported from an aggregated results file
+    pl1_id INTEGER NOT NULL REFERENCES players (id),
+    pl2_id INTEGER NOT NULL REFERENCES players (id),
+    winning_points INTEGER,
+    engine TEXT,
+    repetitions INTEGER,
+    adjudication TEXT,
+    games INTEGER NOT NULL, -- games summed up by the row: 1 for a game, 0 for a failed one
+    wins1 INTEGER NOT NULL,
+    wins2 INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    points1 INTEGER NOT NULL,
+    points2 INTEGER NOT NULL,
+    runtime1 REAL NOT NULL,
+    runtime2 REAL NOT NULL,
+    turns INTEGER NOT NULL,
+    repetition INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS games_players ON games (pl1_id, pl2_id);
+CREATE INDEX IF NOT EXISTS games_pl2 ON games (pl2_id);
+CREATE INDEX IF NOT EXISTS games_sweep ON games (sweep_id, duel, iteration);
+CREATE TABLE IF NOT EXISTS search (
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    side INTEGER NOT NULL, -- 0 for player 1, 1 for player 2
+    {', '.join(f'"{column}" {"REAL" if column in REAL_SEARCH_COLUMNS else "INTEGER"} NOT NULL' for column in SEARCH_COLUMNS)},
+    PRIMARY KEY (game_id, side)
+);
+'''
+
+
+class ResultsDB():
+    """SQLite store of benchmark games, shared by any number of sweeps.
+
+    Every game is one row of the games table, pointing to its sweep and to the configurations of
+    its players, and the search statistics totals of its players are rows of the search table.
+    Results are aggregated by SQL queries over the selected sweeps, so merging or comparing sweeps
+    never loads their games into memory. Players are grouped by name, which encodes the benchmark
+    configuration of a contender.
+    """
+    def __init__(self, path):
+        """
+        :param path: String, database file, created if it does not exist
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def sweep(self, name, create=True):
+        """Return the id of the sweep called name, created if it does not exist and create is set, else None."""
+        row = self.conn.execute('SELECT id FROM sweeps WHERE name = ?', (name,)).fetchone()
+        if row is not None:
+            return row[0]
+        if not create:
+            return None
+        with self.conn:
+            return self.conn.execute('INSERT INTO sweeps (name, created) VALUES (?, ?)',
+                                     (name, datetime.now().isoformat())).lastrowid
+
+    def player(self, player):
+        """Return the id of a player dict (name, type, parameters), added if it is new."""
+        config = json.dumps(player, sort_keys=True)
+        row = self.conn.execute('SELECT id FROM players WHERE config = ?', (config,)).fetchone()
+        if row is not None:
+            return row[0]
+        return self.conn.execute('INSERT INTO players (name, type, config) VALUES (?, ?, ?)',
+                                 (player['name'], player.get('type'), config)).lastrowid
+
+    def recorded(self, sweep_id, winning_points):
+        """Return the (duel, iteration) of the games of the sweep already recorded."""
+        return set(self.conn.execute('SELECT duel, iteration FROM games WHERE sweep_id = ? AND winning_points = ? '
+                                     'AND iteration IS NOT NULL', (sweep_id, winning_points)))
+
+    def game_results(self, sweep_id, winning_points):
+        """Return the games of the sweep already recorded as records holding duel, iteration and
+        winner, or error, enough to resume a benchmark.run_suite."""
+        records = []
+        for duel, iteration, wins1, wins2, error in self.conn.execute(
+                'SELECT duel, iteration, wins1, wins2, error FROM games WHERE sweep_id = ? AND winning_points = ? '
+                'AND iteration IS NOT NULL', (sweep_id, winning_points)):
+            record = {'duel': duel, 'iteration': iteration}
+            if error is not None:
+                record['error'] = error
+            else:
+                record['winner'] = -1 if wins1 else 1 if wins2 else 0
+            records.append(record)
+        return records
+
+    def insert(self, sweep_id, duel, iteration, players, settings, counts, search):
+        columns = ('sweep_id', 'duel', 'iteration', 'pl1_id', 'pl2_id', 'winning_points', 'engine', 'repetitions',
+                   'adjudication', 'games', 'wins1', 'wins2', 'draws', 'points1', 'points2', 'runtime1', 'runtime2',
+                   'turns', 'repetition', 'error')
+        values = ((sweep_id, duel, iteration, self.player(players[0]), self.player(players[1]))
+                  + tuple(settings.get(key) for key in ('winning_points', 'engine', 'repetitions', 'adjudication'))
+                  + tuple(counts.get(key, 0) for key in columns[9:-1]) + (counts.get('error'),))
+        game_id = self.conn.execute(f'INSERT INTO games ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                                    values).lastrowid
+        for side, totals in enumerate(search):
+            if totals:
+                self.conn.execute(f'INSERT INTO search (game_id, side, {QUOTED_SEARCH_COLUMNS}) '
+                                  f'VALUES (?, ?, {", ".join("?" * len(SEARCH_COLUMNS))})',
+                                  (game_id, side) + tuple(totals.get(column, 0) for column in SEARCH_COLUMNS))
+        return game_id
+
+    def add_game(self, sweep_id, record):
+        """Store a game record of benchmark.play_benchmark_game, committed at once."""
+        if 'error' in record:
+            counts = {'error': record['error']}
+        else:
+            counts = {
+                'games': 1,
+                'wins1': int(record['winner'] == -1),
+                'wins2': int(record['winner'] == 1),
+                'draws': int(record['winner'] == 0),
+                'points1': record['scores'][0],
+                'points2': record['scores'][1],
+                'runtime1': record['runtimes'][0],
+                'runtime2': record['runtimes'][1],
+                'turns': record['total_turns'],
+                'repetition': int(bool(record.get('repetition'))),
+            }
+        with self.conn:
+            self.insert(sweep_id, record['duel'], record['iteration'], record['players'], record, counts,
+                        record.get('stats') or [None, None])
+
+    def add_duel(self, sweep_id, duel, stats):
+        """Store the aggregated stats of a duel (see benchmark.new_stats), as found in results-<timestamp>.json."""
+        settings = stats['test_settings']
+        counts = {
+            'games': settings['iterations'],
+            'wins1': stats['victories']['pl1'],
+            'wins2': stats['victories']['pl2'],
+            'draws': stats.get('draws', 0),
+            'points1': stats['points']['pl1'],
+            'points2': stats['points']['pl2'],
+            'runtime1': stats['runtimes']['pl1'],
+            'runtime2': stats['runtimes']['pl2'],
+            'turns': stats['total_turns'],
+        }
+        search = stats.get('search', {})
+        with self.conn:
+            self.insert(sweep_id, duel, None, stats['players'], settings, counts, [search.get('pl1'), search.get('pl2')])
+
+    def sweep_filter(self, sweeps):
+        """Return (SQL condition, parameters) selecting the games of the named sweeps, all of them if sweeps is empty."""
+        if not sweeps:
+            return '1', ()
+        return f'g.sweep_id IN (SELECT id FROM sweeps WHERE name IN ({", ".join("?" * len(sweeps))}))', tuple(sweeps)
+
+    def duel_ratios(self, sweeps=None):
+        """Return {duel key: (point%, win%, ms per turn of player 1)} over the games of the sweeps,
+        like benchmark.duel_ratios, NaN when there is nothing to divide."""
+        condition, parameters = self.sweep_filter(sweeps)
+        rows = self.conn.execute(f'''
+            SELECT p1.name || '|' || p2.name,
+                   100.0 * SUM(g.points1) / NULLIF(SUM(g.points1) + SUM(g.points2), 0),
+                   100.0 * SUM(g.wins1) / NULLIF(SUM(g.wins1) + SUM(g.wins2), 0),
+                   1000.0 * SUM(g.runtime1) / NULLIF(SUM(g.turns), 0) / 2
+            FROM games g JOIN players p1 ON p1.id = g.pl1_id JOIN players p2 ON p2.id = g.pl2_id
+            WHERE {condition}
+            GROUP BY p1.name, p2.name''', parameters)
+        return {key: tuple(float('NaN') if value is None else value for value in ratios) for key, *ratios in rows}
+
+    def contender_totals(self, sweeps=None):
+        """Return {contender name: search statistics totals} over the games of the sweeps."""
+        condition, parameters = self.sweep_filter(sweeps)
+        sums = ', '.join(f'{"MAX" if column == "max_ply" else "SUM"}(s."{column}")' for column in SEARCH_COLUMNS)
+        rows = self.conn.execute(f'''
+            SELECT p.name, {sums}
+            FROM search s JOIN games g ON g.id = s.game_id
+                JOIN players p ON p.id = CASE s.side WHEN 0 THEN g.pl1_id ELSE g.pl2_id END
+            WHERE {condition}
+            GROUP BY p.name''', parameters)
+        return {name: dict(zip(SEARCH_COLUMNS, values)) for name, *values in rows}
+
+    def sweeps(self):
+        """Return (name, created, games, failed games, duels) of every sweep, oldest first."""
+        return self.conn.execute('''
+            SELECT w.name, w.created, COALESCE(SUM(g.games), 0), COUNT(g.error), COUNT(DISTINCT g.duel)
+            FROM sweeps w LEFT JOIN games g ON g.sweep_id = w.id
+            GROUP BY w.id ORDER BY w.created''').fetchall()
+
+    def import_file(self, path):
+        """Store the games of a results file in a sweep named after the file: the game records of a
+        .jsonl file (games already stored are skipped), or the duels of an aggregated .json file.
+        Return the number of rows added."""
+        name = os.path.basename(path)
+        if path.endswith('.jsonl'):
+            from benchmark import load_records
+            sweep_id = self.sweep(name)
+            added = 0
+            recorded = {}
+            for record in load_records(path):
+                done = recorded.setdefault(record['winning_points'], self.recorded(sweep_id, record['winning_points']))
+                if (record['duel'], record['iteration']) not in done:
+                    self.add_game(sweep_id, record)
+                    done.add((record['duel'], record['iteration']))
+                    added += 1
+            return added
+        if self.sweep(name, create=False) is not None:
+            print(f'{path} was already imported, skipping it')
+            return 0
+        with open(path) as f:
+            results = json.load(f)
+        sweep_id = self.sweep(name)
+        for duel, stats in results.items():
+            self.add_duel(sweep_id, duel, stats)
+        return len(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import benchmark results into a SQLite database and display them')
+    parser.add_argument('db', help='Database file, created if it does not exist')
+    parser.add_argument('--import', dest='files', metavar='FILE', nargs='+', default=[],
+                        help='Results files to import: game records (.jsonl) or aggregated results (results-<timestamp>.json)')
+    parser.add_argument('-s', '--sweeps', nargs='+', default=[], help='Only display these sweeps (default all of them, merged)')
+    parser.add_argument('--list', action='store_true', help='List the sweeps of the database')
+    args = parser.parse_args()
+
+    db = ResultsDB(args.db)
+    for path in args.files:
+        print(f'{path}: {db.import_file(path)} rows imported')
+    if args.list:
+        print(f'{"sweep":<40}{"created":<28}{"games":>7}{"failed":>7}{"duels":>7}')
+        for name, created, games, failed, duels in db.sweeps():
+            print(f'{name:<40}{created:<28}{games:>7}{failed:>7}{duels:>7}')
+    elif not args.files:
+        from benchmark import display_results, display_search_stats
+        display_results(db.duel_ratios(args.sweeps))
+        display_search_stats(db.contender_totals(args.sweeps))
+    db.close()
@@ -0,0 +1,149 @@
+import math
+
+DEFAULT_ELO = 100 # strength difference the test tells apart from none
+DEFAULT_ALPHA = 0.05
+DEFAULT_BETA = 0.05
+# Decisions of SPRT.decision
+FIRST = 'first' # the first player is stronger
+SECOND = 'second' # the second player is stronger
+EVEN = 'even' # they differ by less than the tested elo
+
+
+def expected_score(elo):
+    """Return the expected score (1 for a win, 0.5 for a draw) of a player elo points stronger."""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class SPRT():
+    """Sequential probability ratio test of the results of a matchup between two players.
+
+    Two one-sided tests run side by side, each of the hypothesis that the players are even (H0)
+    against the hypothesis that one of them is elo points stronger (H1), on the normal approximation
+    of the score per game (the generalized SPRT). The matchup is decided as soon as one test
+    accepts its H1, or both accept H0: the players then differ by less than elo. alpha is the
+    probability to find a player stronger when they are even, per side, and beta the probability
+    to miss a difference of elo.
+    """
+    def __init__(self, elo=DEFAULT_ELO, alpha=DEFAULT_ALPHA, beta=DEFAULT_BETA):
+        self.elo = elo
+        self.alpha = alpha
+        self.beta = beta
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    def llr(self, wins, draws, losses, elo):
+        """Return the log likelihood ratio of the first player being elo points stronger rather than
+        even, given its wins, draws and losses. The variance counts one more win and one more loss,
+        so that a run of identical results does not make it zero."""
+        games = wins + draws + losses
+        if not games:
+            return 0.0
+        score = wins + draws / 2
+        mean = (score + 1) / (games + 2)
+        variance = ((wins + 1) * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2 + (losses + 1) * mean ** 2) / (games + 2)
+        s0, s1 = 0.5, expected_score(elo)
+        return (s1 - s0) * (2 * score - games * (s0 + s1)) / (2 * variance)
+
+    def distance(self, wins, draws, losses):
+        """Return how far the log likelihood ratios are from deciding the matchup: the least the LLR of
+        one test has to rise to accept its H1, or both have to fall to accept H0."""
+        stronger = self.llr(wins, draws, losses, self.elo)
+        weaker = self.llr(wins, draws, losses, -self.elo)
+        return min(self.upper - stronger, self.upper - weaker, max(stronger, weaker) - self.lower)
+
+    def decision(self, wins, draws, losses):
+        """Return FIRST, SECOND or EVEN once the results of the first player decide the matchup, else None."""
+        stronger = self.llr(wins, draws, losses, self.elo)
+        weaker = self.llr(wins, draws, losses, -self.elo)
+        if stronger >= self.upper:
+            return FIRST
+        if weaker >= self.upper:
+            return SECOND
+        if stronger <= self.lower and weaker <= self.lower:
+            return EVEN
+        return None
+
+
+class DuelScheduler():
+    """Order of the games of a benchmark suite, stopping every matchup once its SPRT decides it.
+
+    A matchup gathers the duels of two contenders, one with each of them playing first, and its
+    games alternate between them. A contender against itself has nothing to decide, those duels
+    are left out. The games the decided matchups leave out of the budget of iterations games per
+    duel go to the undecided ones, the close matchups, up to max_iterations games per duel. Once
+    every matchup played a game of each duel, the next game is one of the undecided matchup
+    nearest to a decision (see SPRT.distance), so that the budget decides as many as it can.
+    """
+    def __init__(self, duels, iterations, sprt, max_iterations=None, records=()):
+        """
+        :param duels: Dict, duel key -> (pl1, pl2), see benchmark.draw_duels
+        :param iterations: Int, average games per duel, the budget of the suite
+        :param sprt: SPRT deciding the matchups
+        :param max_iterations: Int, games per duel of an undecided matchup, default 4 * iterations
+        :param records: game records already played (duel, iteration, winner or error), to resume a suite
+        """
+        self.sprt = sprt
+        self.max_iterations = max_iterations or 4 * iterations
+        self.duels = {}
+        self.matchups = {}
+        for duel_key, (pl1, pl2) in duels.items():
+            if pl1['name'] == pl2['name']:
+                continue
+            key = tuple(sorted((pl1['name'], pl2['name'])))
+            self.duels[duel_key] = {'matchup': key, 'first': pl1['name'] == key[0], 'done': set(), 'next': 0}
+            self.matchups.setdefault(key, {'duels': [], 'results': [0, 0, 0], 'games': 0, 'decision': None})
+            self.matchups[key]['duels'].append(duel_key)
+        self.budget = iterations * len(self.duels)
+        self.scheduled = 0
+        for record in records:
+            if record['duel'] in self.duels and record['iteration'] not in self.duels[record['duel']]['done']:
+                self.duels[record['duel']]['done'].add(record['iteration'])
+                self.matchups[self.duels[record['duel']]['matchup']]['games'] += 1
+                self.scheduled += 1
+                self.add_result(record)
+
+    def next_game(self):
+        """Return (duel key, iteration) of the next game to play, or None when the suite is over."""
+        if self.scheduled >= self.budget:
+            return None
+        open_matchups = [matchup for matchup in self.matchups.values() if matchup['decision'] is None
+                         and matchup['games'] < self.max_iterations * len(matchup['duels'])]
+        if not open_matchups:
+            return None
+        unplayed = [matchup for matchup in open_matchups if matchup['games'] < len(matchup['duels'])]
+        if unplayed:
+            matchup = min(unplayed, key=lambda matchup: matchup['games'])
+        else:
+            matchup = min(open_matchups, key=lambda matchup: (self.sprt.distance(*matchup['results']), matchup['games']))
+        duel_key = min(matchup['duels'], key=lambda duel_key: len(self.duels[duel_key]['done']))
+        duel = self.duels[duel_key]
+        while duel['next'] in duel['done']:
+            duel['next'] += 1
+        iteration = duel['next']
+        duel['done'].add(iteration)
+        matchup['games'] += 1
+        self.scheduled += 1
+        return duel_key, iteration
+
+    def add_result(self, record):
+        """Count the result of a game record, return the decision of its matchup if it decides it, else None."""
+        if 'error' in record or record['duel'] not in self.duels:
+            return None
+        duel = self.duels[record['duel']]
+        matchup = self.matchups[duel['matchup']]
+        winner = record['winner'] if duel['first'] else -record['winner'] # pl_id -1 is the first player of the matchup
+        matchup['results'][winner + 1] += 1 # wins, draws, losses of the first player
+        if matchup['decision'] is None:
+            matchup['decision'] = self.sprt.decision(*matchup['results'])
+            return matchup['decision']
+        return None
+
+    def describe(self, key):
+        """Return a line describing the state of a matchup."""
+        matchup = self.matchups[key]
+        wins, draws, losses = matchup['results']
+        llr = self.sprt.llr(wins, draws, losses, self.sprt.elo), self.sprt.llr(wins, draws, losses, -self.sprt.elo)
+        outcome = {FIRST: f'{key[0]} stronger', SECOND: f'{key[1]} stronger',
+                   EVEN: f'within {self.sprt.elo} Elo', None: 'undecided'}[matchup['decision']]
+        return (f'{key[0]} vs {key[1]}: +{wins} ={draws} -{losses}, llr {llr[0]:.2f}/{llr[1]:.2f} '
+                f'[{self.sprt.lower:.2f}, {self.sprt.upper:.2f}], {outcome}')
@@ -0,0 +1,106 @@
+from timeit import default_timer as timer
+
+# Counters of a move, summed over the moves of a game and over the games of a benchmark
+COUNTERS = ('nodes', 'interior_nodes', 'leaf_evaluations', 'beta_cutoffs', 'first_move_cutoffs',
+            'tt_probes', 'tt_hits', 'tablebase_hits', 'depth', 'time')
+
+
+def new_totals():
+    """Return the totals of no move at all, see SearchStats.totals."""
+    totals = dict.fromkeys(COUNTERS, 0)
+    totals.update({'moves': 0, 'book_moves': 0, 'branching_factor_sum': 0.0, 'max_ply': 0})
+    return totals
+
+
+def add_totals(totals, other):
+    """Add the totals other (of another game) to totals."""
+    for key, value in other.items():
+        if key == 'max_ply':
+            totals[key] = max(totals.get(key, 0), value)
+        else:
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def summarize(totals):
+    """Return the per move averages and rates of totals, NaN when there is nothing to average."""
+    def ratio(numerator, denominator):
+        return numerator / denominator if denominator else float('NaN')
+    searched = totals['moves'] - totals['book_moves']
+    return {
+        'moves': totals['moves'],
+        'nodes_per_move': ratio(totals['nodes'], searched),
+        'leaf_evaluations_per_move': ratio(totals['leaf_evaluations'], searched),
+        'cutoff_rate': ratio(totals['beta_cutoffs'], totals['interior_nodes']),
+        'first_move_cutoff_rate': ratio(totals['first_move_cutoffs'], totals['beta_cutoffs']),
+        'branching_factor': ratio(totals['branching_factor_sum'], searched),
+        'depth': ratio(totals['depth'], searched),
+        'max_ply': totals['max_ply'],
+        'tt_hit_rate': ratio(totals['tt_hits'], totals['tt_probes']),
+        'ms_per_move': ratio(1000 * totals['time'], totals['moves']),
+    }
+
+
+class SearchStats():
+    """Statistics of the searches of one player during a game.
+
+    Board keeps one for each player with the 'search_stats' parameter, else None, so that
+    the search only pays for a test when statistics are disabled. negamax updates the counters
+    of the current move, and end_move appends them to per_move and adds them to totals.
+    """
+    def __init__(self):
+        self.per_move = []
+        self.totals = new_totals()
+        self.start_move()
+
+    @classmethod
+    def from_params(cls, params):
+        """Return statistics if the player's parameters enable search_stats, else None."""
+        if not (params or {}).get('search_stats'):
+            return None
+        return cls()
+
+    def start_move(self, tt=None):
+        """Reset the counters of the current move, tt is the player's transposition table or None."""
+        self.nodes = 0
+        self.interior_nodes = 0
+        self.leaf_evaluations = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tablebase_hits = 0
+        self.max_ply = 0
+        self.depth_times = [] # seconds from the start of the move to the end of every completed iteration
+        self.tt_start = (tt.probes, tt.hits) if tt is not None else (0, 0)
+        self.start = timer()
+
+    def end_move(self, depth, tt=None, book=False):
+        """Record the current move, searched depth plies deep or played from the opening book."""
+        tt_probes, tt_hits = (tt.probes, tt.hits) if tt is not None else (0, 0)
+        move = {
+            'nodes': self.nodes,
+            'interior_nodes': self.interior_nodes,
+            'leaf_evaluations': self.leaf_evaluations,
+            'beta_cutoffs': self.beta_cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'tt_probes': tt_probes - self.tt_start[0],
+            'tt_hits': tt_hits - self.tt_start[1],
+            'tablebase_hits': self.tablebase_hits,
+            'depth': depth,
+            'time': timer() - self.start,
+            'max_ply': self.max_ply,
+            'depth_times': self.depth_times,
+            'book': book,
+            # the uniform branching factor of a tree of that depth with that many nodes
+            'branching_factor': self.nodes ** (1 / depth) if depth and self.nodes else 0.0,
+        }
+        self.per_move.append(move)
+        totals = self.totals
+        for key in COUNTERS:
+            totals[key] += move[key]
+        totals['moves'] += 1
+        totals['book_moves'] += book
+        totals['branching_factor_sum'] += move['branching_factor']
+        totals['max_ply'] = max(totals['max_ply'], self.max_ply)
+
+    def to_dict(self):
+        return {'totals': dict(self.totals), 'per_move': list(self.per_move)}
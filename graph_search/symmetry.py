@@ -0,0 +1,63 @@
+import numpy as np
+
+from transposition import ZOBRIST_CELLS
+
+# The rules do not change when the board is mirrored left to right, so a position and its
+# mirror image (cell 3 * row + column <-> 3 * row + 2 - column) have the same value, and the
+# best actions of one are the mirrored best actions of the other.
+MIRROR_CELL = [3 * (cell // 3) + 2 - cell % 3 for cell in range(12)]
+# Board.hash ^ Board.mirror_delta is the hash of the mirrored position, mirror_delta changes by
+# ZOBRIST_MIRROR_DELTA[pl_idx][cell] whenever a piece of pl_idx enters or leaves cell
+ZOBRIST_MIRROR_DELTA = [[ZOBRIST_CELLS[pl_idx][cell] ^ ZOBRIST_CELLS[pl_idx][MIRROR_CELL[cell]] for cell in range(12)]
+                        for pl_idx in range(2)]
+
+# Ranks of the canonical cell codes, see canonical_ranks
+_ranks = None
+
+
+def mirror_action(action):
+    """Return the mirror image of action, None cells (off the board) stay None.
+    The piece_id is kept, Board.resolve_action finds the one of the mirrored position."""
+    if action is None:
+        return None
+    return (None if action[0] is None else MIRROR_CELL[action[0]],
+            None if action[1] is None else MIRROR_CELL[action[1]],
+            action[2], action[3], action[4])
+
+
+def canonical_key(board):
+    """Return (key, mirrored): the smaller of the hashes of the position and of its mirror image,
+    shared by both, and True if it is the one of the mirror image."""
+    mirror_hash = board.hash ^ board.mirror_delta
+    if mirror_hash < board.hash:
+        return (mirror_hash, True)
+    return (board.hash, False)
+
+
+def to_canonical(action, mirrored):
+    """Return action in the orientation of the canonical position, see canonical_key."""
+    return mirror_action(action) if mirrored else action
+
+
+from_canonical = to_canonical # mirroring is its own inverse
+
+
+def mirror_codes(codes):
+    """Return the cell codes (see Board.cells_code) of the mirror images of an array of codes."""
+    mirrored = np.zeros_like(codes)
+    for cell, power in enumerate(3 ** np.arange(12, dtype=np.int64)):
+        mirrored += (codes // power % 3) * 3 ** MIRROR_CELL[cell]
+    return mirrored
+
+
+def canonical_ranks(positions):
+    """Return (canonical, ranks) for the cell codes 0..positions - 1: canonical lists the codes that
+    are not larger than their mirror image, and ranks[code] is the index in canonical of the code
+    or its mirror image. Tables indexed by rank store one entry per mirror pair."""
+    global _ranks
+    if _ranks is None:
+        codes = np.arange(positions, dtype=np.int64)
+        smallest = np.minimum(codes, mirror_codes(codes))
+        canonical = np.flatnonzero(smallest == codes)
+        _ranks = (canonical, np.searchsorted(canonical, smallest).astype(np.int32))
+    return _ranks
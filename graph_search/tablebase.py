@@ -0,0 +1,265 @@
+import sys
+import random
+import argparse
+from timeit import default_timer as timer
+
+import numpy as np
+
+from symmetry import canonical_ranks
+
+CELL_COUNT = 12
+PIECE_COUNT = 4
+# Positions are coded in base 3, digit c is 0 if cell c is empty and 1 + pl_idx of the piece on it otherwise
+POSITIONS = 3 ** CELL_COUNT
+NODES = 2 * POSITIONS # (player to move, position), player 1 (pl_idx 0) to move first
+POWERS = [3 ** cell for cell in range(CELL_COUNT)]
+MAGIC = b'KULIBRAT-TB'
+VERSION = 2 # version 2 stores one of each mirror pair of positions, version 1 every position
+HEADER = np.dtype([('magic', 'S12'), ('version', '<u4'), ('max_need', '<u4')])
+MAX_STORED = 127 # distances are stored in an int8, longer ones saturate
+
+
+class Tablebase():
+    """Memory-mapped endgame tablebase written by this module.
+
+    The file holds one int8 per (points player 1 still needs, points player 2 still needs,
+    player to move, position) for both needs between 1 and max_need. The value is 0 if the
+    game is a draw with perfect play, d > 0 if the player to move wins and -d if it loses,
+    where d - 1 is the number of plies until the game ends. A position and its mirror image
+    have the same value, so only the canonical positions of symmetry.canonical_ranks are stored.
+    """
+    def __init__(self, path):
+        """
+        :param path: String, tablebase file written by generate
+        """
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) == 0 or header[0]['magic'] != MAGIC or header[0]['version'] not in (1, VERSION):
+            raise ValueError(f'{path} is not a version 1 or {VERSION} Kulibrat tablebase')
+        self.path = path
+        self.max_need = int(header[0]['max_need'])
+        if header[0]['version'] == 1:
+            self.positions, self.ranks = POSITIONS, None
+        else:
+            canonical, self.ranks = canonical_ranks(POSITIONS)
+            self.positions = len(canonical)
+        self.values = np.memmap(path, dtype=np.int8, mode='r', offset=HEADER.itemsize,
+                                shape=(self.max_need, self.max_need, 2 * self.positions))
+
+    @classmethod
+    def from_params(cls, params):
+        """Return the tablebase of a player's parameters, or None if the player has none."""
+        path = (params or {}).get('tablebase')
+        if not path:
+            return None
+        return cls(path)
+
+    def __getstate__(self):
+        # Copies sent to other processes map the file again instead of pickling its content
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def probe(self, board):
+        """Return the stored value of the board, or None if its scores are outside the table."""
+        need = (board.wining_score - board.pl_scores[0], board.wining_score - board.pl_scores[1])
+        if not (0 < need[0] <= self.max_need and 0 < need[1] <= self.max_need):
+            return None
+        code = board.cells_code()
+        index = code if self.ranks is None else self.ranks[code]
+        return int(self.values[need[0] - 1, need[1] - 1, board.pl_turn * self.positions + index])
+
+    def best_action(self, board, n_depth):
+        """Return the action of the player to move that wins the fastest, or loses the slowest,
+        from a position in the table."""
+        best_action, best_rank = None, None
+        for action in board.get_actions(board.pl_turn) or [None]:
+            board.update_state(action, minimax_depth=n_depth)
+            gridlock_win, score_win = board.terminal_test()
+            if gridlock_win:
+                value = 1 # the opponent wins now
+            elif score_win:
+                value = -1 # the opponent lost
+            else:
+                value = self.probe(board)
+            board.r_update_state()
+            # Rank from the point of view of the player to move, the opponent's loss is our win
+            if value < 0:
+                rank = 2 * MAX_STORED + value
+            elif value > 0:
+                rank = -MAX_STORED + value
+            else:
+                rank = 0
+            if best_rank is None or rank > best_rank:
+                best_action, best_rank = action, rank
+        return best_action
+
+
+def move_graph():
+    """Return the moves between all nodes as arrays (source, destination, scores), and the
+    masks of the positions with at most PIECE_COUNT pieces per player and of the gridlocks.
+    Players without an action pass, like Board does when the search plays a None action."""
+    # Imported here, classes imports this module for Tablebase
+    from classes import MOVE_TABLE, HOME_CELLS
+
+    codes = np.arange(POSITIONS, dtype=np.int64)
+    digits = np.stack([codes // power % 3 for power in POWERS], axis=1).astype(np.int8)
+    piece_counts = [(digits == 1).sum(axis=1), (digits == 2).sum(axis=1)]
+    valid = (piece_counts[0] <= PIECE_COUNT) & (piece_counts[1] <= PIECE_COUNT)
+    sources, destinations, scores = [], [], []
+    has_moves = []
+    for pl_idx in (0, 1):
+        own, opponent = pl_idx + 1, 2 - pl_idx
+        moved = np.zeros(POSITIONS, dtype=bool)
+
+        def add(mask, new_codes, score):
+            idx = np.flatnonzero(mask & valid)
+            sources.append(pl_idx * POSITIONS + idx)
+            destinations.append((1 - pl_idx) * POSITIONS + new_codes[idx])
+            scores.append(np.full(len(idx), score))
+            moved[idx] = True
+
+        for cell in HOME_CELLS[pl_idx]:
+            add((digits[:, cell] == 0) & (piece_counts[pl_idx] < PIECE_COUNT), codes + own * POWERS[cell], False)
+        for cell in range(CELL_COUNT):
+            on_cell = digits[:, cell] == own
+            left = codes - own * POWERS[cell]
+            moves = MOVE_TABLE[pl_idx][cell]
+            if moves.scores:
+                add(on_cell, left, True)
+                continue
+            for target in moves.diag:
+                add(on_cell & (digits[:, target] == 0), left + own * POWERS[target], False)
+            forward = moves.forward
+            attacked = on_cell & (digits[:, forward] == opponent)
+            add(attacked, left + (own - opponent) * POWERS[forward], False)
+            if moves.jump_scores:
+                add(attacked, left, True)
+                continue
+            jumping = attacked
+            for landing in moves.jump_ray:
+                add(jumping & (digits[:, landing] == 0), left + own * POWERS[landing], False)
+                jumping = jumping & (digits[:, landing] == opponent)
+            add(jumping, left, False) # jumped off the board over several pieces
+        has_moves.append(moved)
+    for pl_idx in (0, 1):
+        passes = np.flatnonzero(valid & ~has_moves[pl_idx] & has_moves[1 - pl_idx])
+        sources.append(pl_idx * POSITIONS + passes)
+        destinations.append((1 - pl_idx) * POSITIONS + passes)
+        scores.append(np.zeros(len(passes), dtype=bool))
+    gridlock = valid & ~has_moves[0] & ~has_moves[1]
+    return (np.concatenate(sources), np.concatenate(destinations), np.concatenate(scores), valid, gridlock)
+
+
+def solve_layer(need, src, dst, scores, valid, gridlock, results, plies):
+    """Solve the positions where the players still need need[0] and need[1] points by retrograde
+    analysis, given the solved layers where one of them needs a point less.
+    results[layer] is 1 (win of the player to move), -1 (loss) or 0 (draw), plies[layer] the
+    number of plies until the game ends. Return the number of rounds it took."""
+    layer_results, layer_plies = results[need[0] - 1, need[1] - 1], plies[need[0] - 1, need[1] - 1]
+    valid_nodes = np.concatenate([valid, valid])
+    terminal = np.concatenate([gridlock, gridlock])
+    layer_results[terminal] = 1 # the player to move wins a gridlock
+    layer_plies[terminal] = 0
+    out_degree = np.bincount(src, minlength=NODES)
+
+    # Scoring moves lead to a solved layer, or end the game if the mover reaches its goal
+    scoring = np.flatnonzero(scores)
+    mover = src[scoring] // POSITIONS
+    child_need = [need[0] - (mover == 0), need[1] - (mover == 1)]
+    finished = (child_need[0] == 0) | (child_need[1] == 0)
+    layer_index = (np.maximum(child_need[0], 1) - 1, np.maximum(child_need[1], 1) - 1)
+    fixed_results = np.where(finished, -1, results[layer_index + (dst[scoring],)])
+    fixed_plies = np.where(finished, 0, plies[layer_index + (dst[scoring],)])
+    fixed_src = src[scoring]
+    inner_src, inner_dst = src[~scores], dst[~scores]
+    last_fixed = int(fixed_plies.max()) if len(fixed_plies) else 0
+
+    # A node wins in r plies if a child loses in r - 1, and loses in r plies once every child wins in at most r - 1
+    rounds = 1
+    while True:
+        unresolved = valid_nodes & (layer_results == 0)
+        child_results = np.concatenate([layer_results[inner_dst], fixed_results])
+        child_plies = np.concatenate([layer_plies[inner_dst], fixed_plies])
+        all_src = np.concatenate([inner_src, fixed_src])
+        wins = np.zeros(NODES, dtype=bool)
+        wins[all_src[(child_results == -1) & (child_plies == rounds - 1)]] = True
+        wins &= unresolved
+        won_children = np.bincount(all_src[(child_results == 1) & (child_plies <= rounds - 1)], minlength=NODES)
+        losses = unresolved & ~wins & (out_degree > 0) & (won_children == out_degree)
+        layer_results[wins], layer_plies[wins] = 1, rounds
+        layer_results[losses], layer_plies[losses] = -1, rounds
+        if not wins.any() and not losses.any() and rounds > last_fixed + 1:
+            return rounds
+        rounds += 1
+
+
+def generate(path, max_need, log=print):
+    """Solve every position where both players need at most max_need points and write the table to path."""
+    start = timer()
+    src, dst, scores, valid, gridlock = move_graph()
+    log(f'{int(valid.sum()) * 2} positions, {len(src)} moves ({timer() - start:.1f}s)')
+    results = np.zeros((max_need, max_need, NODES), dtype=np.int8)
+    plies = np.zeros((max_need, max_need, NODES), dtype=np.int16)
+    for need0 in range(1, max_need + 1):
+        for need1 in range(1, max_need + 1):
+            rounds = solve_layer((need0, need1), src, dst, scores, valid, gridlock, results, plies)
+            layer = results[need0 - 1, need1 - 1]
+            log(f'Needs {need0}/{need1}: {int((layer == 1).sum())} wins, {int((layer == -1).sum())} losses, '
+                f'{rounds} rounds ({timer() - start:.1f}s)')
+    saturated = int((plies >= MAX_STORED).sum())
+    if saturated:
+        log(f'{saturated} distances exceed {MAX_STORED - 1} plies and are stored saturated')
+    values = results * np.minimum(plies + 1, MAX_STORED).astype(np.int8)
+    canonical, _ = canonical_ranks(POSITIONS)
+    values = values.reshape(max_need, max_need, 2, POSITIONS)[:, :, :, canonical].reshape(max_need, max_need, -1)
+    header = np.array([(MAGIC, VERSION, max_need)], dtype=HEADER)
+    with open(path, 'wb') as f:
+        header.tofile(f)
+        values.tofile(f)
+    log(f'Tablebase saved in {path}')
+
+
+def check(path, positions, seed):
+    """Compare the tablebase with a plain alpha-beta search on random positions it decides."""
+    from bitboard import BitBoard
+    from classes import WIN_VALUE, SEARCH_BOUND
+
+    tablebase = Tablebase(path)
+    rng = random.Random(seed)
+    params = {'tt_size': 0}
+    checked = 0
+    while checked < positions:
+        board = BitBoard(False, False, tablebase.max_need, pl1_params=params, pl2_params=params)
+        for _ in range(rng.randint(0, 40)):
+            actions = board.get_actions(board.pl_turn)
+            board.update_state(rng.choice(actions) if actions else None)
+            if any(board.terminal_test()):
+                break
+        value = tablebase.probe(board)
+        if any(board.terminal_test()) or not value or abs(value) - 1 > 9:
+            continue
+        board.start_search(board.pl_turn)
+        color = 1 if board.pl_turn == 1 else -1
+        searched, _ = board.negamax(-SEARCH_BOUND, SEARCH_BOUND, abs(value) - 1, color, invoking_player=board.pl_turn)
+        expected = (WIN_VALUE - (abs(value) - 1)) * (1 if value > 0 else -1) # the search counts the plies too
+        print(f'Position {board.cells_code():>6} needs {[board.wining_score - score for score in board.pl_scores]} '
+              f'{"win" if value > 0 else "loss"} in {abs(value) - 1:>2} plies: {"ok" if searched == expected else "MISMATCH"}')
+        checked += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate the endgame tablebase by retrograde analysis')
+    parser.add_argument('-o', '--output', default='kulibrat.tb', help='Tablebase file to write')
+    parser.add_argument('-k', '--max-need', default=2, type=int,
+                        help='Solve the positions where both players need at most this many points (each adds 0.5MB per need of the other)')
+    parser.add_argument('--check', metavar='POSITIONS', type=int,
+                        help='Check the tablebase of --output against the search on random positions instead of generating it')
+    parser.add_argument('-s', '--seed', default=0, type=int)
+    args = parser.parse_args()
+    if args.check:
+        check(args.output, args.check, args.seed)
+        sys.exit(0)
+    if args.max_need < 1:
+        parser.error('--max-need must be at least 1')
+    generate(args.output, args.max_need)
@@ -0,0 +1,26 @@
+import random
+
+from perft import ENGINES
+
+EVAL_PARAMS = {'row_score': 0.2, 'action_score': 0.1, 'action_score_decrease_rate': 2, 'attack_action_score': 0.0}
+
+
+def random_position(engine, seed, params, winning_points=5, max_plies=20):
+    """Return a board of engine ('board' or 'bitboard') after up to max_plies random actions chosen by seed."""
+    rng = random.Random(seed)
+    board = ENGINES[engine](False, False, winning_points, pl1_params=params, pl2_params=params)
+    for _ in range(rng.randint(0, max_plies)):
+        if any(board.terminal_test()):
+            break
+        actions = sorted(board.get_actions(board.pl_turn), key=str)
+        board.update_state(rng.choice(actions) if actions else None)
+    return board
+
+
+def search(board, depth, alpha=-1000, beta=1000):
+    """Return (value, action) of the fixed depth search of the player to move."""
+    invoking_player = board.pl_turn
+    board.start_search(invoking_player)
+    if invoking_player == 1:
+        return board.max_alpha_beta(alpha, beta, depth, invoking_player=invoking_player)
+    return board.min_alpha_beta(alpha, beta, depth, invoking_player=invoking_player)
@@ -0,0 +1,50 @@
+import pytest
+
+from perft import ENGINES
+from classes import WIN_VALUE, SEARCH_BOUND
+from batch_eval import BatchEvaluator
+from helpers import EVAL_PARAMS, random_position, search
+
+PARAMS = dict(EVAL_PARAMS, attack_action_score=0.1)
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(20))
+def test_evaluate_matches_eval_state(engine, seed):
+    board = random_position(engine, seed, PARAMS, max_plies=30)
+    evaluator = BatchEvaluator(PARAMS)
+    value = evaluator.evaluate(board.cells_code(), board.pl_turn, board.pl_scores[0], board.pl_scores[1])
+    assert value == pytest.approx(board.eval_state(invoking_player=0))
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(20))
+def test_child_values_match_the_search_of_the_children(engine, seed):
+    board = random_position(engine, seed, PARAMS, winning_points=2, max_plies=30)
+    if any(board.terminal_test()):
+        return
+    color = 1 if board.pl_turn == 1 else -1
+    actions = board.get_actions(board.pl_turn) or [None]
+    batched = BatchEvaluator(PARAMS).child_values(board, actions, color, WIN_VALUE - 1)
+    board.start_search(board.pl_turn)
+    searched = []
+    for action in actions:
+        board.update_state(action, minimax_depth=1)
+        board.ply = 1
+        searched.append(-board.negamax(-SEARCH_BOUND, SEARCH_BOUND, 0, -color, invoking_player=board.pl_turn ^ 1)[0])
+        board.ply = 0
+        board.r_update_state()
+    assert batched == pytest.approx(searched)
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(10))
+def test_batched_search_keeps_the_result(engine, seed):
+    plain = search(random_position(engine, seed, PARAMS, winning_points=3), 4)
+    batched = search(random_position(engine, seed, dict(PARAMS, batch_eval=True), winning_points=3), 4)
+    assert batched[0] == pytest.approx(plain[0])
+
+
+def test_only_players_asking_for_it_get_an_evaluator():
+    assert BatchEvaluator.from_params(PARAMS) is None
+    assert BatchEvaluator.from_params(dict(PARAMS, batch_eval=True)) is not None
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from classes import Board
+from bitboard import BitBoard
+
+EVAL_PARAMS = {'row_score': 0.2, 'action_score': 0.1, 'action_score_decrease_rate': 2, 'attack_action_score': 0.1}
+
+
+def moves(board):
+    """Return the distinct actions of the player to move as (from, to, type, scores), in a fixed order."""
+    return sorted({action[:3] + (action[4],) for action in board.get_actions(board.pl_turn)}, key=str)
+
+
+def play_random_move(rng, engines):
+    """Play the same random move on every engine, a pass when there is none."""
+    choices = moves(engines[0])
+    move = rng.choice(choices) if choices else None
+    for engine in engines:
+        engine.update_state(engine.resolve_action(move[:3] + (None, move[3])) if move else None)
+
+
+def new_engines():
+    return (Board(False, False, 5, pl1_params=EVAL_PARAMS, pl2_params=EVAL_PARAMS),
+            BitBoard(False, False, 5, pl1_params=EVAL_PARAMS, pl2_params=EVAL_PARAMS))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_same_positions_along_a_game(seed):
+    rng = random.Random(seed)
+    board, bitboard = new_engines()
+    for _ in range(60):
+        assert moves(board) == moves(bitboard)
+        assert board.hash == bitboard.hash
+        assert board.cells_code() == bitboard.cells_code()
+        assert board.terminal_test() == bitboard.terminal_test()
+        assert board.eval_state(invoking_player=board.pl_turn) == pytest.approx(bitboard.eval_state(invoking_player=bitboard.pl_turn))
+        if any(board.terminal_test()):
+            break
+        play_random_move(rng, (board, bitboard))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_same_search_results(seed):
+    rng = random.Random(seed)
+    board, bitboard = new_engines()
+    for _ in range(rng.randint(0, 20)):
+        if any(board.terminal_test()):
+            break
+        play_random_move(rng, (board, bitboard))
+    results = []
+    for engine in (board, bitboard):
+        invoking_player = engine.pl_turn
+        engine.start_search(invoking_player)
+        search = engine.max_alpha_beta if invoking_player == 1 else engine.min_alpha_beta
+        value, action = search(-1000, 1000, 4, invoking_player=invoking_player)
+        results.append((value, action if action is None else action[:3]))
+    assert results[0][0] == pytest.approx(results[1][0])
+    assert results[0][1] == results[1][1]
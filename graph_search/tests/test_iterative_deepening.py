@@ -0,0 +1,51 @@
+from timeit import default_timer as timer
+
+import pytest
+
+from perft import ENGINES
+from classes import DECIDED_VALUE
+from helpers import EVAL_PARAMS, random_position, search
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(10))
+def test_deepest_iteration_matches_the_fixed_depth_search(engine, seed):
+    fixed = search(random_position(engine, seed, EVAL_PARAMS), 5)
+    for aspiration_window in (0, 0.25):
+        board = random_position(engine, seed, dict(EVAL_PARAMS, aspiration_window=aspiration_window))
+        value, _, depth = board.iterative_deepening(board.pl_turn, 60000, max_depth=5)
+        assert depth == 5
+        assert value == pytest.approx(fixed[0])
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_search_stops_when_the_budget_runs_out(engine):
+    board = random_position(engine, 0, EVAL_PARAMS, winning_points=10, max_plies=0)
+    start = timer()
+    value, action, depth = board.iterative_deepening(board.pl_turn, 50)
+    assert timer() - start < 1 # the iteration running at the deadline is abandoned
+    assert action is not None and 1 <= depth < 64
+    assert not board.search_aborted and board.deadline is None
+    assert board.history == random_position(engine, 0, EVAL_PARAMS, winning_points=10, max_plies=0).history
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_first_iteration_always_completes(engine):
+    board = random_position(engine, 1, EVAL_PARAMS)
+    value, action, depth = board.iterative_deepening(board.pl_turn, 0)
+    assert depth == 1 and action is not None
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_decided_games_stop_deepening(engine):
+    stopped = 0
+    for seed in range(10):
+        board = random_position(engine, seed, EVAL_PARAMS, winning_points=1, max_plies=40)
+        if any(board.terminal_test()):
+            continue
+        start = timer()
+        value, _, depth = board.iterative_deepening(board.pl_turn, 200)
+        if abs(value) >= DECIDED_VALUE:
+            stopped += 1
+            assert timer() - start < 0.2 # before the budget ran out
+    assert stopped > 0
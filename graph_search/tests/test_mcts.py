@@ -0,0 +1,56 @@
+from timeit import default_timer as timer
+
+import pytest
+
+from perft import ENGINES
+from mcts import MonteCarloTreeSearch
+from helpers import EVAL_PARAMS, random_position
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(10))
+def test_legal_action_and_board_unchanged(engine, seed):
+    board = random_position(engine, seed, EVAL_PARAMS)
+    if any(board.terminal_test()):
+        return
+    position = (board.hash, list(board.pl_scores), board.pl_turn)
+    value, action = MonteCarloTreeSearch(iterations=200, seed=seed).search(board)
+    assert -1 <= value <= 1
+    assert action in (board.get_actions(board.pl_turn) or [None])
+    assert (board.hash, board.pl_scores, board.pl_turn) == position
+
+
+def test_same_seed_same_search():
+    board = random_position('board', 3, EVAL_PARAMS)
+    results = [MonteCarloTreeSearch(iterations=300, seed=7).search(board) for _ in range(2)]
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_takes_an_immediate_win(engine):
+    wins = 0
+    for seed in range(40):
+        board = random_position(engine, seed, EVAL_PARAMS, winning_points=1, max_plies=30)
+        if any(board.terminal_test()) or not any(action[4] for action in board.get_actions(board.pl_turn)):
+            continue
+        mover = board.pl_turn
+        value, action = MonteCarloTreeSearch(iterations=300, seed=seed).search(board)
+        board.update_state(action)
+        assert board.pl_scores[mover] == 1
+        assert value == pytest.approx(1 if mover == 1 else -1)
+        wins += 1
+    assert wins > 0
+
+
+def test_time_budget():
+    board = random_position('bitboard', 0, EVAL_PARAMS, winning_points=10, max_plies=0)
+    player = MonteCarloTreeSearch(iterations=10 ** 9, time_ms=50, seed=0)
+    start = timer()
+    player.search(board)
+    assert timer() - start < 1
+    assert 0 < player.iterations_done < 10 ** 9
+
+
+def test_from_params():
+    player = MonteCarloTreeSearch.from_params({'mcts_iterations': 123, 'time_ms': 40, 'mcts_exploration': 0.5, 'mcts_seed': 1})
+    assert (player.iterations, player.time_ms, player.exploration) == (123, 40, 0.5)
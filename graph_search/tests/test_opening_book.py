@@ -0,0 +1,65 @@
+import pytest
+
+from perft import ENGINES
+from opening_book import OpeningBook, build
+from symmetry import mirror_action
+from transposition import DEFAULT_TT_SIZE
+from main import search_action
+from helpers import EVAL_PARAMS, search
+
+PLIES, DEPTH, WINNING_POINTS = 3, 3, 5
+PARAMS = dict(EVAL_PARAMS, tt_size=DEFAULT_TT_SIZE)
+
+
+@pytest.fixture(scope='module')
+def book(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('book') / 'opening-book.json')
+    build(path, PLIES, DEPTH, WINNING_POINTS, PARAMS, engine=ENGINES['bitboard'], log=lambda message: None)
+    return OpeningBook(path)
+
+
+def new_board(engine='board', winning_points=WINNING_POINTS):
+    return ENGINES[engine](False, False, winning_points, pl1_params=PARAMS, pl2_params=PARAMS)
+
+
+def moves(board):
+    return sorted(board.get_actions(board.pl_turn), key=str)
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_book_holds_the_search_results(book, engine):
+    board = new_board(engine)
+    for first in moves(board):
+        board.update_state(first, minimax_depth=DEPTH + 2)
+        for second in moves(board):
+            board.update_state(second, minimax_depth=DEPTH + 1)
+            value, action = book.lookup(board)
+            assert action in board.get_actions(board.pl_turn)
+            assert value == pytest.approx(search(board, DEPTH)[0])
+            board.r_update_state()
+        board.r_update_state()
+
+
+def test_mirrored_positions_share_an_entry(book):
+    board, mirrored = new_board(), new_board()
+    action = moves(board)[0]
+    board.update_state(action)
+    mirrored.update_state(mirrored.resolve_action(mirror_action(action)))
+    value, book_action = book.lookup(board)
+    mirrored_value, mirrored_action = book.lookup(mirrored)
+    assert mirrored_value == value
+    assert mirrored_action[:3] == mirror_action(book_action)[:3]
+
+
+def test_positions_outside_the_book(book):
+    assert book.lookup(new_board(winning_points=WINNING_POINTS + 1)) is None # another game
+    board = new_board()
+    for _ in range(PLIES):
+        board.update_state(moves(board)[0])
+    assert book.lookup(board) is None # too far from the start
+
+
+def test_players_play_the_book_without_searching(book):
+    board = new_board(winning_points=WINNING_POINTS)
+    value, action = search_action(board, board.pl_turn, 30, book=book) # a search this deep would not return
+    assert (value, action) == book.lookup(board)
@@ -0,0 +1,59 @@
+import pytest
+
+from perft import ENGINES
+from ordering import MOVE_ORDERINGS, MoveOrderer, TYPE_PRIORITY
+from helpers import EVAL_PARAMS, random_position, search
+
+ACTIONS = [(1, 4, 'Diag', 1, False), (None, 9, 'Insert', 2, False), (3, 6, 'Attack', 3, False),
+           (2, 5, 'Diag', 4, False), (4, None, 'Jump', 1, True)]
+
+
+def types(actions):
+    return [action[2] for action in actions]
+
+
+def test_types_in_priority_order():
+    ordered = MoveOrderer('history').order(ACTIONS, 0, 0)
+    assert types(ordered) == sorted(types(ACTIONS), key=lambda action_type: -TYPE_PRIORITY[action_type])
+
+
+def test_first_action_goes_first():
+    for mode in MOVE_ORDERINGS:
+        # Another piece may perform the stored action, only the cells and the type count
+        assert MoveOrderer(mode).order(ACTIONS, 0, 0, first_action=(4, None, 'Jump', 2, True))[0] == ACTIONS[4]
+
+
+def test_killers_and_history_reorder_a_type():
+    orderer = MoveOrderer('history')
+    orderer.cutoff(ACTIONS[3], 0, 2, 3)
+    ordered = orderer.order(ACTIONS, 0, 2)
+    assert ordered[0][2] == 'Attack' # a killer never goes before a better type
+    assert ordered[1] == ACTIONS[3]
+    assert orderer.order(ACTIONS, 0, 5)[1] == ACTIONS[3] # history of another ply
+    assert orderer.order(ACTIONS, 1, 5)[1] == ACTIONS[0] # history of the other player
+
+
+def test_new_search_ages_the_history():
+    orderer = MoveOrderer('history')
+    orderer.cutoff(ACTIONS[3], 0, 2, 4)
+    orderer.new_search()
+    assert orderer.killers == []
+    assert max(orderer.history) == 8
+
+
+def test_type_mode_ignores_cutoffs():
+    orderer = MoveOrderer('type')
+    orderer.cutoff(ACTIONS[3], 0, 2, 3)
+    assert orderer.order(ACTIONS, 0, 2) == MoveOrderer('type').order(ACTIONS, 0, 2)
+
+
+def test_unknown_ordering():
+    with pytest.raises(ValueError):
+        MoveOrderer('random')
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(10))
+def test_ordering_keeps_the_value(engine, seed):
+    values = [search(random_position(engine, seed, dict(EVAL_PARAMS, move_ordering=mode)), 5)[0] for mode in MOVE_ORDERINGS]
+    assert values[0] == pytest.approx(values[1])
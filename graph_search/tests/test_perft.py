@@ -0,0 +1,13 @@
+import pytest
+
+from perft import ENGINES, REFERENCE_POSITIONS, new_board, perft
+
+MAX_DEPTH = 4 # the deeper counts take seconds, perft.py checks them
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('name, position, expected', REFERENCE_POSITIONS, ids=[name for name, _, _ in REFERENCE_POSITIONS])
+def test_reference_counts(engine, name, position, expected):
+    for depth in sorted(expected):
+        if depth <= MAX_DEPTH:
+            assert perft(new_board(engine, position), depth) == expected[depth], f'{name} at depth {depth}'
@@ -0,0 +1,53 @@
+import pickle
+import pstats
+
+import pytest
+
+from main import run_game, profile_tag
+from profiling import MoveProfiler
+
+
+def player(name, depth):
+    return {'name': name, 'type': 'hminimax', 'parameters': {'depth': depth, 'row_score': 0.2, 'action_score': 0.1}}
+
+
+@pytest.fixture(scope='module')
+def profiler():
+    profiler = MoveProfiler()
+    run_game(player('a', 3), player('b', 4), 2, interactive=False, repetitions=3, profiler=profiler)
+    return profiler
+
+
+def test_profiles_are_written(tmp_path, profiler):
+    paths = profiler.write(str(tmp_path / 'game'))
+    assert paths == [str(tmp_path / 'game.prof'), str(tmp_path / 'game.folded')]
+    functions = {function for _, _, function in pstats.Stats(paths[0]).stats}
+    assert 'negamax' in functions
+    with open(paths[1]) as f:
+        lines = f.read().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+        assert stack.split(';')[0] in ('a depth 3', 'b depth 4') # the first frame tags the player
+
+
+def test_profiles_of_other_processes_are_merged(profiler):
+    merged = MoveProfiler()
+    merged.merge(pickle.loads(pickle.dumps(profiler.data())))
+    merged.merge(pickle.loads(pickle.dumps(profiler.data())))
+    assert merged.moves == 2 * profiler.moves
+    assert merged.stacks == {stack: 2 * count for stack, count in profiler.stacks.items()}
+
+
+def test_fast_moves_are_not_kept(tmp_path):
+    profiler = MoveProfiler(threshold_ms=60000)
+    run_game(player('a', 1), player('b', 1), 1, interactive=False, repetitions=3, profiler=profiler)
+    assert profiler.moves == 0
+    assert profiler.write(str(tmp_path / 'game')) == []
+
+
+def test_profile_tags():
+    assert profile_tag(player('a', 3)) == 'a depth 3'
+    assert profile_tag({'name': 'a', 'type': 'hminimax', 'parameters': {'depth': 8, 'time_ms': 50}}) == 'a 50ms'
+    assert profile_tag({'name': 'm', 'type': 'mcts', 'parameters': {'mcts_iterations': 100}}) == 'm mcts100'
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from main import run_game
+from records import RecordWriter, read_games, replay, check_move, encode_action, decode_action, PASS
+from classes import Board
+
+
+def player(name, depth):
+    return {'name': name, 'type': 'hminimax', 'parameters': {
+        'depth': depth, 'row_score': 0.2, 'action_score': 0.1, 'tt_size': 4096, 'search_stats': True}}
+
+
+def test_action_codes():
+    board = Board(False, False, 5)
+    rng = random.Random(0)
+    for _ in range(40):
+        for action in board.get_actions(board.pl_turn):
+            decoded = decode_action(encode_action(action))
+            assert decoded[:3] == action[:3] and decoded[4] == bool(action[4])
+        actions = board.get_actions(board.pl_turn)
+        board.update_state(rng.choice(actions) if actions else None)
+        if any(board.terminal_test()):
+            break
+    assert encode_action(None) == PASS and decode_action(PASS) is None
+
+
+@pytest.mark.parametrize('engine', ['board', 'bitboard'])
+@pytest.mark.parametrize('stats', [True, False])
+def test_games_round_trip(tmp_path, engine, stats):
+    path = tmp_path / 'games.krec'
+    recorder = RecordWriter.open(path, stats=stats)
+    results = [run_game(player('a', 2), player('b', 3), 3, interactive=False, engine=engine, repetitions=3, recorder=recorder)
+               for _ in range(2)]
+    recorder.close()
+    games = list(read_games(path))
+    assert len(games) == len(results)
+    for game, result in zip(games, results):
+        assert game['engine'] == engine
+        assert game['winner'] == result['winner']
+        assert tuple(game['scores']) == result['scores']
+        assert game['repetition'] == result['repetition']
+        moves = 0
+        for board, move in replay(game):
+            check_move(board, move[0])
+            assert len(move) == (6 if stats else 1)
+            moves += 1
+        assert moves == result['total_turns'] - 1 # the last turn finds the game over
+
+
+def test_incomplete_last_game_is_ignored(tmp_path):
+    path = tmp_path / 'games.krec'
+    recorder = RecordWriter.open(path)
+    run_game(player('a', 2), player('b', 2), 2, interactive=False, repetitions=3, recorder=recorder)
+    recorder.start_game(player('a', 2), player('b', 2), 2)
+    recorder.add_move(None)
+    recorder.close()
+    assert len(list(read_games(path))) == 1
@@ -0,0 +1,31 @@
+import pytest
+
+from perft import ENGINES
+from transposition import DEFAULT_TT_SIZE
+from main import adjudicate
+from helpers import EVAL_PARAMS, search
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_repetition_draws_are_not_stored(engine):
+    params = dict(EVAL_PARAMS, tt_size=DEFAULT_TT_SIZE, repetition_detection=True)
+    board = ENGINES[engine](False, False, 10, pl1_params=params, pl2_params=params)
+    first = sorted(board.get_actions(0), key=str)[0]
+    board.update_state(first, minimax_depth=0)
+    board.update_state(sorted(board.get_actions(1), key=str)[0], minimax_depth=0)
+    board.history[board.hash] = 1 # a position two plies ahead occurred in the game
+    board.r_update_state()
+    board.r_update_state()
+    search(board, 3)
+    assert board.repetition_draws > 0
+    board.update_state(first, minimax_depth=0)
+    assert board.probe_tt(-1000, 1000, 2, 0)[2] is None # the value of the child depends on the history
+
+
+def test_adjudication():
+    board = ENGINES['board'](False, False, 10)
+    board.pl_scores = [2, 1]
+    assert adjudicate(board, 'draw') == 0
+    assert adjudicate(board, 'score') == board.pl_id[0]
+    board.pl_scores = [1, 1]
+    assert adjudicate(board, 'score') == 0
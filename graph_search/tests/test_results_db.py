@@ -0,0 +1,71 @@
+import json
+import math
+
+import pytest
+
+import benchmark
+from benchmark import draw_duels, play_benchmark_game, results_from_records, duel_ratios, contender_totals
+from results_db import ResultsDB
+
+WINNING_POINTS = 2
+
+
+@pytest.fixture(scope='module')
+def records():
+    """Game records of every duel between depth 1 and depth 2 contenders, two games each."""
+    settings = dict(benchmark.TEST_SETTINGS)
+    benchmark.TEST_SETTINGS.update({'depth': [1, 2], 'row_score': [0.2], 'action_score': [0.1], 'repetition_detection': True})
+    try:
+        duels = draw_duels()
+    finally:
+        benchmark.TEST_SETTINGS.clear()
+        benchmark.TEST_SETTINGS.update(settings)
+    return [play_benchmark_game((key, iteration, pl1, pl2, WINNING_POINTS, 'board', 3, 'draw', None, False))
+            for key, (pl1, pl2) in duels.items() for iteration in range(2)]
+
+
+def same_ratios(ratios, expected):
+    assert set(ratios) == set(expected)
+    for key, values in expected.items():
+        for value, other in zip(ratios[key], values):
+            assert (math.isnan(value) and math.isnan(other)) or value == pytest.approx(other)
+
+
+def test_queries_match_the_records(tmp_path, records):
+    db = ResultsDB(str(tmp_path / 'results.db'))
+    sweep_id = db.sweep('sweep')
+    for record in records:
+        db.add_game(sweep_id, record)
+    results = results_from_records(records)
+    same_ratios(db.duel_ratios(), duel_ratios(results))
+    expected_totals = contender_totals(results)
+    totals = db.contender_totals()
+    assert set(totals) == set(expected_totals)
+    for name, expected in expected_totals.items():
+        assert totals[name] == pytest.approx(expected)
+
+
+def test_sweeps_are_resumed_and_merged(tmp_path, records):
+    db = ResultsDB(str(tmp_path / 'results.db'))
+    first, second = db.sweep('first'), db.sweep('second')
+    assert db.sweep('first') == first
+    half = len(records) // 2
+    for record in records[:half]:
+        db.add_game(first, record)
+    for record in records[half:]:
+        db.add_game(second, record)
+    assert db.recorded(first, WINNING_POINTS) == {(record['duel'], record['iteration']) for record in records[:half]}
+    assert sorted((record['duel'], record['iteration'], record['winner']) for record in db.game_results(first, WINNING_POINTS)) == \
+        sorted((record['duel'], record['iteration'], record['winner']) for record in records[:half])
+    same_ratios(db.duel_ratios(['first']), duel_ratios(results_from_records(records[:half])))
+    same_ratios(db.duel_ratios(), duel_ratios(results_from_records(records)))
+    assert [(name, games) for name, _, games, _, _ in db.sweeps()] == [('first', half), ('second', len(records) - half)]
+
+
+def test_import_game_records_once(tmp_path, records):
+    path = tmp_path / 'sweep.jsonl'
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    db = ResultsDB(str(tmp_path / 'results.db'))
+    assert db.import_file(str(path)) == len(records)
+    assert db.import_file(str(path)) == 0 # the games already stored are skipped
+    same_ratios(db.duel_ratios(['sweep.jsonl']), duel_ratios(results_from_records(records)))
@@ -0,0 +1,45 @@
+import pytest
+
+from perft import ENGINES
+from helpers import EVAL_PARAMS, random_position, search
+
+SEEDS = range(40)
+
+
+def stats_of(board):
+    return board.stats[board.pl_turn]
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', SEEDS)
+def test_batch_eval_keeps_the_extended_result(engine, seed):
+    params = dict(EVAL_PARAMS, capture_extensions=2)
+    plain = search(random_position(engine, seed, params), 3)
+    batched = search(random_position(engine, seed, dict(params, batch_eval=True)), 3)
+    assert batched[0] == pytest.approx(plain[0])
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_capture_extensions_search_exchanges_deeper(engine):
+    deeper = 0
+    for seed in SEEDS:
+        board = random_position(engine, seed, dict(EVAL_PARAMS, capture_extensions=2, search_stats=True))
+        stats_of(board).start_move()
+        search(board, 2)
+        assert stats_of(board).max_ply <= 2 + 2
+        deeper += stats_of(board).max_ply > 2
+    assert deeper > 0
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_late_move_reductions_search_fewer_nodes(engine):
+    nodes = {}
+    for reductions in (0, 1):
+        nodes[reductions] = 0
+        for seed in SEEDS:
+            board = random_position(engine, seed, dict(EVAL_PARAMS, late_move_reductions=reductions, search_stats=True))
+            stats_of(board).start_move()
+            search(board, 5)
+            nodes[reductions] += stats_of(board).nodes
+    assert nodes[1] < nodes[0]
+
@@ -0,0 +1,65 @@
+import pytest
+
+from sprt import SPRT, DuelScheduler, FIRST, SECOND, EVEN
+
+
+def test_decisions():
+    sprt = SPRT(elo=100)
+    assert sprt.decision(0, 0, 0) is None
+    assert sprt.decision(3, 0, 2) is None
+    assert sprt.decision(40, 0, 5) == FIRST
+    assert sprt.decision(5, 0, 40) == SECOND
+    assert sprt.decision(150, 100, 150) == EVEN
+
+
+def test_llr_is_antisymmetric():
+    sprt = SPRT()
+    assert sprt.llr(12, 3, 7, sprt.elo) == pytest.approx(sprt.llr(7, 3, 12, -sprt.elo))
+
+
+def test_distance_shrinks_towards_a_decision():
+    sprt = SPRT()
+    assert sprt.distance(0, 0, 0) > sprt.distance(3, 0, 1) > sprt.distance(6, 0, 2) > sprt.distance(10, 0, 2) > 0
+    assert sprt.decision(10, 0, 2) is None
+
+
+def contenders(*names):
+    players = {name: {'name': name} for name in names}
+    return {f'{pl1}|{pl2}': (players[pl1], players[pl2]) for pl1 in names for pl2 in names}
+
+
+def test_scheduler_skips_self_pairs():
+    scheduler = DuelScheduler(contenders('a', 'b'), 5, SPRT())
+    assert sorted(scheduler.duels) == ['a|b', 'b|a']
+    assert scheduler.budget == 10
+
+
+def test_scheduler_stops_decided_matchups():
+    scheduler = DuelScheduler(contenders('a', 'b', 'c'), 10, SPRT(), max_iterations=40)
+    played = {}
+    while True:
+        game = scheduler.next_game()
+        if game is None:
+            break
+        duel_key, iteration = game
+        pl1, pl2 = duel_key.split('|')
+        played[duel_key] = played.get(duel_key, 0) + 1
+        # c always wins, a and b share their games
+        if 'c' in (pl1, pl2):
+            winner = -1 if pl1 == 'c' else 1
+        else:
+            winner = -1 if iteration % 2 else 1
+        scheduler.add_result({'duel': duel_key, 'iteration': iteration, 'winner': winner})
+    assert scheduler.matchups[('a', 'c')]['decision'] == SECOND
+    assert scheduler.matchups[('b', 'c')]['decision'] == SECOND
+    # the games the decided matchups left went to the close one
+    assert played['a|b'] + played['b|a'] > 20
+    assert sum(played.values()) == scheduler.budget
+
+
+def test_scheduler_resumes_from_records():
+    duels = contenders('a', 'b')
+    records = [{'duel': 'a|b', 'iteration': iteration, 'winner': -1} for iteration in range(30)]
+    scheduler = DuelScheduler(duels, 20, SPRT(), records=records)
+    assert scheduler.matchups[('a', 'b')]['decision'] == FIRST
+    assert scheduler.next_game() is None
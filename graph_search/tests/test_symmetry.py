@@ -0,0 +1,60 @@
+import random
+
+import numpy as np
+import pytest
+
+from perft import ENGINES
+from symmetry import MIRROR_CELL, canonical_key, canonical_ranks, mirror_action, mirror_codes
+from tablebase import POSITIONS
+from transposition import DEFAULT_TT_SIZE
+from helpers import EVAL_PARAMS, random_position, search
+
+
+def mirrored_games(engine, seed):
+    """Yield the positions of a random game played on one board and mirrored on another."""
+    rng = random.Random(seed)
+    board = ENGINES[engine](False, False, 5, pl1_params=EVAL_PARAMS, pl2_params=EVAL_PARAMS)
+    mirrored = ENGINES[engine](False, False, 5, pl1_params=EVAL_PARAMS, pl2_params=EVAL_PARAMS)
+    for _ in range(30):
+        yield board, mirrored
+        if any(board.terminal_test()):
+            break
+        actions = sorted(board.get_actions(board.pl_turn), key=str)
+        action = rng.choice(actions) if actions else None
+        board.update_state(action)
+        mirrored.update_state(mirrored.resolve_action(mirror_action(action)))
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(5))
+def test_mirror_images_share_the_canonical_key(engine, seed):
+    for board, mirrored in mirrored_games(engine, seed):
+        assert board.hash ^ board.mirror_delta == mirrored.hash
+        assert canonical_key(board)[0] == canonical_key(mirrored)[0]
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(5))
+def test_mirror_images_have_the_same_value(engine, seed):
+    for idx, (board, mirrored) in enumerate(mirrored_games(engine, seed)):
+        if idx % 5 == 0 and not any(board.terminal_test()):
+            assert search(mirrored, 4)[0] == pytest.approx(search(board, 4)[0])
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(10))
+def test_shared_entries_keep_the_value(engine, seed):
+    params = dict(EVAL_PARAMS, tt_size=DEFAULT_TT_SIZE)
+    plain = search(random_position(engine, seed, params), 5)
+    symmetric = search(random_position(engine, seed, dict(params, tt_symmetry=True)), 5)
+    assert symmetric[0] == pytest.approx(plain[0])
+
+
+def test_canonical_ranks():
+    assert all(MIRROR_CELL[MIRROR_CELL[cell]] == cell for cell in range(12))
+    codes = np.arange(POSITIONS, dtype=np.int64)
+    mirrored = mirror_codes(codes)
+    assert (mirror_codes(mirrored) == codes).all()
+    canonical, ranks = canonical_ranks(POSITIONS)
+    assert (ranks == ranks[mirrored]).all() # one entry per mirror pair
+    assert (canonical[ranks] == np.minimum(codes, mirrored)).all()
@@ -0,0 +1,71 @@
+import pytest
+
+from perft import ENGINES
+from classes import WIN_VALUE, SEARCH_BOUND
+from tablebase import Tablebase, generate
+from transposition import DEFAULT_TT_SIZE
+from helpers import EVAL_PARAMS, random_position, search
+
+MAX_PLIES = 7 # the positions decided further away take seconds to search
+
+
+@pytest.fixture(scope='module')
+def tablebase_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('tablebase') / 'kulibrat.tb')
+    generate(path, 1, log=lambda message: None)
+    return path
+
+
+def decided_positions(engine, params, tablebase, count=20):
+    """Yield (board, stored value) of random positions of the game to 1 point decided within MAX_PLIES plies."""
+    seed, found = 0, 0
+    while found < count:
+        board = random_position(engine, seed, params, winning_points=1, max_plies=40)
+        seed += 1
+        stored = tablebase.probe(board)
+        if any(board.terminal_test()) or not stored or abs(stored) - 1 > MAX_PLIES:
+            continue
+        found += 1
+        yield board, stored
+
+
+def expected_value(stored, color):
+    """Return the value a search from the root finds for a stored tablebase value, as max_alpha_beta returns it."""
+    return color * (WIN_VALUE - (abs(stored) - 1)) * (1 if stored > 0 else -1)
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_probe_matches_the_search(engine, tablebase_path):
+    for board, stored in decided_positions(engine, dict(EVAL_PARAMS, tt_size=0), Tablebase(tablebase_path)):
+        color = 1 if board.pl_turn == 1 else -1
+        assert search(board, abs(stored) - 1)[0] == expected_value(stored, color)
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_table_values_count_the_plies_from_the_root(engine, tablebase_path):
+    for board, stored in decided_positions(engine, dict(EVAL_PARAMS, tablebase=tablebase_path), Tablebase(tablebase_path)):
+        board.start_search(board.pl_turn)
+        board.ply = 3 # probed three plies below the root
+        value = board.negamax(-SEARCH_BOUND, SEARCH_BOUND, 1, 1 if board.pl_turn == 1 else -1, invoking_player=board.pl_turn)[0]
+        assert value == (WIN_VALUE - (3 + abs(stored) - 1)) * (1 if stored > 0 else -1)
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_search_plays_the_fastest_win(engine, tablebase_path):
+    tablebase = Tablebase(tablebase_path)
+    for board, stored in decided_positions(engine, dict(EVAL_PARAMS, tt_size=0), tablebase):
+        if stored < 0:
+            continue
+        action = search(board, stored - 1)[1]
+        board.update_state(action)
+        assert any(board.terminal_test()) or tablebase.probe(board) == -(stored - 1)
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(15))
+def test_transposition_table_keeps_the_distance_of_wins(engine, seed):
+    # Decided values are stored relative to their position and found again at other plies
+    without = search(random_position(engine, seed, dict(EVAL_PARAMS, tt_size=0), winning_points=1, max_plies=40), 6)
+    with_table = search(random_position(engine, seed, dict(EVAL_PARAMS, tt_size=DEFAULT_TT_SIZE), winning_points=1,
+                                        max_plies=40), 6)
+    assert with_table[0] == pytest.approx(without[0])
@@ -0,0 +1,41 @@
+import pytest
+
+from perft import ENGINES
+from main import initialize_game
+from transposition import TranspositionTable, DEFAULT_TT_SIZE, EXACT, LOWER
+from helpers import EVAL_PARAMS, random_position, search
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('seed', range(15))
+def test_table_keeps_the_search_result(engine, seed):
+    without = search(random_position(engine, seed, dict(EVAL_PARAMS, tt_size=0)), 5)
+    with_table = search(random_position(engine, seed, dict(EVAL_PARAMS, tt_size=DEFAULT_TT_SIZE)), 5)
+    assert with_table[0] == pytest.approx(without[0])
+    assert with_table[1] == without[1]
+
+
+def test_store_and_probe():
+    table = TranspositionTable(16)
+    table.store(12345, 3, EXACT, 0.5, (None, 1, 'Insert', 0, False))
+    entry = table.probe(12345)
+    assert (entry.depth, entry.flag, entry.value) == (3, EXACT, 0.5)
+    assert table.probe(12345 + 16) is None # same slot, other position
+
+
+def test_depth_replacement_keeps_the_deeper_entry_of_the_search():
+    table = TranspositionTable(16, 'depth')
+    table.store(1, 5, EXACT, 1.0, None)
+    table.store(17, 2, LOWER, 2.0, None) # same slot
+    assert table.probe(1).depth == 5 and table.probe(17) is None
+    table.new_search()
+    table.store(17, 2, LOWER, 2.0, None) # entries of older searches give way
+    assert table.probe(17).depth == 2
+
+
+def test_only_search_players_get_a_table():
+    assert TranspositionTable.from_params(None) is None
+    assert TranspositionTable.from_params({'tt_size': 0}) is None
+    params = {'tt_size': DEFAULT_TT_SIZE}
+    board = initialize_game({'type': 'human', 'parameters': dict(params)}, {'type': 'hminimax', 'parameters': dict(params)}, 5)
+    assert board.tt[0] is None and board.tt[1] is not None
@@ -0,0 +1,103 @@
+import random
+
+# Bound types stored with every table entry
+EXACT, LOWER, UPPER = 0, 1, 2
+
+REPLACEMENT_POLICIES = ('depth', 'always')
+DEFAULT_TT_SIZE = 2**16
+MAX_SCORE = 100
+
+# Zobrist keys, one per (player, cell), per (player, score) and one for the turn.
+# The generator is seeded so that hashes are stable between runs and processes.
+_rng = random.Random(2180)
+ZOBRIST_CELLS = [[_rng.getrandbits(64) for _ in range(12)] for _ in range(2)]
+ZOBRIST_SCORES = [[_rng.getrandbits(64) for _ in range(MAX_SCORE + 1)] for _ in range(2)]
+ZOBRIST_TURN = _rng.getrandbits(64)
+
+
+def initial_hash():
+    """Return the Zobrist hash of the empty board with both scores at zero and player 1 to move."""
+    return ZOBRIST_SCORES[0][0] ^ ZOBRIST_SCORES[1][0]
+
+
+def position_hash(cells, pl_scores, pl_turn):
+    """Return the Zobrist hash of a position computed from scratch, cells[c] is the pl_idx of the
+    piece on cell c or None. Board keeps the same hash up to date move by move."""
+    key = ZOBRIST_SCORES[0][pl_scores[0]] ^ ZOBRIST_SCORES[1][pl_scores[1]]
+    for cell, pl_idx in enumerate(cells):
+        if pl_idx is not None:
+            key ^= ZOBRIST_CELLS[pl_idx][cell]
+    if pl_turn == 1:
+        key ^= ZOBRIST_TURN
+    return key
+
+
+class TTEntry():
+    __slots__ = ('key', 'depth', 'flag', 'value', 'move', 'generation')
+
+    def __init__(self, key, depth, flag, value, move, generation):
+        self.key = key
+        self.depth = depth
+        self.flag = flag
+        self.value = value
+        self.move = move
+        self.generation = generation
+
+
+class TranspositionTable():
+    def __init__(self, size=DEFAULT_TT_SIZE, replacement='depth'):
+        """
+        :param size: Int, number of slots in the table
+        :param replacement: String, 'depth' keeps the deeper entry of the current search when two
+            positions collide on a slot, 'always' overwrites the slot unconditionally
+        """
+        if size <= 0:
+            raise ValueError(f'Transposition table size must be positive, got {size}')
+        if replacement not in REPLACEMENT_POLICIES:
+            raise ValueError(f'Unknown replacement policy "{replacement}", valid policies: {list(REPLACEMENT_POLICIES)}')
+        self.size = size
+        self.replacement = replacement
+        self.slots = [None] * size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    @classmethod
+    def from_params(cls, params):
+        """Return a table configured from a player's parameters, or None if the table is disabled,
+        which it is unless the player opts in with a tt_size (DEFAULT_TT_SIZE for the search players of main.py)."""
+        params = params or {}
+        size = params.get('tt_size', 0)
+        if not size:
+            return None
+        return cls(size, params.get('tt_replacement', 'depth'))
+
+    def __getstate__(self):
+        # Copies sent to other processes start empty, the entries are only a cache
+        return {'size': self.size, 'replacement': self.replacement}
+
+    def __setstate__(self, state):
+        self.__init__(state['size'], state['replacement'])
+
+    def new_search(self):
+        """Mark the entries of previous searches as replaceable."""
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.generation = 0
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.slots[key % self.size]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, flag, value, move):
+        idx = key % self.size
+        entry = self.slots[idx]
+        if (entry is None or self.replacement == 'always' or entry.key == key
+                or entry.generation != self.generation or depth >= entry.depth):
+            self.slots[idx] = TTEntry(key, depth, flag, value, move, self.generation)